@@ -0,0 +1,312 @@
+"""
+Per-user aggregates over meals and symptom entries, kept up to date on every
+write so that suggestions and insights read a few small items instead of
+querying raw history.
+
+Each user has one "totals" item, plus one item per UTC day holding that day's
+counts. Day items expire through DynamoDB TTL once they are older than the
+rolling window, so recent-history reads are a single query over at most
+ROLLING_WINDOW_DAYS small items.
+
+Counts are changed with atomic update expressions (if_not_exists(count, 0) + n),
+so concurrent writes never lose an increment. A large import touches hundreds of
+foods, so an item's changes are split over updates of at most
+AGGREGATE_UPDATE_MAX_ACTIONS actions each, keeping every expression well under
+DynamoDB's 4KB limit. Anything that drifts (e.g. a write that failed half way)
+is corrected by the rebuild job in aggregates/rebuild.py.
+"""
+
+import logging
+import os
+import traceback
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from pynamodb.attributes import (
+    Attribute,
+    MapAttribute,
+    NumberAttribute,
+    TTLAttribute,
+    UnicodeAttribute,
+    UTCDateTimeAttribute,
+)
+from pynamodb.exceptions import UpdateError
+
+from shared.batch import chunked
+from shared.config import bootstrap
+from shared.dynamodb import MbdModel
+
+logger = logging.getLogger("uvicorn.error")
+
+bootstrap()
+
+TOTALS_KEY = "totals"
+DAY_KEY_PREFIX = "day#"
+# Day items are kept (then expire) this many days after the day they count
+ROLLING_WINDOW_DAYS = 30
+# Actions (or last-eaten foods) per UpdateItem. The longest, a last-eaten food
+# with its condition, is under 100 bytes of expression
+AGGREGATE_UPDATE_MAX_ACTIONS = 25
+# Failures of a well-formed update, which the rebuild job makes up for. Anything
+# else, e.g. a ValidationException, is a bug in the update and is raised
+_EXPECTED_FAILURES = {
+    "ConditionalCheckFailedException",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "ThrottlingException",
+}
+
+_date_time_attribute = UTCDateTimeAttribute()
+
+
+class MbdUserAggregate(MbdModel):
+    class Meta:
+        table_name = os.getenv("USER_AGGREGATES_DB_NAME")
+        region = "us-west-2"
+
+    user_id = UnicodeAttribute(hash_key=True)
+    # TOTALS_KEY, or DAY_KEY_PREFIX + the UTC date
+    aggregate = UnicodeAttribute(range_key=True)
+    meal_count = NumberAttribute(default=0)
+    # "<meal type>#<food ID>" -> number of meals of that type with the food
+    food_counts = MapAttribute(default=dict)
+    symptoms_entry_count = NumberAttribute(default=0)
+    # Symptom -> number of entries reporting it
+    symptom_counts = MapAttribute(default=dict)
+    # Totals only. Food ID -> date_time of the latest meal with the food, serialized
+    last_eaten = MapAttribute(default=dict)
+    # Day items only
+    expires_at = TTLAttribute(null=True)
+
+    def food_counts_by_id(self, meal_type: Optional[str] = None) -> Counter:
+        """Food counts summed over meal types, or for one meal type."""
+        counts = Counter()
+        for key, count in self.food_counts.as_dict().items():
+            key_meal_type, _, food_id = key.rpartition("#")
+            if meal_type is None or key_meal_type == meal_type:
+                counts[food_id] += int(count)
+        return +counts
+
+
+def food_count_key(meal_type: str, food_id: str) -> str:
+    return f"{meal_type}#{food_id}"
+
+
+def day_key(date_time: datetime) -> str:
+    return DAY_KEY_PREFIX + date_time.astimezone(timezone.utc).date().isoformat()
+
+
+@dataclass
+class AggregateDelta:
+    """Changes to one aggregate item."""
+
+    meal_count: int = 0
+    food_counts: Counter = field(default_factory=Counter)
+    symptoms_entry_count: int = 0
+    symptom_counts: Counter = field(default_factory=Counter)
+    last_eaten: dict[str, datetime] = field(default_factory=dict)
+    expires_at: Optional[datetime] = None
+
+
+def meal_deltas(
+    meals: Iterable, sign: int = 1, deltas: Optional[dict] = None
+) -> dict[str, AggregateDelta]:
+    """
+    Add meals to (sign=1) or remove them from (sign=-1) the deltas for each
+    aggregate item, keyed by the item's `aggregate` key.
+    """
+    deltas = {} if deltas is None else deltas
+    for meal in meals:
+        food_ids = {food.food_id for food in meal.foods}
+        for key in _aggregate_keys(meal.date_time):
+            delta = _delta_for(deltas, key, meal.date_time)
+            delta.meal_count += sign
+            for food_id in food_ids:
+                delta.food_counts[food_count_key(meal.meal_type, food_id)] += sign
+
+        # Removing a meal can't roll last_eaten back; the rebuild job does that
+        if sign > 0:
+            last_eaten = deltas[TOTALS_KEY].last_eaten
+            for food_id in food_ids:
+                if food_id not in last_eaten or last_eaten[food_id] < meal.date_time:
+                    last_eaten[food_id] = meal.date_time
+
+    return deltas
+
+
+def symptoms_entry_deltas(
+    symptoms_entries: Iterable, sign: int = 1, deltas: Optional[dict] = None
+) -> dict[str, AggregateDelta]:
+    """Like meal_deltas, for symptom entries."""
+    deltas = {} if deltas is None else deltas
+    for entry in symptoms_entries:
+        for key in _aggregate_keys(entry.date_time):
+            delta = _delta_for(deltas, key, entry.date_time)
+            delta.symptoms_entry_count += sign
+            for symptom in set(entry.symptoms):
+                delta.symptom_counts[symptom] += sign
+
+    return deltas
+
+
+def apply_deltas(user_id: str, deltas: dict[str, AggregateDelta]) -> None:
+    """
+    Apply deltas to a user's aggregates. Throttling and conditional failures are
+    logged rather than raised: the journal entry itself has been saved by now,
+    and the aggregates are derived data the rebuild job can recompute.
+    """
+    for key, delta in deltas.items():
+        try:
+            _apply_delta(MbdUserAggregate(user_id, key), delta)
+        except UpdateError as e:
+            if e.cause_response_code not in _EXPECTED_FAILURES:
+                raise
+            logger.error(
+                "Failed to update aggregate %s for %s: %s",
+                key,
+                user_id,
+                traceback.format_exc(),
+            )
+
+
+def get_recent_days(
+    user_id: str, days: int, attributes: Optional[Iterable[Attribute]] = None
+) -> list[MbdUserAggregate]:
+    """
+    The user's day aggregates for the last `days` UTC days, newest first. With
+    `attributes`, only those are read.
+    """
+    start = day_key(datetime.now(timezone.utc) - timedelta(days=days - 1))
+
+    return list(
+        MbdUserAggregate.query_projected(
+            hash_key=user_id,
+            range_key_condition=MbdUserAggregate.aggregate >= start,
+            attributes=attributes,
+            scan_index_forward=False,
+        )
+    )
+
+
+def window_start_key() -> str:
+    """Key of the oldest day item inside the rolling window."""
+    return day_key(datetime.now(timezone.utc) - timedelta(days=ROLLING_WINDOW_DAYS))
+
+
+def _aggregate_keys(date_time: datetime) -> list[str]:
+    # Days past the rolling window would only be written to expire
+    key = day_key(date_time)
+    if key < window_start_key():
+        return [TOTALS_KEY]
+    return [TOTALS_KEY, key]
+
+
+def _delta_for(deltas: dict, key: str, date_time: datetime) -> AggregateDelta:
+    if key not in deltas:
+        deltas[key] = AggregateDelta(
+            expires_at=(
+                None
+                if key == TOTALS_KEY
+                else datetime.combine(
+                    date_time.astimezone(timezone.utc).date(),
+                    datetime.min.time(),
+                    tzinfo=timezone.utc,
+                )
+                + timedelta(days=ROLLING_WINDOW_DAYS + 1)
+            )
+        )
+    return deltas[key]
+
+
+def _apply_delta(item: MbdUserAggregate, delta: AggregateDelta) -> None:
+    cls = MbdUserAggregate
+    actions = []
+    if delta.meal_count:
+        actions.append(cls.meal_count.add(delta.meal_count))
+    if delta.symptoms_entry_count:
+        actions.append(cls.symptoms_entry_count.add(delta.symptoms_entry_count))
+    for key, count in delta.food_counts.items():
+        if count:
+            path = cls.food_counts[key]
+            actions.append(path.set((path | 0) + count))
+    for symptom, count in delta.symptom_counts.items():
+        if count:
+            path = cls.symptom_counts[symptom]
+            actions.append(path.set((path | 0) + count))
+    if delta.expires_at is not None:
+        actions.append(cls.expires_at.set(delta.expires_at))
+
+    for group in chunked(actions, AGGREGATE_UPDATE_MAX_ACTIONS):
+        _update_nested(
+            item,
+            group,
+            # Nested counts can only be set once their maps exist
+            condition=cls.food_counts.exists() & cls.symptom_counts.exists(),
+        )
+
+    last_eaten = list(delta.last_eaten.items())
+    for group in chunked(last_eaten, AGGREGATE_UPDATE_MAX_ACTIONS):
+        _update_last_eaten(item, dict(group))
+
+
+def _update_nested(item: MbdUserAggregate, actions: list, condition) -> None:
+    try:
+        item.update(actions=actions, condition=condition)
+    except UpdateError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+
+        # First write to this item: create its maps, then try again
+        cls = MbdUserAggregate
+        item.update(
+            actions=[
+                cls.food_counts.set(cls.food_counts | {}),
+                cls.symptom_counts.set(cls.symptom_counts | {}),
+                cls.last_eaten.set(cls.last_eaten | {}),
+            ]
+        )
+        item.update(actions=actions, condition=condition)
+
+
+def _update_last_eaten(
+    item: MbdUserAggregate, last_eaten: dict[str, datetime]
+) -> None:
+    cls = MbdUserAggregate
+    serialized = {
+        food_id: _date_time_attribute.serialize(date_time)
+        for food_id, date_time in last_eaten.items()
+    }
+
+    def is_newer(food_id):
+        # Serialized date_times sort chronologically
+        return cls.last_eaten[food_id].does_not_exist() | (
+            cls.last_eaten[food_id] < serialized[food_id]
+        )
+
+    food_ids = list(serialized)
+    condition = is_newer(food_ids[0])
+    for food_id in food_ids[1:]:
+        condition &= is_newer(food_id)
+
+    try:
+        item.update(
+            actions=[cls.last_eaten[f].set(serialized[f]) for f in food_ids],
+            condition=condition,
+        )
+    except UpdateError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+
+        # At least one food was eaten more recently (e.g. the meal is back-dated);
+        # update the others one at a time
+        for food_id in food_ids:
+            try:
+                item.update(
+                    actions=[cls.last_eaten[food_id].set(serialized[food_id])],
+                    condition=is_newer(food_id),
+                )
+            except UpdateError as e:
+                if e.cause_response_code != "ConditionalCheckFailedException":
+                    raise
@@ -0,0 +1,136 @@
+"""
+Recompute users' aggregates from their meals and symptom entries.
+
+This checks the incrementally maintained copies and corrects any drift.
+
+Run against an environment:
+    cd app && PYTHONPATH=. ENVIRONMENT=<env> uv run python -m aggregates.rebuild [--check] [--user-id ID]
+
+With --check, differences are only reported. Otherwise, every aggregate item that
+differs is overwritten (or deleted, for days with nothing left in them). A write
+that lands while its user is being rebuilt can be lost from the counts, so run
+this when traffic is low, then again with --check.
+"""
+
+import argparse
+import logging
+from typing import Iterator, Optional
+
+from aggregates.aggregates import (
+    TOTALS_KEY,
+    AggregateDelta,
+    MbdUserAggregate,
+    meal_deltas,
+    symptoms_entry_deltas,
+    window_start_key,
+)
+from meals.meal import MbdMeal
+from symptoms.symptoms import MbdSymptomsEntry
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def compute_aggregates(user_id: str) -> dict[str, MbdUserAggregate]:
+    """A user's aggregates, computed from scratch and keyed by `aggregate`."""
+    deltas = meal_deltas(MbdMeal.query(user_id))
+    symptoms_entry_deltas(MbdSymptomsEntry.query(user_id), deltas=deltas)
+
+    return {key: _to_item(user_id, key, delta) for key, delta in deltas.items()}
+
+
+def rebuild_user(user_id: str, check_only: bool = False) -> list[str]:
+    """
+    Returns:
+        Keys of the user's aggregate items that were (or, when checking, would
+        be) rewritten
+    """
+    expected = compute_aggregates(user_id)
+    stored = {
+        item.aggregate: item
+        for item in MbdUserAggregate.query(user_id)
+        # Days past the window are left for TTL to remove
+        if item.aggregate == TOTALS_KEY or item.aggregate >= window_start_key()
+    }
+
+    stale = sorted(
+        key
+        for key in expected.keys() | stored.keys()
+        if key not in expected
+        or key not in stored
+        or _contents(expected[key]) != _contents(stored[key])
+    )
+    if not check_only:
+        for key in stale:
+            if key in expected:
+                expected[key].save()
+            else:
+                stored[key].delete()
+
+    return stale
+
+
+def user_ids() -> Iterator[str]:
+    """Every user with a meal or symptom entry."""
+    seen = set()
+    for model in (MbdMeal, MbdSymptomsEntry):
+        for item in model.scan(attributes_to_get=["user_id"]):
+            if item.user_id not in seen:
+                seen.add(item.user_id)
+                yield item.user_id
+
+
+def rebuild_all(check_only: bool = False, user_id: Optional[str] = None) -> None:
+    users = 0
+    stale_users = 0
+    for user in [user_id] if user_id else user_ids():
+        stale = rebuild_user(user, check_only)
+        users += 1
+        if stale:
+            stale_users += 1
+            logger.info("%s: %s", user, ", ".join(stale))
+
+    logger.info(
+        "%s aggregates of %d of %d users",
+        "Found stale" if check_only else "Rebuilt",
+        stale_users,
+        users,
+    )
+
+
+def _to_item(user_id: str, key: str, delta: AggregateDelta) -> MbdUserAggregate:
+    return MbdUserAggregate(
+        user_id=user_id,
+        aggregate=key,
+        meal_count=delta.meal_count,
+        food_counts=dict(+delta.food_counts),
+        symptoms_entry_count=delta.symptoms_entry_count,
+        symptom_counts=dict(+delta.symptom_counts),
+        last_eaten={
+            food_id: MbdMeal.date_time.serialize(date_time)
+            for food_id, date_time in delta.last_eaten.items()
+        },
+        expires_at=delta.expires_at,
+    )
+
+
+def _contents(item: MbdUserAggregate) -> tuple:
+    def nonzero(counts) -> dict:
+        # Decrements leave zero counts behind
+        return {key: int(count) for key, count in counts.as_dict().items() if count}
+
+    return (
+        int(item.meal_count),
+        nonzero(item.food_counts),
+        int(item.symptoms_entry_count),
+        nonzero(item.symptom_counts),
+        item.last_eaten.as_dict(),
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--user-id")
+    args = parser.parse_args()
+    rebuild_all(check_only=args.check, user_id=args.user_id)
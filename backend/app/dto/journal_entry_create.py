@@ -0,0 +1,17 @@
+from typing import Annotated
+from pydantic import BaseModel, Field
+
+from dto.food_create import FoodCreate
+from dto.meal_create import MealCreate
+
+# Most new foods a single journal entry can add; each is one write in its
+# transaction, which holds at most 100
+MAX_NEW_FOODS = 25
+
+
+class JournalEntryCreate(BaseModel):
+    meal: MealCreate
+    # Symptoms at the meal's date_time, if any
+    symptoms: list[str] = []
+    # Foods to add to the catalog, typically ones the meal introduces
+    new_foods: Annotated[list[FoodCreate], Field(max_length=MAX_NEW_FOODS)] = []
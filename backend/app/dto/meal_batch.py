@@ -0,0 +1,69 @@
+import json
+from datetime import datetime
+from typing import Literal
+
+from fastapi import Request
+from pydantic import BaseModel, ValidationError
+
+from dto.meal_create import MealCreate
+from shared.exceptions import MbdException
+from shared.ndjson import NDJSON_MEDIA_TYPE, decode_ndjson_line, iter_ndjson_lines
+
+# Most meals accepted by a single POST /meals/batch
+MAX_BATCH_MEALS = 10_000
+
+
+class MealBatchResult(BaseModel):
+    index: int
+    status: Literal["saved", "invalid", "failed"]
+    date_time: datetime | None = None
+    errors: list[str] = []
+
+
+async def read_meal_batch(request: Request) -> list[MealCreate | list[str]]:
+    """
+    Read and validate a batch of meals, sent either as a JSON array or as
+    newline-delimited JSON (Content-Type: application/x-ndjson), which is
+    validated line by line as it streams in.
+
+    Returns:
+        For each item in the batch, the validated meal, or its validation errors
+    """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        meals = []
+        async for line in iter_ndjson_lines(request.stream()):
+            _check_batch_size(len(meals) + 1)
+            try:
+                meals.append(_validate_meal(decode_ndjson_line(line)))
+            except ValueError:
+                meals.append(["Invalid JSON"])
+        return meals
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise MbdException(status_code=400, errors=["Invalid JSON"])
+
+    if not isinstance(items, list):
+        raise MbdException(status_code=400, errors=["Expected a JSON array of meals"])
+    _check_batch_size(len(items))
+
+    return [_validate_meal(item) for item in items]
+
+
+def _validate_meal(item: object) -> MealCreate | list[str]:
+    try:
+        return MealCreate.model_validate(item)
+    except ValidationError as e:
+        return [
+            f"{'.'.join(str(loc) for loc in error['loc']) or 'meal'}: {error['msg']}"
+            for error in e.errors()
+        ]
+
+
+def _check_batch_size(size: int) -> None:
+    if size > MAX_BATCH_MEALS:
+        raise MbdException(
+            status_code=413,
+            errors=[f"A batch can hold at most {MAX_BATCH_MEALS} meals"],
+        )
@@ -1,12 +1,16 @@
 import datetime
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 from pydantic import BaseModel, field_validator, validator
 from datetime import datetime
 
+from shared.days import is_timezone
+
 
 class PreferencesUpdate(BaseModel):
     defaultMealTimes: List[str]
     useThumbnails: bool
+    # An IANA timezone name; left unchanged if not given
+    timezone: Optional[str] = None
 
     @field_validator("defaultMealTimes", mode="before")
     @classmethod
@@ -28,3 +32,13 @@ class PreferencesUpdate(BaseModel):
             )
 
         return value
+
+    @field_validator("timezone")
+    @classmethod
+    def validate_timezone(cls, value):
+        if value is not None and not is_timezone(value):
+            raise ValueError(
+                f"Unknown timezone: {value}. Must be an IANA name like 'Europe/Paris'."
+            )
+
+        return value
@@ -0,0 +1,51 @@
+from typing import Iterator, Optional
+
+from foods.food import MbdFood, MbdFoodList, normalize_food_name
+
+
+class FoodCatalog:
+    """
+    Index over a user's food list, built once when the list is loaded, giving
+    constant time lookups by food ID and by normalized name.
+    Changes made through the catalog are applied to the underlying food list.
+    """
+
+    def __init__(self, food_list: MbdFoodList):
+        self.food_list = food_list
+        self._by_id: dict[str, MbdFood] = {}
+        self._by_name: dict[str, MbdFood] = {}
+
+        for food in food_list.foods:
+            self._by_id[food.food_id] = food
+            self._by_name[normalize_food_name(food.name)] = food
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[MbdFood]:
+        return iter(self._by_id.values())
+
+    def get(self, food_id: str) -> Optional[MbdFood]:
+        return self._by_id.get(food_id)
+
+    def find_by_name(self, name: str) -> Optional[MbdFood]:
+        return self._by_name.get(normalize_food_name(name))
+
+    def upsert(self, food: MbdFood) -> None:
+        """
+        Add a food, replacing any food with the same ID.
+        The food ends up last in the list, as if it were newly added.
+        """
+        existing = self._by_id.pop(food.food_id, None)
+        self._by_id[food.food_id] = food
+
+        if existing is None:
+            self.food_list.foods.append(food)
+        else:
+            self._by_name.pop(normalize_food_name(existing.name), None)
+            self.food_list.foods = list(self._by_id.values())
+
+        self._by_name[normalize_food_name(food.name)] = food
+
+    def to_dto(self) -> dict:
+        return self.food_list.to_dto()
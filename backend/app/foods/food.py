@@ -1,12 +1,22 @@
 import os
-from dotenv import load_dotenv
-from pynamodb.models import Model
-from pynamodb.attributes import UnicodeAttribute, ListAttribute, MapAttribute
+from pynamodb.attributes import (
+    UnicodeAttribute,
+    ListAttribute,
+    MapAttribute,
+    UTCDateTimeAttribute,
+    VersionAttribute,
+)
+from pynamodb.indexes import LocalSecondaryIndex, AllProjection
 
-ENV = os.getenv("ENVIRONMENT")
+from shared.config import bootstrap
+from shared.dynamodb import MbdModel
 
-if ENV is not None:
-    load_dotenv(f".env.{ENV}")
+bootstrap()
+
+
+def normalize_food_name(name: str) -> str:
+    """Food names are unique per user, ignoring case."""
+    return name.lower()
 
 
 class MbdFood(MapAttribute):
@@ -15,10 +25,11 @@ class MbdFood(MapAttribute):
     thumbnail = UnicodeAttribute()
 
     def to_dto(self) -> dict:
+        values = self.attribute_values
         return {
-            "food_id": self.food_id,
-            "name": self.name,
-            "thumbnail": self.thumbnail,
+            "food_id": values.get("food_id"),
+            "name": values.get("name"),
+            "thumbnail": values.get("thumbnail"),
         }
 
     def __hash__(self):
@@ -34,15 +45,70 @@ class MbdFood(MapAttribute):
         )
 
 
-class MbdFoodList(Model):
+class MbdFoodList(MbdModel):
     class Meta:
         table_name = os.getenv("FOODS_DB_NAME")
         region = "us-west-2"
 
     user_id = UnicodeAttribute(hash_key=True)
     foods = ListAttribute(of=MbdFood, default=lambda: [])
+    # Saves are conditional on this, so a save from a stale (e.g. cached) copy fails
+    version = VersionAttribute()
 
     def to_dto(self) -> dict:
         return {
             "foods": [food.to_dto() for food in self.foods],
         }
+
+
+class MbdUserFoodNameIndex(LocalSecondaryIndex):
+    """
+    Looks up a user's food by normalized name
+    """
+
+    class Meta:
+        index_name = "name_key-index"
+        projection = AllProjection()
+
+    user_id = UnicodeAttribute(hash_key=True)
+    name_key = UnicodeAttribute(range_key=True)
+
+
+class MbdUserFood(MbdModel):
+    """
+    A single food in a user's catalog, stored as its own item so that adding a
+    food costs the same however large the catalog is.
+    Replaces the single-item layout of MbdFoodList.
+    """
+
+    class Meta:
+        table_name = os.getenv("USER_FOODS_DB_NAME")
+        region = "us-west-2"
+
+    user_id = UnicodeAttribute(hash_key=True)
+    food_id = UnicodeAttribute(range_key=True)
+    name = UnicodeAttribute()
+    name_key = UnicodeAttribute()
+    thumbnail = UnicodeAttribute()
+    # Keeps the catalog in the order foods were added, like the old list
+    created_at = UTCDateTimeAttribute()
+
+    name_index = MbdUserFoodNameIndex()
+
+    @classmethod
+    def from_food(cls, user_id: str, food: MbdFood, created_at) -> "MbdUserFood":
+        return cls(
+            user_id=user_id,
+            food_id=food.food_id,
+            name=food.name,
+            name_key=normalize_food_name(food.name),
+            thumbnail=food.thumbnail,
+            created_at=created_at,
+        )
+
+    def to_food(self) -> MbdFood:
+        return MbdFood(
+            food_id=self.food_id,
+            name=self.name,
+            thumbnail=self.thumbnail,
+        )
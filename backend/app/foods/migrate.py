@@ -0,0 +1,65 @@
+"""
+Online migration of food catalogs from MbdFoodList (one item holding every food
+of a user) to MbdUserFood (one item per food).
+
+1. Deploy with FOODS_STORAGE_MODE=dual, so foods added from then on are written
+   to both layouts while reads still come from MbdFoodList
+2. Run this script against the environment:
+   cd app && PYTHONPATH=. ENVIRONMENT=<env> uv run python -m foods.migrate
+3. Deploy with FOODS_STORAGE_MODE=items
+
+The script is safe to re-run. Foods that already exist in the new table are left
+alone: they were written by the dual-write path, so they are at least as recent
+as the copy in MbdFoodList.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+
+from pynamodb.exceptions import PutError
+
+from foods.food import MbdFoodList, MbdUserFood
+
+logger = logging.getLogger("uvicorn.error")
+
+# Migrated foods sort before anything added through the app, in list order
+MIGRATED_CREATED_AT = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def migrate_food_list(food_list: MbdFoodList) -> int:
+    """
+    Copy a user's food list into the per-food table.
+
+    Returns:
+        The number of foods copied
+    """
+    copied = 0
+    for position, food in enumerate(food_list.foods):
+        user_food = MbdUserFood.from_food(
+            food_list.user_id,
+            food,
+            MIGRATED_CREATED_AT + timedelta(microseconds=position),
+        )
+        try:
+            user_food.save(condition=MbdUserFood.food_id.does_not_exist())
+            copied += 1
+        except PutError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+
+    return copied
+
+
+def migrate_all() -> None:
+    users = 0
+    foods = 0
+    for food_list in MbdFoodList.scan():
+        foods += migrate_food_list(food_list)
+        users += 1
+
+    logger.info("Migrated %d foods for %d users", foods, users)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate_all()
@@ -0,0 +1,203 @@
+"""
+Async data access for the user's food catalog.
+"""
+
+import logging
+import os
+import traceback
+from datetime import datetime, timezone
+from typing import Optional
+
+from pynamodb.exceptions import PutError
+
+from dto.food_create import FoodCreate
+from foods import suggested
+from foods.catalog import FoodCatalog
+from foods.food import MbdFood, MbdFoodList, MbdUserFood, normalize_food_name
+from preferences import repository as preferences_repository
+from shared.cache import ModelCache
+from shared.dynamodb import MbdTransaction
+from shared.exceptions import MbdException
+from shared.executor import run_blocking
+
+logger = logging.getLogger("uvicorn.error")
+
+# Where food catalogs are stored, while moving from one MbdFoodList item per user
+# to one MbdUserFood item per food (see foods/migrate.py):
+# - "list": MbdFoodList only
+# - "dual": reads from MbdFoodList, writes go to both layouts
+# - "items": MbdUserFood only
+FOODS_STORAGE_MODE = os.getenv("FOODS_STORAGE_MODE", "list")
+
+# Caches the food list behind each user's catalog, in either storage mode
+food_list_cache = ModelCache(MbdFoodList)
+
+
+async def get_food_catalog(user_id: str) -> FoodCatalog:
+    return await run_blocking(_get_food_catalog, user_id)
+
+
+async def get_food(user_id: str, food_id: str) -> Optional[MbdFood]:
+    return await run_blocking(_get_food, user_id, food_id)
+
+
+async def add_food(user_id: str, request: FoodCreate) -> MbdFood:
+    """
+    Add a food to the user's catalog, replacing any food with the same ID.
+
+    Raises:
+        MbdException: If another food already has the same name
+    """
+    food = MbdFood(
+        food_id=request.food_id,
+        name=request.name,
+        thumbnail=request.thumbnail,
+    )
+    return await run_blocking(_add_food, user_id, food)
+
+
+async def get_suggested_foods(user_id: str, meal_type: str) -> list[MbdFood]:
+    zone = await preferences_repository.get_timezone(user_id)
+    return await run_blocking(_get_suggested_foods, user_id, meal_type, zone)
+
+
+def _get_suggested_foods(user_id: str, meal_type: str, zone: str) -> list[MbdFood]:
+    return suggested.get_suggested_foods(
+        user_id, meal_type, _get_food_catalog(user_id), zone
+    )
+
+
+def _get_food_catalog(user_id: str) -> FoodCatalog:
+    return FoodCatalog(
+        food_list_cache.get(user_id, lambda: _load_food_list(user_id))
+    )
+
+
+def _load_food_list(user_id: str) -> MbdFoodList:
+    if FOODS_STORAGE_MODE == "items":
+        user_foods = sorted(
+            MbdUserFood.query(user_id), key=lambda user_food: user_food.created_at
+        )
+        # Not saved; the list only backs the catalog's in-memory index
+        return MbdFoodList(
+            user_id=user_id,
+            foods=[user_food.to_food() for user_food in user_foods],
+        )
+
+    try:
+        return MbdFoodList.get(user_id)
+    except MbdFoodList.DoesNotExist:
+        return MbdFoodList(user_id=user_id)
+    except Exception:
+        logger.error("Exception occurred: %s", traceback.format_exc())
+        raise
+
+
+def _get_food(user_id: str, food_id: str) -> Optional[MbdFood]:
+    if FOODS_STORAGE_MODE == "items":
+        try:
+            return MbdUserFood.get(user_id, food_id).to_food()
+        except MbdUserFood.DoesNotExist:
+            return None
+
+    return _get_food_catalog(user_id).get(food_id)
+
+
+def _add_food(user_id: str, food: MbdFood) -> MbdFood:
+    created_at = datetime.now(timezone.utc)
+
+    if FOODS_STORAGE_MODE == "items":
+        # A name lookup and a single put, whatever the size of the catalog
+        if _find_user_food_by_name(user_id, food.name) is not None:
+            raise _food_name_exists(food.name)
+
+        MbdUserFood.from_food(user_id, food, created_at).save()
+        food_list_cache.invalidate(user_id)
+        return food
+
+    try:
+        _add_food_to_list(user_id, food)
+    except PutError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+        # The cached list was out of date; start over from the database
+        food_list_cache.invalidate(user_id)
+        _add_food_to_list(user_id, food)
+    food_list_cache.invalidate(user_id)
+
+    if FOODS_STORAGE_MODE == "dual":
+        MbdUserFood.from_food(user_id, food, created_at).save()
+
+    return food
+
+
+def add_foods_to_transaction(
+    write: MbdTransaction, user_id: str, foods: list[MbdFood]
+) -> None:
+    """
+    Add foods to the user's catalog as part of a transaction, as `add_food`
+    does. The cached catalog is changed along with it, so invalidate
+    `food_list_cache` once the transaction is over, whether it committed or not.
+    If the food list changed since it was cached, the transaction fails with a
+    TransactionConflict on the MbdFoodList.
+
+    Raises:
+        MbdException: If another food already has the same name as one of them
+    """
+    names = set()
+    for food in foods:
+        if normalize_food_name(food.name) in names:
+            raise _food_name_exists(food.name)
+        names.add(normalize_food_name(food.name))
+
+    created_at = datetime.now(timezone.utc)
+
+    if FOODS_STORAGE_MODE == "items":
+        for food in foods:
+            if _find_user_food_by_name(user_id, food.name) is not None:
+                raise _food_name_exists(food.name)
+            write.save(MbdUserFood.from_food(user_id, food, created_at))
+        return
+
+    catalog = _get_food_catalog(user_id)
+    for food in foods:
+        if catalog.find_by_name(food.name) is not None:
+            raise _food_name_exists(food.name)
+        catalog.upsert(food)
+    # Conditional on the list's version, as its saves always are
+    write.save(
+        catalog.food_list,
+        conflict="Your foods changed while saving. Please try again.",
+    )
+
+    if FOODS_STORAGE_MODE == "dual":
+        for food in foods:
+            write.save(MbdUserFood.from_food(user_id, food, created_at))
+
+
+def _add_food_to_list(user_id: str, food: MbdFood) -> None:
+    catalog = _get_food_catalog(user_id)
+
+    if catalog.find_by_name(food.name) is not None:
+        raise _food_name_exists(food.name)
+
+    catalog.upsert(food)
+    catalog.food_list.save()
+
+
+def _find_user_food_by_name(user_id: str, name: str) -> Optional[MbdUserFood]:
+    return next(
+        MbdUserFood.name_index.query(
+            user_id,
+            range_key_condition=MbdUserFood.name_key == normalize_food_name(name),
+            limit=1,
+        ),
+        None,
+    )
+
+
+def _food_name_exists(name: str) -> MbdException:
+    return MbdException(
+        status_code=400,
+        errors=[f"Food with name {name} already exists."],
+    )
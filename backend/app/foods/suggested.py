@@ -1,102 +1,134 @@
-from datetime import datetime, timedelta, timezone
-from zoneinfo import ZoneInfo
-from typing import List, Set
+"""
+Food suggestions for a meal about to be entered: the foods of yesterday's meals
+of the same type, and the foods the user eats most often.
+
+The two come from two small reads:
+- Yesterday is the user's local yesterday. Its meals of the type are read from
+  the meal type index, and their foods are taken as the meals recorded them.
+- Frequent foods are counted from the daily aggregates. These are UTC days, so
+  "recent meals" are the meals of the most recent UTC days that hold at least
+  FREQUENT_MEAL_COUNT meals between them, not exactly the last 20. The counts
+  only hold food IDs, so foods are looked up in the catalog: a renamed food is
+  suggested under its current name, and a deleted one isn't suggested.
+"""
+
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
 from collections import Counter
 
+from aggregates.aggregates import MbdUserAggregate, get_recent_days
+from foods.catalog import FoodCatalog
 from foods.food import MbdFood
 from meals.meal import MbdMeal
+from shared.days import DEFAULT_TIMEZONE, LocalDays
+
+# Frequent foods are drawn from (at least) this many of the user's most recent meals
+FREQUENT_MEAL_COUNT = 20
+# Share of those meals a food must appear in to be suggested
+FREQUENT_FOOD_RATIO = 0.6
+# How far back to look for recent meals
+RECENT_WINDOW_DAYS = 30
+# All get_frequent_foods reads of a day aggregate
+FREQUENT_FOODS_ATTRIBUTES = (MbdUserAggregate.meal_count, MbdUserAggregate.food_counts)
+
+
+def get_suggested_foods(
+    user_id: str,
+    meal_type: str,
+    catalog: FoodCatalog,
+    zone: str = DEFAULT_TIMEZONE,
+) -> List[MbdFood]:
+    yesterday_start, yesterday_end = get_yesterday_start_and_end(zone)
 
-
-def get_suggested_foods(user_id: str, meal_type: str) -> List[MbdFood]:
     # Get foods from yesterday's meals of the specified type
-    yesterdays_foods_map = get_yesterdays_foods(user_id, meal_type)
+    yesterdays_foods_map = get_yesterdays_foods(
+        user_id, meal_type, yesterday_start, yesterday_end
+    )
 
-    # Get frequently eaten foods from the last 20 meals
-    frequent_foods_map = get_frequent_foods(user_id)
+    # Get frequently eaten foods from the daily aggregates, not the meals themselves
+    frequent_foods_map = get_frequent_foods(
+        get_recent_days(
+            user_id, RECENT_WINDOW_DAYS, attributes=FREQUENT_FOODS_ATTRIBUTES
+        ),
+        catalog,
+    )
     return list(yesterdays_foods_map | frequent_foods_map)
 
 
-def get_yesterdays_foods(user_id: str, meal_type: str) -> Set[MbdFood]:
+def get_yesterdays_foods(
+    user_id: str,
+    meal_type: str,
+    yesterday_start: datetime,
+    yesterday_end: datetime,
+) -> Set[MbdFood]:
     """
-    Get foods from yesterday's meals of the specified type.
+    Get foods from yesterday's meals of the specified type. Only those meals
+    are read, from the meal type index, and only their foods.
 
     Args:
         user_id: The user ID
         meal_type: The meal type (e.g., "Breakfast", "Lunch", "Dinner")
+        yesterday_start: Start of the user's "yesterday", in UTC
+        yesterday_end: End of the user's "yesterday", in UTC
 
     Returns:
-        Set of food IDs from yesterday's meals of the specified type
+        Set of foods from yesterday's meals of the specified type
     """
-
-    yesterdays_meals = MbdMeal.query(
+    meals = MbdMeal.query_projected(
         hash_key=user_id,
-        range_key_condition=MbdMeal.date_time.between(*get_yesterday_start_and_end()),
+        range_key_condition=MbdMeal.meal_type_between(
+            meal_type, yesterday_start, yesterday_end
+        ),
+        attributes=(MbdMeal.foods,),
+        index=MbdMeal.meal_type_index,
     )
 
-    # Filter for the specific meal type
-    yesterdays_meals_of_type = [
-        meal for meal in yesterdays_meals if meal.meal_type == meal_type
-    ]
-
     yesterdays_foods = set()
-    for meal in yesterdays_meals_of_type:
+    for meal in meals:
         yesterdays_foods.update(meal.foods)
 
     return yesterdays_foods
 
 
-def get_yesterday_start_and_end() -> tuple[datetime, datetime]:
-    # Get the current date from the user's timezone (Pacific time for now).
-    # Then, calculate the start and end of their "yesterday" in UTC.
-    # All dates are input as local time, but stored UTC
-    yesterday = datetime.now(ZoneInfo("US/Pacific")) - timedelta(days=1)
-    yesterday_date = yesterday.date()
-    yesterday_start = datetime.combine(
-        yesterday_date, datetime.min.time(), tzinfo=timezone.utc
-    )
-
-    yesterday_end = yesterday_start + timedelta(days=1)
-
-    return yesterday_start, yesterday_end
+def get_yesterday_start_and_end(
+    zone: str = DEFAULT_TIMEZONE, now: Optional[datetime] = None
+) -> tuple[datetime, datetime]:
+    """
+    The start of the user's "yesterday" in their timezone and the start of their
+    today, in UTC: all dates are input as local time, but stored UTC.
+    """
+    return LocalDays(zone, now).day(1)
 
 
-def get_frequent_foods(user_id: str) -> Set[MbdFood]:
+def get_frequent_foods(
+    recent_days: Iterable[MbdUserAggregate], catalog: FoodCatalog
+) -> Set[MbdFood]:
     """
-    Get foods that appear in >80% of the user's last 20 meals.
+    Get foods that appear in at least 60% of the user's recent meals: those of
+    the most recent days that hold at least 20 meals between them.
 
     Args:
-        user_id: The user ID
+        recent_days: The user's daily aggregates, newest first
+        catalog: The user's food catalog, to look the foods up in
 
     Returns:
-        Set of food IDs that appear frequently
+        Set of foods that appear frequently, as the catalog has them. Foods no
+        longer in the catalog are left out.
     """
-    # Get the last 30 days of meals (to ensure we have enough)
-    now = datetime.now()
-    thirty_days_ago = now - timedelta(days=30)
-
-    # Query meals from the last 30 days
-    recent_meals = MbdMeal.query(
-        hash_key=user_id,
-        range_key_condition=MbdMeal.date_time.between(thirty_days_ago, now),
-    )
-
-    # Sort by date_time in descending order and take the last 20
-    last_20_meals = sorted(recent_meals, key=lambda meal: meal.date_time, reverse=True)[
-        :20
-    ]
-
-    # Count food occurrences
+    meal_count = 0
     food_counter = Counter()
-    frequent_foods_map = {}
-    for meal in last_20_meals:
-        for food in meal.foods:
-            food_counter[food.food_id] += 1
-            frequent_foods_map[food.food_id] = food
+    for day in recent_days:
+        meal_count += day.meal_count
+        food_counter.update(day.food_counts_by_id())
+        if meal_count >= FREQUENT_MEAL_COUNT:
+            break
 
     frequent_foods = {
-        frequent_foods_map[food_id]
+        catalog.get(food_id)
         for food_id, count in food_counter.items()
-        if count >= len(last_20_meals) * 0.6
+        if count >= meal_count * FREQUENT_FOOD_RATIO
     }
+    # Counts may outlive a food's catalog entry
+    frequent_foods.discard(None)
 
     return frequent_foods
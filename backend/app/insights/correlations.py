@@ -0,0 +1,194 @@
+"""
+Food-symptom correlations: how often each symptom follows each food within a
+lag window, compared with how often it follows meals in general.
+
+History is bucketed by hour. Every hour in which a meal was eaten gets a bit
+position, and each food becomes a bitset (a Python int) of the meal hours it
+was eaten in. For each symptom and window, another bitset marks the meal hours
+that the symptom followed within the window; one AND plus a popcount then
+scores a food against it. The per-meal work happens inside big-int operations,
+64 meal hours per machine word, so five years of history costs milliseconds
+rather than a loop over every meal for every food and symptom.
+
+For a food F, symptom S and window [min_lag, max_lag) hours:
+- confidence: share of the hours F was eaten that S was reported within the window after
+- baseline: the same share over the hours any meal was eaten
+- lift: confidence / baseline; above 1 means S follows F more than it follows meals overall
+"""
+
+import bisect
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, Union
+
+from meals.compact import CompactMeals, to_timestamp
+
+if TYPE_CHECKING:
+    from meals.meal import MbdMeal
+    from symptoms.symptoms import MbdSymptomsEntry
+
+BUCKET_SECONDS = 3600
+BUCKET_US = BUCKET_SECONDS * 1_000_000
+DEFAULT_WINDOWS = ((0, 6), (6, 24), (24, 72))
+# Foods eaten in fewer hours than this aren't scored; their scores are noise
+DEFAULT_MIN_OCCURRENCES = 3
+
+
+@dataclass(slots=True)
+class Correlation:
+    food_id: str
+    food_name: str
+    symptom: str
+    min_lag_hours: int
+    max_lag_hours: int
+    # Hours the food was eaten, and how many of those the symptom followed
+    occurrences: int
+    co_occurrences: int
+    confidence: float
+    lift: float
+
+    def to_dto(self) -> dict:
+        return {
+            "food_id": self.food_id,
+            "food_name": self.food_name,
+            "symptom": self.symptom,
+            "min_lag_hours": self.min_lag_hours,
+            "max_lag_hours": self.max_lag_hours,
+            "occurrences": self.occurrences,
+            "co_occurrences": self.co_occurrences,
+            "confidence": round(self.confidence, 4),
+            "lift": round(self.lift, 4),
+        }
+
+
+def parse_windows(windows: str) -> tuple[tuple[int, int], ...]:
+    """
+    Parse lag windows written as "0-6,6-24" (hours). Raises ValueError if they
+    are malformed or empty.
+    """
+    parsed = []
+    for window in windows.split(","):
+        min_lag, _, max_lag = window.strip().partition("-")
+        start, end = int(min_lag), int(max_lag)
+        if start < 0 or end <= start:
+            raise ValueError(f"Invalid lag window: {window}")
+        parsed.append((start, end))
+
+    return tuple(parsed)
+
+
+def compute_correlations(
+    meals: Union[CompactMeals, Iterable["MbdMeal"]],
+    symptoms_entries: Iterable["MbdSymptomsEntry"],
+    windows: Iterable[tuple[int, int]] = DEFAULT_WINDOWS,
+    min_occurrences: int = DEFAULT_MIN_OCCURRENCES,
+) -> list[Correlation]:
+    """
+    Score every food against every symptom, for each lag window.
+
+    Returns:
+        Correlations where the symptom followed the food at least once, highest
+        lift first
+    """
+    if not isinstance(meals, CompactMeals):
+        meals = CompactMeals.from_meals(meals)
+    if not meals:
+        return []
+
+    # Symptom attribute values are read straight from each model's dict: going
+    # through the attribute descriptors costs more than all the bitset work
+    symptoms_entries = [entry.attribute_values for entry in symptoms_entries]
+    symptom_timestamps = [
+        to_timestamp(values["date_time"]) for values in symptoms_entries
+    ]
+    first_meal = min(meals.timestamps)
+    origin = min(first_meal, min(symptom_timestamps, default=first_meal))
+
+    meal_foods: dict[int, list] = {}
+    for timestamp, foods in zip(meals.timestamps, meals.foods):
+        meal_foods.setdefault((timestamp - origin) // BUCKET_US, []).extend(foods)
+
+    symptom_hours: dict[str, list[int]] = {}
+    for values, timestamp in zip(symptoms_entries, symptom_timestamps):
+        hour = (timestamp - origin) // BUCKET_US
+        for symptom in values.get("symptoms", ()):
+            symptom_hours.setdefault(symptom, []).append(hour)
+
+    # Bit i of every bitset stands for the i-th hour in which a meal was eaten
+    meal_hours = sorted(meal_foods)
+    food_bits: dict[str, list[int]] = {}
+    food_names: dict[str, str] = {}
+    for bit, hour in enumerate(meal_hours):
+        for food in meal_foods[hour]:
+            food_bits.setdefault(food.food_id, []).append(bit)
+            food_names[food.food_id] = food.name
+
+    food_masks = {}
+    food_counts = {}
+    for food_id, bits in food_bits.items():
+        mask = _to_mask(bits)
+        if mask.bit_count() >= min_occurrences:
+            food_masks[food_id] = mask
+            food_counts[food_id] = mask.bit_count()
+
+    correlations = []
+    for min_lag, max_lag in windows:
+        for symptom, hours in symptom_hours.items():
+            followed = _followed_by(meal_hours, hours, min_lag, max_lag)
+            baseline = followed.bit_count() / len(meal_hours)
+
+            for food_id, occurrences in food_counts.items():
+                co_occurrences = (food_masks[food_id] & followed).bit_count()
+                if co_occurrences == 0:
+                    continue
+
+                confidence = co_occurrences / occurrences
+                correlations.append(
+                    Correlation(
+                        food_id=food_id,
+                        food_name=food_names[food_id],
+                        symptom=symptom,
+                        min_lag_hours=min_lag,
+                        max_lag_hours=max_lag,
+                        occurrences=occurrences,
+                        co_occurrences=co_occurrences,
+                        confidence=confidence,
+                        lift=confidence / baseline,
+                    )
+                )
+
+    correlations.sort(
+        key=lambda correlation: (-correlation.lift, -correlation.co_occurrences)
+    )
+    return correlations
+
+
+def _to_mask(bits: list[int]) -> int:
+    # Setting bits in a byte array and converting once is linear; OR-ing one bit
+    # at a time into an int copies the whole int for every bit
+    data = bytearray(max(bits) // 8 + 1)
+    for bit in bits:
+        data[bit >> 3] |= 1 << (bit & 7)
+
+    return int.from_bytes(data, "little")
+
+
+def _followed_by(
+    meal_hours: list[int], symptom_hours: list[int], min_lag: int, max_lag: int
+) -> int:
+    """
+    Bitset of the meal hours (positions in `meal_hours`) that one of
+    `symptom_hours` follows by at least `min_lag` and under `max_lag` hours.
+    """
+    # A symptom at hour s follows the meal hours in (s - max_lag, s - min_lag],
+    # a contiguous run of bits. Runs are marked in a string of "0"s and "1"s,
+    # most significant bit first, which int() converts in linear time.
+    digits = bytearray(b"0" * len(meal_hours))
+    for hour in symptom_hours:
+        first = bisect.bisect_right(meal_hours, hour - max_lag)
+        last = bisect.bisect_right(meal_hours, hour - min_lag)
+        if first < last:
+            digits[len(meal_hours) - last : len(meal_hours) - first] = b"1" * (
+                last - first
+            )
+
+    return int(digits, 2)
@@ -0,0 +1,50 @@
+"""
+Async access to insights. Scoring runs on the database thread pool along with
+the reads, as it is CPU-bound.
+"""
+
+from datetime import datetime
+from typing import Iterable, Optional
+
+from insights.correlations import Correlation, compute_correlations
+from meals.compact import CompactMeals
+from meals.meal import MbdMeal
+from shared.executor import run_blocking
+from symptoms.symptoms import MbdSymptomsEntry
+
+
+async def get_correlations(
+    user_id: str,
+    start: Optional[datetime],
+    windows: Iterable[tuple[int, int]],
+    min_occurrences: int,
+) -> list[Correlation]:
+    return await run_blocking(
+        _get_correlations, user_id, start, tuple(windows), min_occurrences
+    )
+
+
+def _get_correlations(
+    user_id: str,
+    start: Optional[datetime],
+    windows: tuple[tuple[int, int], ...],
+    min_occurrences: int,
+) -> list[Correlation]:
+    # Only what the scoring reads: meal types and user IDs are left behind.
+    # Meals are decoded compactly, straight from the responses.
+    meals = CompactMeals.decode(
+        MbdMeal.query_raw(
+            hash_key=user_id,
+            range_key_condition=None if start is None else MbdMeal.date_time >= start,
+            attributes=(MbdMeal.foods,),
+        )
+    )
+    symptoms_entries = MbdSymptomsEntry.query_projected(
+        hash_key=user_id,
+        range_key_condition=(
+            None if start is None else MbdSymptomsEntry.date_time >= start
+        ),
+        attributes=(MbdSymptomsEntry.symptoms,),
+    )
+
+    return compute_correlations(meals, symptoms_entries, windows, min_occurrences)
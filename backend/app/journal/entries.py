@@ -0,0 +1,114 @@
+"""
+Journal entries: a meal, the symptoms felt at the same time and any foods new to
+the catalog, written together in one DynamoDB transaction, so they take a single
+round trip and are saved all together or not at all.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from aggregates.aggregates import apply_deltas, meal_deltas, symptoms_entry_deltas
+from dto.journal_entry_create import JournalEntryCreate
+from foods import repository as foods_repository
+from foods.food import MbdFood, MbdFoodList
+from meals.meal import MbdMeal
+from meals.repository import to_meal
+from shared.dynamodb import TransactionConflict, transaction
+from shared.executor import run_blocking
+from symptoms.symptoms import MbdSymptomsEntry
+
+
+@dataclass
+class JournalEntry:
+    meal: MbdMeal
+    symptoms_entry: Optional[MbdSymptomsEntry]
+    new_foods: list[MbdFood]
+
+    def to_dto(self) -> dict:
+        return {
+            "meal": self.meal.to_dto(),
+            "symptoms": (
+                None if self.symptoms_entry is None else self.symptoms_entry.to_dto()
+            ),
+            "new_foods": [food.to_dto() for food in self.new_foods],
+        }
+
+
+async def save_journal_entry(
+    user_id: str,
+    request: JournalEntryCreate,
+    client_request_token: Optional[str] = None,
+) -> JournalEntry:
+    """
+    Unlike POST /meals and /symptoms, doesn't replace a meal or symptoms entry
+    already at the same date_time.
+
+    Raises:
+        MbdException: A 409 if there is one, or a 400 if a new food's name is taken
+    """
+    entry = JournalEntry(
+        meal=to_meal(user_id, request.meal),
+        symptoms_entry=(
+            MbdSymptomsEntry(
+                user_id=user_id,
+                date_time=request.meal.date_time,
+                symptoms=request.symptoms,
+            )
+            if request.symptoms
+            else None
+        ),
+        new_foods=[
+            MbdFood(food_id=food.food_id, name=food.name, thumbnail=food.thumbnail)
+            for food in request.new_foods
+        ],
+    )
+    await run_blocking(_save_journal_entry, user_id, entry, client_request_token)
+
+    return entry
+
+
+def _save_journal_entry(
+    user_id: str, entry: JournalEntry, client_request_token: Optional[str]
+) -> None:
+    try:
+        _write_journal_entry(user_id, entry, client_request_token)
+    except TransactionConflict as e:
+        if not any(isinstance(model, MbdFoodList) for model in e.models):
+            raise
+        # The cached food list was out of date; start over from the database. The
+        # token can't be reused for a transaction with a different food list
+        _write_journal_entry(user_id, entry, None)
+
+    deltas = meal_deltas([entry.meal])
+    if entry.symptoms_entry is not None:
+        symptoms_entry_deltas([entry.symptoms_entry], deltas=deltas)
+    apply_deltas(user_id, deltas)
+
+
+def _write_journal_entry(
+    user_id: str, entry: JournalEntry, client_request_token: Optional[str]
+) -> None:
+    date_time = entry.meal.date_time.isoformat()
+    try:
+        with transaction(
+            "Failed to save journal entry. Please try again.",
+            client_request_token=client_request_token,
+        ) as write:
+            write.save(
+                entry.meal,
+                condition=MbdMeal.date_time.does_not_exist(),
+                conflict=f"A meal already exists at {date_time}",
+            )
+            if entry.symptoms_entry is not None:
+                write.save(
+                    entry.symptoms_entry,
+                    condition=MbdSymptomsEntry.date_time.does_not_exist(),
+                    conflict=f"A symptoms entry already exists at {date_time}",
+                )
+            if entry.new_foods:
+                foods_repository.add_foods_to_transaction(
+                    write, user_id, entry.new_foods
+                )
+    finally:
+        if entry.new_foods:
+            foods_repository.food_list_cache.invalidate(user_id)
@@ -0,0 +1,170 @@
+"""
+Streaming export of a user's whole journal: meals and symptom entries, merged
+oldest first, as NDJSON or CSV.
+
+Everything is a generator pipeline over paged queries, so memory use stays at
+about two pages per table whatever the length of the history: the next page of
+each table is read on the database thread pool while the current one is being
+written out.
+"""
+
+import asyncio
+import csv
+import io
+from typing import AsyncIterator, Iterable, Optional, Type, Union
+
+from meals.meal import MbdMeal
+from shared.dynamodb import MbdModel
+from shared.executor import run_blocking
+from shared.ndjson import NDJSON_MEDIA_TYPE
+from shared.responses import dumps
+from symptoms.symptoms import MbdSymptomsEntry
+
+EXPORT_FORMATS = {
+    "ndjson": NDJSON_MEDIA_TYPE,
+    "csv": "text/csv",
+}
+# Items read per query page
+EXPORT_PAGE_SIZE = 500
+# Output is sent in chunks of about this many bytes
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+CSV_COLUMNS = ["type", "date_time", "meal_type", "foods", "symptoms"]
+
+JournalItem = Union[MbdMeal, MbdSymptomsEntry]
+
+
+async def export_journal(user_id: str, export_format: str) -> AsyncIterator[str]:
+    """
+    Yields the user's journal, oldest first, in chunks of the given format
+    ("ndjson" or "csv").
+    """
+    items = merge_by_date_time(
+        iter_user_items(MbdMeal, user_id), iter_user_items(MbdSymptomsEntry, user_id)
+    )
+    if export_format == "csv":
+        lines = _to_csv_lines(items)
+    else:
+        lines = _to_ndjson_lines(items)
+
+    async for chunk in _buffer(lines, EXPORT_CHUNK_BYTES):
+        yield chunk
+
+
+async def iter_user_items(
+    model: Type[MbdModel], user_id: str, page_size: int = EXPORT_PAGE_SIZE
+) -> AsyncIterator[MbdModel]:
+    """Yields every item in the user's partition, oldest first, a page at a time."""
+    page, last_evaluated_key = await run_blocking(
+        _read_page, model, user_id, page_size, None
+    )
+    while True:
+        next_page = None
+        if last_evaluated_key is not None:
+            # Read ahead while the caller works through this page
+            next_page = asyncio.ensure_future(
+                run_blocking(_read_page, model, user_id, page_size, last_evaluated_key)
+            )
+
+        try:
+            for item in page:
+                yield item
+        except BaseException:
+            if next_page is not None:
+                next_page.cancel()
+            raise
+
+        if next_page is None:
+            return
+        page, last_evaluated_key = await next_page
+
+
+async def merge_by_date_time(
+    *streams: AsyncIterator[JournalItem],
+) -> AsyncIterator[JournalItem]:
+    """Merges streams that are each sorted by date_time into one sorted stream."""
+    heads: list[Optional[JournalItem]] = [
+        await anext(stream, None) for stream in streams
+    ]
+    while True:
+        candidates = [i for i, head in enumerate(heads) if head is not None]
+        if not candidates:
+            return
+
+        i = min(candidates, key=lambda i: heads[i].date_time)
+        yield heads[i]
+        heads[i] = await anext(streams[i], None)
+
+
+def _read_page(
+    model: Type[MbdModel],
+    user_id: str,
+    page_size: int,
+    last_evaluated_key: Optional[dict],
+) -> tuple[list[MbdModel], Optional[dict]]:
+    # Everything the export writes out, without the user ID on every item
+    results = model.query_projected(
+        hash_key=user_id,
+        attributes=model.DTO_ATTRIBUTES,
+        limit=page_size,
+        last_evaluated_key=last_evaluated_key,
+    )
+    items = list(results)
+
+    return items, results.last_evaluated_key
+
+
+def _item_type(item: JournalItem) -> str:
+    return "meal" if isinstance(item, MbdMeal) else "symptoms"
+
+
+async def _to_ndjson_lines(items: AsyncIterator[JournalItem]) -> AsyncIterator[str]:
+    async for item in items:
+        yield dumps({"type": _item_type(item), **item.to_dto()}).decode("utf-8") + "\n"
+
+
+async def _to_csv_lines(items: AsyncIterator[JournalItem]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(row: Iterable) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        return buffer.getvalue()
+
+    yield line(CSV_COLUMNS)
+    async for item in items:
+        if isinstance(item, MbdMeal):
+            row = [
+                "meal",
+                item.date_time.isoformat(),
+                item.meal_type,
+                "; ".join(food.name for food in item.foods),
+                "",
+            ]
+        else:
+            row = [
+                "symptoms",
+                item.date_time.isoformat(),
+                "",
+                "",
+                "; ".join(item.symptoms),
+            ]
+        yield line(row)
+
+
+async def _buffer(lines: AsyncIterator[str], size: int) -> AsyncIterator[str]:
+    # One chunk per line would mean a send per item; group them instead
+    chunk = []
+    length = 0
+    async for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(chunk)
+            chunk = []
+            length = 0
+
+    if chunk:
+        yield "".join(chunk)
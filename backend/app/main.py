@@ -1,40 +1,50 @@
-from datetime import datetime, timedelta, timezone
 import logging
 import os
-from typing import Annotated
-import uuid
-import traceback
+from typing import Annotated, Literal
 
-from fastapi import FastAPI, Header, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import Depends, FastAPI, Header, Query, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from mangum import Mangum
 from dto.food_create import FoodCreate
+from dto.journal_entry_create import JournalEntryCreate
+from dto.meal_batch import MealBatchResult, read_meal_batch
 from dto.meal_create import MealCreate
 from dto.meal_update import MealUpdate
 from dto.preferences_update import PreferencesUpdate
 from dto.symptoms_create import SymptomsCreate
-from foods.food import MbdFood, MbdFoodList
-from meals.meal import MbdMeal
-from symptoms.symptoms import MbdSymptomsEntry
-from shared.auth import get_user_id
-from preferences.preferences import MbdPreferences
-from dotenv import load_dotenv
-from foods.suggested import get_suggested_foods
+from insights.correlations import (
+    DEFAULT_MIN_OCCURRENCES,
+    DEFAULT_WINDOWS,
+    parse_windows,
+)
+from shared.auth import current_user_id
+from shared.compression import CompressionMiddleware
+from shared.config import bootstrap
+from shared.correlation import CorrelationIdMiddleware
+from shared.days import LocalDays
+from shared.etag import ETAG_HEADER, conditional, content_etag, version_etag
 from shared.exceptions import MbdException
-from pynamodb.connection import Connection
-
-ENV = os.getenv("ENVIRONMENT")
+from shared.idempotency import REPLAYED_HEADER, IdempotentRequest, idempotent_request
+from shared.lazy import lazy_import
+from shared.metrics import MetricsMiddleware
+from shared.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from shared.responses import FastJSONResponse, dumps
 
 logger = logging.getLogger("uvicorn.error")
-logger.setLevel(logging.INFO)
 
+bootstrap()
 
-if ENV is not None:
-    logger.info("Loading environment: %s", ENV)
-    load_dotenv(f".env.{ENV}")
-else:
-    logger.warning("Hmm... no ENV value set")
+# The repositories and the journal export pull in PynamoDB and botocore, which
+# dominate import time.
+# They are loaded by the first request that uses them rather than at cold start.
+foods_repository = lazy_import("foods.repository")
+meals_repository = lazy_import("meals.repository")
+symptoms_repository = lazy_import("symptoms.repository")
+preferences_repository = lazy_import("preferences.repository")
+journal_export = lazy_import("journal.export")
+journal_entries = lazy_import("journal.entries")
+insights_repository = lazy_import("insights.repository")
 
 app = FastAPI(root_path="/api/v1")
 
@@ -47,37 +57,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["access-control-allow-origin"],
+    expose_headers=[
+        "access-control-allow-origin",
+        NEXT_CURSOR_HEADER,
+        ETAG_HEADER,
+        REPLAYED_HEADER,
+    ],
 )
+# Inside the metrics, so request timings include compression
+app.add_middleware(CompressionMiddleware)
+# TODO: Move to METRICS_EXPORTER=otel once the ADOT Lambda layer is deployed
+app.add_middleware(MetricsMiddleware)
+# Added last so it wraps everything else, including CORS
+app.add_middleware(CorrelationIdMiddleware)
+
+# History endpoints return this many days when no page size is requested
+DEFAULT_HISTORY_DAYS = 3
 
 # Used when API Gateway/lambda is deployed
 handler = Mangum(app, lifespan="off", api_gateway_base_path="/api/v1")
 
 
-# TODO: Generalize to open telemetry / ADOT
-@app.middleware("http")
-async def add_correlation_id(request: Request, call_next):
-    # Check if the client sent a correlation ID; otherwise generate one
-    correlation_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
-    # Store the correlation ID for downstream use (e.g., logging)
-    request.state.correlation_id = correlation_id
-
-    try:
-        response = await call_next(request)
-    except Exception as exc:
-        response = JSONResponse(
-            {
-                "detail": "An internal server error occurred. Please contact your belly's diary maintainers"
-            },
-            status_code=500,
-        )
-        logger.error("Exception occurred: %s", traceback.format_exc())
-        logger.error("[Correlation ID: %s]", correlation_id)
-
-    response.headers["X-Correlation-ID"] = correlation_id
-    return response
-
-
 @app.get("/")  # Needed for local system development
 @app.get("", include_in_schema=False)  # Needed for API Gateway to function
 async def root() -> str:
@@ -86,14 +86,15 @@ async def root() -> str:
 
 @app.get("/preferences")
 async def get_preferences(
-    authorization: Annotated[str | None, Header()] = None,
+    response: Response,
+    user_id: Annotated[str, Depends(current_user_id)],
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> dict:
-    user_id = get_user_id(authorization)
+    prefs = await preferences_repository.get_preferences(user_id)
 
-    try:
-        prefs = MbdPreferences.get(user_id)
-    except MbdPreferences.DoesNotExist:
-        prefs = MbdPreferences(user_id=user_id)
+    etag = version_etag("preferences", prefs.DTO_VERSION, user_id, prefs.version)
+    if (not_modified := conditional(response, etag, if_none_match)) is not None:
+        return not_modified
 
     return prefs.to_dto()
 
@@ -101,68 +102,36 @@ async def get_preferences(
 @app.post("/preferences")
 async def update_preferences(
     preferences: PreferencesUpdate,
-    authorization: Annotated[str | None, Header()] = None,
+    user_id: Annotated[str, Depends(current_user_id)],
+    idempotent: Annotated[IdempotentRequest, Depends(idempotent_request)],
 ) -> dict:
-    user_id = get_user_id(authorization)
+    if (replay := await idempotent.replay()) is not None:
+        return replay
 
-    try:
-        prefs = MbdPreferences.get(user_id)
-    except MbdPreferences.DoesNotExist:
-        prefs = MbdPreferences(user_id=user_id)
+    prefs = await preferences_repository.update_preferences(user_id, preferences)
 
-    prefs.default_meal_times = preferences.defaultMealTimes
-    prefs.use_thumbnails = preferences.useThumbnails
-    prefs.save()
-
-    return prefs.to_dto()
+    return await idempotent.respond(prefs.to_dto())
 
 
 @app.post("/foods")
 async def create_food(
     request: FoodCreate,
-    authorization: Annotated[str | None, Header()] = None,
+    user_id: Annotated[str, Depends(current_user_id)],
+    idempotent: Annotated[IdempotentRequest, Depends(idempotent_request)],
 ) -> dict:
-    user_id = get_user_id(authorization)
-    try:
-        food_list = MbdFoodList.get(user_id)
-    except MbdFoodList.DoesNotExist:
-        food_list = MbdFoodList(user_id=user_id)
-    except Exception as e:
-        logger.error("Exception occurred: %s", traceback.format_exc())
-        raise e
-
-    # Check if a food with the same ID already exists
-    if any(f.name.lower() == request.name.lower() for f in food_list.foods):
-        raise MbdException(
-            status_code=400,
-            errors=[f"Food with name {request.name} already exists."],
-        )
+    if (replay := await idempotent.replay()) is not None:
+        return replay
 
-    food = MbdFood(
-        food_id=request.food_id,
-        name=request.name,
-        thumbnail=request.thumbnail,
-    )
-    food_list.foods = list(
-        filter((lambda f: f.food_id != food.food_id), food_list.foods)
-    )
-    food_list.foods.append(food)
-    food_list.save()
+    food = await foods_repository.add_food(user_id, request)
 
-    return food.to_dto()
+    return await idempotent.respond(food.to_dto())
 
 
 @app.get("/foods/{food_id}")
 async def get_food(
-    food_id: str, authorization: Annotated[str | None, Header()] = None
+    food_id: str, user_id: Annotated[str, Depends(current_user_id)]
 ) -> dict:
-    user_id = get_user_id(authorization)
-    try:
-        food_list = MbdFoodList.get(user_id)
-    except MbdFoodList.DoesNotExist:
-        food_list = MbdFoodList(user_id=user_id)
-
-    food = next((f for f in food_list.foods if f.food_id == food_id), None)
+    food = await foods_repository.get_food(user_id, food_id)
 
     if food is None:
         raise HTTPException(status_code=404, detail=f"Food with ID {food_id} not found")
@@ -171,126 +140,298 @@ async def get_food(
 
 
 @app.get("/foods")
-async def get_foods(authorization: Annotated[str | None, Header()] = None) -> dict:
-    user_id = get_user_id(authorization)
-    try:
-        food_list = MbdFoodList.get(user_id)
-    except MbdFoodList.DoesNotExist:
-        food_list = MbdFoodList(user_id=user_id)
+async def get_foods(
+    response: Response,
+    user_id: Annotated[str, Depends(current_user_id)],
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> dict:
+    catalog = await foods_repository.get_food_catalog(user_id)
+
+    # Catalogs assembled from per-food items have no version, so those are hashed
+    version = catalog.food_list.version
+    body = dumps(catalog.to_dto()) if version is None else None
+    etag = (
+        content_etag(body)
+        if version is None
+        else version_etag("foods", user_id, version)
+    )
+    if (not_modified := conditional(response, etag, if_none_match)) is not None:
+        return not_modified
 
-    return food_list.to_dto()
+    return FastJSONResponse(
+        catalog.to_dto() if body is None else body, headers=response.headers
+    )
 
 
 @app.post("/meals")
 async def save_meal(
     request: MealCreate,
-    authorization: Annotated[str | None, Header()] = None,
+    user_id: Annotated[str, Depends(current_user_id)],
+    idempotent: Annotated[IdempotentRequest, Depends(idempotent_request)],
 ) -> dict:
-    user_id = get_user_id(authorization)
-
-    meal = MbdMeal(
-        user_id=user_id,
-        meal_type=request.meal_type,
-        date_time=request.date_time,
-        foods=[
-            MbdFood(
-                food_id=food.food_id,
-                name=food.name,
-                thumbnail=food.thumbnail,
-            )
-            for food in request.foods
-        ],
+    if (replay := await idempotent.replay()) is not None:
+        return replay
+
+    meal = await meals_repository.save_meal(user_id, request)
+
+    return await idempotent.respond(meal.to_dto())
+
+
+@app.post("/meals/batch")
+async def save_meal_batch(
+    request: Request,
+    user_id: Annotated[str, Depends(current_user_id)],
+    idempotent: Annotated[IdempotentRequest, Depends(idempotent_request)],
+) -> dict:
+    """
+    Imports many meals at once, from a JSON array or newline-delimited JSON.
+    Items are validated and saved independently; the response reports each one.
+    """
+    if (replay := await idempotent.replay()) is not None:
+        return replay
+
+    items = await read_meal_batch(request)
+    valid = [(i, item) for i, item in enumerate(items) if isinstance(item, MealCreate)]
+    save_errors = await meals_repository.save_meals(
+        user_id, [meal for _, meal in valid], [i for i, _ in valid]
     )
-    meal.save()
 
-    return meal.to_dto()
+    results = [
+        MealBatchResult(index=i, status="invalid", errors=item)
+        for i, item in enumerate(items)
+        if not isinstance(item, MealCreate)
+    ]
+    for (i, meal), error in zip(valid, save_errors):
+        results.append(
+            MealBatchResult(
+                index=i,
+                status="saved" if error is None else "failed",
+                date_time=meal.date_time,
+                errors=[] if error is None else [error],
+            )
+        )
+    results.sort(key=lambda result: result.index)
+
+    return await idempotent.respond(
+        {
+            "saved": sum(result.status == "saved" for result in results),
+            "failed": sum(result.status != "saved" for result in results),
+            "results": [result.model_dump(mode="json") for result in results],
+        }
+    )
 
 
 @app.put("/meals")
 async def update_meal(
     request: MealUpdate,
-    authorization: Annotated[str | None, Header()] = None,
+    user_id: Annotated[str, Depends(current_user_id)],
+    idempotent: Annotated[IdempotentRequest, Depends(idempotent_request)],
 ) -> dict:
-    user_id = get_user_id(authorization)
-
-    connection = Connection()
+    if (replay := await idempotent.replay()) is not None:
+        return replay
 
-    updated_meal = MbdMeal.update_meal(
-        connection=connection,
-        user_id=user_id,
-        original_date_time=request.original_date_time,
-        new_meal=request,
+    updated_meal = await meals_repository.update_meal(
+        user_id, request, client_request_token=idempotent.client_request_token
     )
 
-    return updated_meal.to_dto()
+    return await idempotent.respond(updated_meal.to_dto())
 
 
 @app.get("/meals/history")
 async def get_meal_history(
-    days: int = 3,
+    response: Response,
+    user_id: Annotated[str, Depends(current_user_id)],
+    days: int | None = None,
     offset: int = 0,
-    authorization: Annotated[str | None, Header()] = None,
+    limit: Annotated[int | None, Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    cursor: str | None = None,
+    meal_type: Annotated[str | None, Query(min_length=1)] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> list[dict]:
-    user_id = get_user_id(authorization)
-    meals = MbdMeal.query(
-        hash_key=user_id,
-        range_key_condition=MbdMeal.date_time.between(
-            datetime.now(timezone.utc) - timedelta(days=days + offset),
-            datetime.now(timezone.utc) - timedelta(days=offset),
-        ),
+    """
+    Without `limit`, returns every meal in the `days` days up to and including
+    the day `offset` days ago. Days are whole days in the user's timezone.
+    With `limit`, returns one page, newest first, and the cursor for the next page
+    in the X-Next-Cursor header. `days` then optionally bounds how far back to go.
+    With `meal_type`, only meals of that type are returned (and read).
+    """
+    local_days = LocalDays(await preferences_repository.get_timezone(user_id))
+    start, end = local_days.window(
+        DEFAULT_HISTORY_DAYS if days is None else days, offset
     )
 
-    return [
-        meal.to_dto()
-        for meal in sorted(meals, key=lambda meal: meal.date_time, reverse=True)
-    ]
+    if limit is not None:
+        start = None if days is None else start
+        meals, next_cursor = await meals_repository.get_meal_page(
+            user_id, start, end, limit, cursor, meal_type
+        )
+        if next_cursor is not None:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+        history = [meal.to_dto() for meal in meals]
+    else:
+        meals = await meals_repository.get_meals_between(
+            user_id, start, end, meal_type
+        )
+        next_cursor = None
+        history = [
+            meal.to_dto()
+            for meal in sorted(meals, key=lambda meal: meal.date_time, reverse=True)
+        ]
+
+    body = dumps(history)
+    etag = content_etag(body, next_cursor)
+    if (not_modified := conditional(response, etag, if_none_match)) is not None:
+        return not_modified
+
+    return FastJSONResponse(body, headers=response.headers)
 
 
 @app.get("/foods/suggested/{meal_type}")
 async def get_suggested_foods_endpoint(
     meal_type: str,
-    authorization: Annotated[str | None, Header()] = None,
+    user_id: Annotated[str, Depends(current_user_id)],
 ) -> list[dict]:
-    user_id = get_user_id(authorization)
-    suggested_foods = get_suggested_foods(user_id, meal_type)
-    return [food.to_dto() for food in suggested_foods]
+    suggested_foods = await foods_repository.get_suggested_foods(user_id, meal_type)
+    return FastJSONResponse([food.to_dto() for food in suggested_foods])
 
 
 @app.post("/symptoms")
 async def save_symptoms(
     request: SymptomsCreate,
-    authorization: Annotated[str | None, Header()] = None,
+    user_id: Annotated[str, Depends(current_user_id)],
+    idempotent: Annotated[IdempotentRequest, Depends(idempotent_request)],
 ) -> dict:
-    user_id = get_user_id(authorization)
+    if (replay := await idempotent.replay()) is not None:
+        return replay
 
-    symptom_entry = MbdSymptomsEntry(
-        user_id=user_id,
-        date_time=request.date_time,
-        symptoms=request.symptoms,
-    )
-    symptom_entry.save()
+    symptom_entry = await symptoms_repository.save_symptoms_entry(user_id, request)
 
-    return symptom_entry.to_dto()
+    return await idempotent.respond(symptom_entry.to_dto())
 
 
 @app.get("/symptoms/history")
 async def get_symptom_history(
-    days: int = 3,
+    response: Response,
+    user_id: Annotated[str, Depends(current_user_id)],
+    days: int | None = None,
     offset: int = 0,
-    authorization: Annotated[str | None, Header()] = None,
+    limit: Annotated[int | None, Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    cursor: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> list[dict]:
-    user_id = get_user_id(authorization)
-    symptom_entries = MbdSymptomsEntry.query(
-        hash_key=user_id,
-        range_key_condition=MbdSymptomsEntry.date_time.between(
-            datetime.now(timezone.utc) - timedelta(days=days + offset),
-            datetime.now(timezone.utc) - timedelta(days=offset),
-        ),
+    """
+    Without `limit`, returns every entry in the `days` days up to and including
+    the day `offset` days ago. Days are whole days in the user's timezone.
+    With `limit`, returns one page, newest first, and the cursor for the next page
+    in the X-Next-Cursor header. `days` then optionally bounds how far back to go.
+    """
+    local_days = LocalDays(await preferences_repository.get_timezone(user_id))
+    start, end = local_days.window(
+        DEFAULT_HISTORY_DAYS if days is None else days, offset
     )
 
-    return [
-        entry.to_dto()
-        for entry in sorted(
-            symptom_entries, key=lambda entry: entry.date_time, reverse=True
+    if limit is not None:
+        start = None if days is None else start
+        symptom_entries, next_cursor = (
+            await symptoms_repository.get_symptoms_entry_page(
+                user_id, start, end, limit, cursor
+            )
         )
-    ]
+        if next_cursor is not None:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+        history = [entry.to_dto() for entry in symptom_entries]
+    else:
+        symptom_entries = await symptoms_repository.get_symptoms_entries_between(
+            user_id, start, end
+        )
+        next_cursor = None
+        history = [
+            entry.to_dto()
+            for entry in sorted(
+                symptom_entries, key=lambda entry: entry.date_time, reverse=True
+            )
+        ]
+
+    body = dumps(history)
+    etag = content_etag(body, next_cursor)
+    if (not_modified := conditional(response, etag, if_none_match)) is not None:
+        return not_modified
+
+    return FastJSONResponse(body, headers=response.headers)
+
+
+@app.post("/journal/entries")
+async def save_journal_entry(
+    request: JournalEntryCreate,
+    user_id: Annotated[str, Depends(current_user_id)],
+    idempotent: Annotated[IdempotentRequest, Depends(idempotent_request)],
+) -> dict:
+    """
+    Saves a meal, the symptoms felt at the same time and any new foods it
+    introduces in one transaction: all of them are saved, or none are. Unlike
+    POST /meals and /symptoms, a meal or symptoms entry already at the same
+    date_time is a 409 rather than replaced.
+    """
+    if (replay := await idempotent.replay()) is not None:
+        return replay
+
+    entry = await journal_entries.save_journal_entry(
+        user_id, request, client_request_token=idempotent.client_request_token
+    )
+
+    return await idempotent.respond(entry.to_dto())
+
+
+@app.get("/insights/correlations")
+async def get_correlations(
+    user_id: Annotated[str, Depends(current_user_id)],
+    days: Annotated[int | None, Query(ge=1)] = None,
+    windows: str = ",".join(f"{start}-{end}" for start, end in DEFAULT_WINDOWS),
+    min_occurrences: Annotated[int, Query(ge=1)] = DEFAULT_MIN_OCCURRENCES,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+) -> list[dict]:
+    """
+    Scores how often each symptom follows each food within the lag `windows`
+    (hours, e.g. "0-6,6-24"), over the last `days` days (in the user's
+    timezone, today included) or the whole history.
+    Returns the `limit` strongest correlations, highest lift first.
+    """
+    try:
+        lag_windows = parse_windows(windows)
+    except ValueError:
+        raise MbdException(
+            status_code=400,
+            errors=['windows must look like "0-6,6-24": hours, start before end'],
+        )
+
+    start = None
+    if days is not None:
+        local_days = LocalDays(await preferences_repository.get_timezone(user_id))
+        start, _ = local_days.window(days)
+    correlations = await insights_repository.get_correlations(
+        user_id, start, lag_windows, min_occurrences
+    )
+
+    return FastJSONResponse(
+        [correlation.to_dto() for correlation in correlations[:limit]]
+    )
+
+
+@app.get("/export")
+async def export_journal(
+    user_id: Annotated[str, Depends(current_user_id)],
+    export_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+) -> StreamingResponse:
+    """
+    Streams every meal and symptom entry, oldest first, as NDJSON (one JSON
+    object per line, with a "type" of "meal" or "symptoms") or CSV.
+    """
+    return StreamingResponse(
+        journal_export.export_journal(user_id, export_format),
+        media_type=journal_export.EXPORT_FORMATS[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="journal.{export_format}"'
+        },
+    )
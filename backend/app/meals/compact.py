@@ -0,0 +1,197 @@
+"""
+Compact, read-only meals for computations over a user's whole history.
+
+An MbdMeal costs a model instance with its own attribute dict, a datetime and,
+per food, a MapAttribute with another dict: tens of thousands of objects for a
+few months of history, most of them copies of the same few foods. CompactMeals
+keeps a history column by column instead:
+
+- timestamps: UTC microseconds since the epoch, in an array of 64-bit ints
+- meal types: one interned string per type
+- foods: per meal, a tuple of CompactFoods shared by every meal with the same
+  foods, one CompactFood per distinct food, with interned IDs
+
+It is decoded straight from DynamoDB's wire format, without building models.
+Nothing here imports PynamoDB, so it is cheap to import at cold start.
+"""
+
+import functools
+import sys
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+if TYPE_CHECKING:
+    from meals.meal import MbdMeal
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_ORDINAL = EPOCH.date().toordinal()
+_MICROSECOND = timedelta(microseconds=1)
+_DAY_US = 86_400_000_000
+
+
+@dataclass(frozen=True, slots=True)
+class CompactFood:
+    food_id: str
+    name: str
+    thumbnail: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class CompactMeal:
+    """One meal of a CompactMeals, created when it is looked at."""
+
+    timestamp: int
+    meal_type: Optional[str]
+    foods: tuple[CompactFood, ...]
+
+    @property
+    def date_time(self) -> datetime:
+        return from_timestamp(self.timestamp)
+
+
+def to_timestamp(date_time: datetime) -> int:
+    """UTC microseconds since the epoch, exactly (floats would round them)."""
+    return (date_time - EPOCH) // _MICROSECOND
+
+
+def from_timestamp(timestamp: int) -> datetime:
+    return EPOCH + timedelta(microseconds=timestamp)
+
+
+def parse_timestamp(value: str) -> int:
+    """Timestamp of a date_time as UTCDateTimeAttribute serializes it."""
+    # Always "%Y-%m-%dT%H:%M:%S.%f+0000". Slicing it is several times faster
+    # than parsing a datetime, and the date part is shared by a whole day.
+    if len(value) == 31 and value.endswith("+0000"):
+        return (
+            _day_timestamp(value[:10])
+            + int(value[11:13]) * 3_600_000_000
+            + int(value[14:16]) * 60_000_000
+            + int(value[17:19]) * 1_000_000
+            + int(value[20:26])
+        )
+    return to_timestamp(datetime.fromisoformat(value))
+
+
+@functools.lru_cache(maxsize=4096)
+def _day_timestamp(day: str) -> int:
+    return (date.fromisoformat(day).toordinal() - _EPOCH_ORDINAL) * _DAY_US
+
+
+class CompactMeals:
+    """
+    A read-only sequence of meals, as CompactMeal views. Computations that
+    loop over every meal should read the `timestamps`, `meal_types` and
+    `foods` columns directly.
+    """
+
+    __slots__ = ("timestamps", "meal_types", "foods")
+
+    def __init__(
+        self,
+        timestamps: array,
+        meal_types: tuple[Optional[str], ...],
+        foods: tuple[tuple[CompactFood, ...], ...],
+    ):
+        self.timestamps = timestamps
+        self.meal_types = meal_types
+        self.foods = foods
+
+    @classmethod
+    def decode(cls, items: Iterable[dict]) -> "CompactMeals":
+        """
+        Build from meal items in DynamoDB's wire format, as a Query returns
+        them. Attributes other than date_time may have been left out of the
+        projection.
+        """
+        builder = _Builder()
+        for item in items:
+            meal_type = item.get("meal_type")
+            foods = item.get("foods")
+            builder.add(
+                parse_timestamp(item["date_time"]["S"]),
+                meal_type["S"] if meal_type else None,
+                [
+                    (
+                        food["M"]["food_id"]["S"],
+                        food["M"]["name"]["S"],
+                        food["M"].get("thumbnail", {}).get("S"),
+                    )
+                    for food in foods["L"]
+                ]
+                if foods
+                else (),
+            )
+        return builder.build()
+
+    @classmethod
+    def from_meals(cls, meals: Iterable["MbdMeal"]) -> "CompactMeals":
+        builder = _Builder()
+        for meal in meals:
+            # See MbdMeal.to_dto
+            values = meal.attribute_values
+            builder.add(
+                to_timestamp(values["date_time"]),
+                values.get("meal_type"),
+                [
+                    (
+                        food.attribute_values["food_id"],
+                        food.attribute_values["name"],
+                        food.attribute_values.get("thumbnail"),
+                    )
+                    for food in values.get("foods") or ()
+                ],
+            )
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, i: int) -> CompactMeal:
+        return CompactMeal(self.timestamps[i], self.meal_types[i], self.foods[i])
+
+    def __iter__(self) -> Iterator[CompactMeal]:
+        for meal in zip(self.timestamps, self.meal_types, self.foods):
+            yield CompactMeal(*meal)
+
+
+class _Builder:
+    def __init__(self):
+        self.timestamps = array("q")
+        self.meal_types: list[Optional[str]] = []
+        self.foods: list[tuple[CompactFood, ...]] = []
+        # (food_id, name, thumbnail) -> the one CompactFood for it
+        self._food_by_value: dict[tuple, CompactFood] = {}
+        # Meals with the same foods, in the same order, share one tuple
+        self._food_tuples: dict[tuple, tuple[CompactFood, ...]] = {}
+
+    def add(
+        self,
+        timestamp: int,
+        meal_type: Optional[str],
+        foods: Iterable[tuple[str, str, Optional[str]]],
+    ) -> None:
+        food_by_value = self._food_by_value
+        meal_foods = []
+        for value in foods:
+            food = food_by_value.get(value)
+            if food is None:
+                food = food_by_value[value] = CompactFood(
+                    sys.intern(value[0]), value[1], value[2]
+                )
+            meal_foods.append(food)
+
+        # Keyed by identity: foods are unique by now, and ints hash faster
+        key = tuple(map(id, meal_foods))
+        food_tuple = self._food_tuples.get(key)
+        if food_tuple is None:
+            food_tuple = self._food_tuples[key] = tuple(meal_foods)
+
+        self.timestamps.append(timestamp)
+        self.meal_types.append(None if meal_type is None else sys.intern(meal_type))
+        self.foods.append(food_tuple)
+
+    def build(self) -> CompactMeals:
+        return CompactMeals(self.timestamps, tuple(self.meal_types), tuple(self.foods))
@@ -1,32 +1,52 @@
 import os
-from dotenv import load_dotenv
-from pynamodb.models import Model
+from datetime import datetime
+from typing import Optional
 from pynamodb.attributes import UnicodeAttribute, UTCDateTimeAttribute, ListAttribute
+from pynamodb.expressions.condition import Condition
+from pynamodb.indexes import GlobalSecondaryIndex, AllProjection
 import logging
-from pynamodb.exceptions import TransactWriteError
 from pynamodb.connection import Connection
 from botocore.exceptions import ClientError
 
 from foods.food import MbdFood
-from pynamodb.transactions import TransactWrite
+from shared.config import bootstrap
+from shared.dynamodb import MbdModel, transaction
 from shared.exceptions import MbdException
 
 
 logger = logging.getLogger("uvicorn.error")
-logger.setLevel(logging.INFO)
 
-ENV = os.getenv("ENVIRONMENT")
-
-if ENV is not None:
-    logger.info("Loading environment: %s", ENV)
-    load_dotenv(f".env.{ENV}")
-else:
-    logger.warning("Hmm... no ENV value set")
+bootstrap()
 
 logger.info(f"{os.getenv('MEALS_DB_NAME')=}")
 
 
-class MbdMeal(Model):
+_date_time_attribute = UTCDateTimeAttribute()
+
+
+def meal_type_key(meal_type: str, date_time: datetime) -> str:
+    """
+    Range key of the meal type index: the meal type, then the serialized UTC
+    date_time, which sorts chronologically within each meal type.
+    """
+    return f"{meal_type}#{_date_time_attribute.serialize(date_time)}"
+
+
+class MbdMealTypeIndex(GlobalSecondaryIndex):
+    """
+    A user's meals by type, then date_time. Global rather than local because
+    local indexes can only be created along with their table.
+    """
+
+    class Meta:
+        index_name = "meal_type_date_time-index"
+        projection = AllProjection()
+
+    user_id = UnicodeAttribute(hash_key=True)
+    meal_type_date_time = UnicodeAttribute(range_key=True)
+
+
+class MbdMeal(MbdModel):
     class Meta:
         table_name = os.getenv("MEALS_DB_NAME")
         region = "us-west-2"
@@ -35,17 +55,53 @@ class MbdMeal(Model):
     meal_type = UnicodeAttribute()
     date_time = UTCDateTimeAttribute(range_key=True)
     foods = ListAttribute(of=MbdFood, default=lambda: [])
+    # meal_type_key(meal_type, date_time), kept up to date by serialize. Meals
+    # saved before the index existed get it from meals/migrate.py
+    meal_type_date_time = UnicodeAttribute(null=True)
+
+    meal_type_index = MbdMealTypeIndex()
+
+    # What to_dto reads: reads for responses leave out the user ID, which is
+    # the same on every item
+    DTO_ATTRIBUTES = (meal_type, date_time, foods)
+
+    def serialize(self, null_check: bool = True) -> dict:
+        # Every write (save, batch and transaction) serializes the meal first
+        if self.meal_type is not None and self.date_time is not None:
+            self.meal_type_date_time = meal_type_key(self.meal_type, self.date_time)
+        return super().serialize(null_check=null_check)
+
+    @classmethod
+    def meal_type_between(
+        cls, meal_type: str, start: Optional[datetime], end: datetime
+    ) -> Condition:
+        """
+        Range key condition on the meal type index, for meals of the type between
+        `start` (or the first one) and `end`, inclusive.
+        """
+        lower = f"{meal_type}#" if start is None else meal_type_key(meal_type, start)
+        return MbdMealTypeIndex.meal_type_date_time.between(
+            lower, meal_type_key(meal_type, end)
+        )
 
     def to_dto(self) -> dict:
+        # Built from the raw attribute values: history and export responses call
+        # this per meal, and the attribute descriptors would dominate the cost
+        values = self.attribute_values
         return {
-            "meal_type": self.meal_type,
-            "date_time": self.date_time.isoformat(),
-            "foods": [food.to_dto() for food in self.foods],
+            "meal_type": values.get("meal_type"),
+            "date_time": values["date_time"].isoformat(),
+            "foods": [food.to_dto() for food in values.get("foods") or ()],
         }
 
     @classmethod
     def update_meal(
-        cls, connection: Connection, user_id: str, original_date_time, new_meal
+        cls,
+        connection: Connection,
+        user_id: str,
+        original_date_time,
+        new_meal,
+        client_request_token: Optional[str] = None,
     ):
         """
         Update a meal with atomic transaction handling.
@@ -54,9 +110,11 @@ class MbdMeal(Model):
             user_id: The user ID
             original_date_time: The original datetime of the meal to update
             new_meal: The new meal data
+            client_request_token: Makes the transaction idempotent for 10
+                minutes, for retries of the same request
 
         Returns:
-            The updated meal
+            The meal as it was before the update, and the updated meal
 
         Raises:
             MbdException: If the meal doesn't exist or if the new datetime already exists
@@ -66,54 +124,37 @@ class MbdMeal(Model):
 
             # If the datetime is changing, we need to check if the a meal with the new datetime already exists
             if original_date_time != new_meal.date_time:
-                try:
-                    with TransactWrite(
-                        connection=connection,
-                        client_request_token=str(original_date_time),
-                    ) as transaction:
-                        # Create a new meal with the new datetime and delete the old one
-                        new_meal_obj = cls(
-                            user_id=user_id,
-                            meal_type=new_meal.meal_type,
-                            date_time=new_meal.date_time,
-                            foods=[
-                                MbdFood(
-                                    food_id=food.food_id,
-                                    name=food.name,
-                                    thumbnail=food.thumbnail,
-                                )
-                                for food in new_meal.foods
-                            ],
-                        )
-                        transaction.delete(
-                            original_meal,
-                        )
-                        transaction.save(
-                            new_meal_obj,
-                            condition=cls.date_time.does_not_exist(),
-                        )
-
-                except TransactWriteError as e:
-                    logger.error(f"Transaction error: {str(e)}")
-
-                    if any(
-                        cr is not None and cr.code == "ConditionalCheckFailed"
-                        for cr in e.cancellation_reasons
-                    ):
-                        # This means the condition failed, which is expected if the meal already exists
-                        raise MbdException(
-                            status_code=409,
-                            errors=[
-                                f"A meal already exists at {new_meal.date_time.isoformat()}"
-                            ],
-                        )
-                    raise MbdException(
-                        status_code=500,
-                        errors=["Failed to update meal. Please try again."],
+                # Not the date_time: tokens are account-wide, so two users
+                # moving meals from the same time would collide
+                with transaction(
+                    "Failed to update meal. Please try again.",
+                    client_request_token=client_request_token,
+                    connection=connection,
+                ) as write:
+                    # Create a new meal with the new datetime and delete the old one
+                    new_meal_obj = cls(
+                        user_id=user_id,
+                        meal_type=new_meal.meal_type,
+                        date_time=new_meal.date_time,
+                        foods=[
+                            MbdFood(
+                                food_id=food.food_id,
+                                name=food.name,
+                                thumbnail=food.thumbnail,
+                            )
+                            for food in new_meal.foods
+                        ],
+                    )
+                    write.delete(original_meal)
+                    write.save(
+                        new_meal_obj,
+                        condition=cls.date_time.does_not_exist(),
+                        conflict=f"A meal already exists at {new_meal.date_time.isoformat()}",
                     )
-                return new_meal_obj
+                return original_meal, new_meal_obj
             else:
                 # If the datetime isn't changing, just update the meal in place
+                previous_meal = cls.from_raw_data(original_meal.serialize())
                 original_meal.meal_type = new_meal.meal_type
                 original_meal.foods = [
                     MbdFood(
@@ -124,7 +165,7 @@ class MbdMeal(Model):
                     for food in new_meal.foods
                 ]
                 original_meal.save()
-                return original_meal
+                return previous_meal, original_meal
 
         except cls.DoesNotExist:
             logger.warning(
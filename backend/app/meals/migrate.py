@@ -0,0 +1,59 @@
+"""
+Backfill of the meal type index key (meal_type_date_time) on meals saved before
+the index existed. Meals saved since then already have it.
+
+1. Apply infrastructure/db.tf, adding the index, and deploy
+2. Run this script against the environment:
+   cd app && PYTHONPATH=. ENVIRONMENT=<env> uv run python -m meals.migrate
+
+The script is safe to re-run, and to run while the app is serving: a meal
+updated or deleted after it was scanned is left alone, as the app has written
+its key (or there is nothing left to index).
+"""
+
+import logging
+
+from pynamodb.exceptions import UpdateError
+
+from meals.meal import MbdMeal, meal_type_key
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def backfill_meal(meal: MbdMeal) -> bool:
+    """
+    Set the index key of a meal read by the scan.
+
+    Returns:
+        Whether the key was set
+    """
+    try:
+        meal.update(
+            actions=[
+                MbdMeal.meal_type_date_time.set(
+                    meal_type_key(meal.meal_type, meal.date_time)
+                )
+            ],
+            condition=MbdMeal.meal_type == meal.meal_type,
+        )
+        return True
+    except UpdateError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+        return False
+
+
+def backfill_all() -> None:
+    meals = 0
+    for meal in MbdMeal.scan(
+        filter_condition=MbdMeal.meal_type_date_time.does_not_exist(),
+        attributes_to_get=["user_id", "date_time", "meal_type"],
+    ):
+        meals += backfill_meal(meal)
+
+    logger.info("Backfilled the meal type index key of %d meals", meals)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    backfill_all()
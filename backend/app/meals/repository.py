@@ -0,0 +1,187 @@
+"""
+Async data access for meals.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from dto.meal_create import MealCreate
+from dto.meal_update import MealUpdate
+from aggregates.aggregates import apply_deltas, meal_deltas
+from foods.food import MbdFood
+from meals.meal import MbdMeal
+from shared.batch import BATCH_WRITE_MAX_CONCURRENCY, batch_put, chunked
+from shared.dynamodb import get_connection
+from shared.executor import run_blocking
+from shared.pagination import query_page
+
+
+async def save_meal(user_id: str, request: MealCreate) -> MbdMeal:
+    meal = to_meal(user_id, request)
+    await run_blocking(_save_meal, meal)
+
+    return meal
+
+
+async def save_meals(
+    user_id: str,
+    requests: list[MealCreate],
+    indexes: Optional[list[int]] = None,
+) -> list[Optional[str]]:
+    """
+    Save many meals with batch writes. Chunks of 25 are written on the database
+    thread pool, up to BATCH_WRITE_MAX_CONCURRENCY of them at a time.
+
+    Args:
+        indexes: The caller's index of each request, to refer to them by in
+            errors. By default, their positions in `requests`
+
+    Returns:
+        For each request, None if its meal was saved, otherwise why it wasn't
+    """
+    errors: list[Optional[str]] = [None] * len(requests)
+    if indexes is None:
+        indexes = list(range(len(requests)))
+
+    # A batch write may not contain the same key twice
+    meals = []
+    positions = []
+    first_by_key = {}
+    for i, request in enumerate(requests):
+        meal = to_meal(user_id, request)
+        key = MbdMeal.date_time.serialize(meal.date_time)
+        if key in first_by_key:
+            first = indexes[first_by_key[key]]
+            errors[i] = f"Duplicate of meal {first}, at the same date_time"
+            continue
+        first_by_key[key] = i
+        meals.append(meal)
+        positions.append(i)
+
+    in_flight = asyncio.Semaphore(BATCH_WRITE_MAX_CONCURRENCY)
+
+    async def put_chunk(chunk: list[MbdMeal]) -> list[int]:
+        async with in_flight:
+            return await run_blocking(batch_put, MbdMeal, chunk)
+
+    results = await asyncio.gather(*(put_chunk(chunk) for chunk in chunked(meals)))
+    for chunk_positions, failed in zip(chunked(positions), results):
+        for position in failed:
+            errors[chunk_positions[position]] = "Failed to save meal. Please try again."
+
+    # Batch writes can't say which meals they overwrote, so re-imported meals are
+    # counted again until the aggregates are rebuilt
+    saved = [meal for meal, i in zip(meals, positions) if errors[i] is None]
+    await run_blocking(apply_deltas, user_id, meal_deltas(saved))
+
+    return errors
+
+
+async def update_meal(
+    user_id: str, request: MealUpdate, client_request_token: Optional[str] = None
+) -> MbdMeal:
+    return await run_blocking(_update_meal, user_id, request, client_request_token)
+
+
+async def get_meals_between(
+    user_id: str, start: datetime, end: datetime, meal_type: Optional[str] = None
+) -> list[MbdMeal]:
+    return await run_blocking(_query_meals_between, user_id, start, end, meal_type)
+
+
+async def get_meal_page(
+    user_id: str,
+    start: Optional[datetime],
+    end: datetime,
+    limit: int,
+    cursor: Optional[str] = None,
+    meal_type: Optional[str] = None,
+) -> tuple[list[MbdMeal], Optional[str]]:
+    """
+    With `meal_type`, pages through the meal type index, so only meals of that
+    type are read.
+    """
+    index = None
+    if meal_type is not None:
+        index = MbdMeal.meal_type_index
+        range_key_condition = MbdMeal.meal_type_between(meal_type, start, end)
+    elif start is None:
+        range_key_condition = MbdMeal.date_time <= end
+    else:
+        range_key_condition = MbdMeal.date_time.between(start, end)
+
+    return await run_blocking(
+        query_page,
+        MbdMeal,
+        user_id,
+        range_key_condition,
+        limit,
+        cursor,
+        attributes=MbdMeal.DTO_ATTRIBUTES,
+        index=index,
+    )
+
+
+def _save_meal(meal: MbdMeal) -> None:
+    previous = meal.save_replacing()
+
+    deltas = meal_deltas([meal])
+    if previous is not None:
+        meal_deltas([previous], sign=-1, deltas=deltas)
+    apply_deltas(meal.user_id, deltas)
+
+
+def _update_meal(
+    user_id: str, request: MealUpdate, client_request_token: Optional[str]
+) -> MbdMeal:
+    previous, updated = MbdMeal.update_meal(
+        connection=get_connection(),
+        user_id=user_id,
+        original_date_time=request.original_date_time,
+        new_meal=request,
+        client_request_token=client_request_token,
+    )
+
+    deltas = meal_deltas([updated])
+    meal_deltas([previous], sign=-1, deltas=deltas)
+    apply_deltas(user_id, deltas)
+
+    return updated
+
+
+def to_meal(user_id: str, request: MealCreate) -> MbdMeal:
+    return MbdMeal(
+        user_id=user_id,
+        meal_type=request.meal_type,
+        date_time=request.date_time,
+        foods=[
+            MbdFood(
+                food_id=food.food_id,
+                name=food.name,
+                thumbnail=food.thumbnail,
+            )
+            for food in request.foods
+        ],
+    )
+
+
+def _query_meals_between(
+    user_id: str, start: datetime, end: datetime, meal_type: Optional[str]
+) -> list[MbdMeal]:
+    if meal_type is not None:
+        index = MbdMeal.meal_type_index
+        range_key_condition = MbdMeal.meal_type_between(meal_type, start, end)
+    else:
+        index = None
+        range_key_condition = MbdMeal.date_time.between(start, end)
+
+    # The query result is a lazy iterator that fetches pages as it is consumed,
+    # so it must be drained here, on the worker thread.
+    return list(
+        MbdMeal.query_projected(
+            hash_key=user_id,
+            range_key_condition=range_key_condition,
+            index=index,
+        )
+    )
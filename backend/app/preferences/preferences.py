@@ -1,15 +1,19 @@
 import os
-from dotenv import load_dotenv
-from pynamodb.models import Model
-from pynamodb.attributes import UnicodeAttribute, ListAttribute, BooleanAttribute
+from pynamodb.attributes import (
+    BooleanAttribute,
+    ListAttribute,
+    NumberAttribute,
+    UnicodeAttribute,
+)
 
-ENV = os.getenv("ENVIRONMENT")
+from shared.config import bootstrap
+from shared.days import DEFAULT_TIMEZONE
+from shared.dynamodb import MbdModel
 
-if ENV is not None:
-    load_dotenv(f".env.{ENV}")
+bootstrap()
 
 
-class MbdPreferences(Model):
+class MbdPreferences(MbdModel):
     """
     A DynamoDB model for storing user preferences
     """
@@ -21,9 +25,18 @@ class MbdPreferences(Model):
     user_id = UnicodeAttribute(hash_key=True)
     default_meal_times = ListAttribute(default=lambda: ["9:00", "12:00", "18:00"])
     use_thumbnails = BooleanAttribute(default=True)
+    # IANA name of the zone the user's days are in, e.g. "Europe/Paris"
+    timezone = UnicodeAttribute(default=DEFAULT_TIMEZONE)
+    # Bumped by every update; identifies the preferences in ETags
+    version = NumberAttribute(default=0)
+
+    # Bump when to_dto changes, so ETags of the old representation stop matching.
+    # 2: added timezone
+    DTO_VERSION = 2
 
     def to_dto(self) -> dict:
         return {
             "defaultMealTimes": self.default_meal_times,
             "useThumbnails": self.use_thumbnails,
+            "timezone": self.timezone,
         }
@@ -0,0 +1,57 @@
+"""
+Async data access for user preferences.
+"""
+
+from dto.preferences_update import PreferencesUpdate
+from preferences.preferences import MbdPreferences
+from shared.cache import ModelCache
+from shared.executor import run_blocking
+
+preferences_cache = ModelCache(MbdPreferences)
+
+
+async def get_preferences(user_id: str) -> MbdPreferences:
+    return await run_blocking(_get_preferences, user_id)
+
+
+async def get_timezone(user_id: str) -> str:
+    """The user's timezone, for the bounds of their days (see shared/days.py)."""
+    return (await get_preferences(user_id)).timezone
+
+
+async def update_preferences(
+    user_id: str, preferences: PreferencesUpdate
+) -> MbdPreferences:
+    return await run_blocking(_update_preferences, user_id, preferences)
+
+
+def _get_preferences(user_id: str) -> MbdPreferences:
+    return preferences_cache.get(user_id, lambda: _load_preferences(user_id))
+
+
+def _load_preferences(user_id: str) -> MbdPreferences:
+    try:
+        return MbdPreferences.get(user_id)
+    except MbdPreferences.DoesNotExist:
+        return MbdPreferences(user_id=user_id)
+
+
+def _update_preferences(
+    user_id: str, preferences: PreferencesUpdate
+) -> MbdPreferences:
+    # An update creates the item if needed and returns it in full, so there is
+    # no need to read it first
+    actions = [
+        MbdPreferences.default_meal_times.set(preferences.defaultMealTimes),
+        MbdPreferences.use_thumbnails.set(preferences.useThumbnails),
+        MbdPreferences.version.add(1),
+    ]
+    # Clients that don't know about timezones leave the user's as it is
+    if preferences.timezone is not None:
+        actions.append(MbdPreferences.timezone.set(preferences.timezone))
+
+    prefs = MbdPreferences(user_id=user_id)
+    prefs.update(actions=actions)
+    preferences_cache.invalidate(user_id)
+
+    return prefs
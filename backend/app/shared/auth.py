@@ -1,15 +1,65 @@
+"""
+Authentication of Cognito-issued JWTs.
+
+Tokens are verified against the user pool's signing keys (JWKS): RS256
+signature, expiry, issuer, token use and, when configured, the app client.
+Verifying from scratch costs a signature check and possibly a JWKS fetch, so:
+- signing keys are cached, and refetched only when a token names a key ID we
+  haven't seen (at most once per AUTH_JWKS_MIN_REFRESH_SECONDS)
+- verified claims are cached per token, until the token expires, in an LRU of
+  AUTH_CLAIMS_CACHE_SIZE entries
+so after a client's first request, authenticating it is a dictionary lookup.
+
+Settings come from the environment:
+- COGNITO_USER_POOL_ID, COGNITO_REGION (default us-west-2)
+- COGNITO_APP_CLIENT_ID: when set, tokens must have been issued to this client
+- AUTH_JWKS_URL: overrides the user pool's JWKS URL, e.g. for a local stand-in
+- AUTH_VERIFY_TOKENS=false: decode tokens without verifying them. Local
+  development only.
+"""
+
 import base64
+import functools
+import hashlib
 import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from typing import Annotated, Callable, Optional
+
+from fastapi import Header
 
 from shared.exceptions import MbdException
+from shared.executor import run_blocking
 
+logger = logging.getLogger("uvicorn.error")
 
-def get_user_id(auth_token: str) -> str:
-    if not auth_token:
+# ASN.1 DigestInfo prefix for SHA-256, as used by RS256 (RFC 8017, section 9.2)
+SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+async def current_user_id(
+    authorization: Annotated[str | None, Header()] = None,
+) -> str:
+    """
+    FastAPI dependency giving the ID of the authenticated user.
+    Cached tokens are checked on the event loop; anything that may need a JWKS
+    fetch runs on the database thread pool.
+    """
+    if not authorization:
         raise MbdException(status_code=401, errors=["Authorization header is required"])
 
-    d = decode_jwt(auth_token.replace("Bearer ", ""))
-    return d["payload"]["sub"]
+    token = _bearer_token(authorization)
+    verifier = get_verifier()
+
+    claims = verifier.cached_claims(token)
+    if claims is None:
+        claims = await run_blocking(verifier.verify, token)
+
+    return claims["sub"]
 
 
 def decode_base64_url(data: str) -> bytes:
@@ -42,3 +92,218 @@ def decode_jwt(jwt: str) -> dict:
         "payload": payload,
         "signature": parts[2],  # Include the signature as-is (optional)
     }
+
+
+def verify_rs256(message: bytes, signature: bytes, n: int, e: int) -> bool:
+    """RSASSA-PKCS1-v1_5 verification with SHA-256."""
+    key_length = (n.bit_length() + 7) // 8
+    if len(signature) != key_length:
+        return False
+
+    signed = int.from_bytes(signature, "big")
+    if signed >= n:
+        return False
+
+    encoded = pow(signed, e, n).to_bytes(key_length, "big")
+    digest_info = SHA256_DIGEST_INFO + hashlib.sha256(message).digest()
+    expected = (
+        b"\x00\x01"
+        + b"\xff" * (key_length - len(digest_info) - 3)
+        + b"\x00"
+        + digest_info
+    )
+
+    return encoded == expected
+
+
+def fetch_jwks(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.load(response)
+
+
+class TokenVerifier:
+    """Verifies tokens from one issuer, caching its keys and verified claims."""
+
+    def __init__(
+        self,
+        issuer: str,
+        jwks_url: str,
+        client_id: Optional[str] = None,
+        claims_cache_size: int = 1024,
+        jwks_min_refresh_seconds: float = 60,
+        fetch: Callable[[str], dict] = fetch_jwks,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.issuer = issuer
+        self.jwks_url = jwks_url
+        self.client_id = client_id
+        self.claims_cache_size = claims_cache_size
+        self.jwks_min_refresh_seconds = jwks_min_refresh_seconds
+        self._fetch = fetch
+        self._clock = clock
+        # Key ID -> (modulus, exponent)
+        self._keys: dict[str, tuple[int, int]] = {}
+        self._keys_fetched_at: Optional[float] = None
+        self._keys_lock = threading.Lock()
+        # Token -> verified claims
+        self._claims: OrderedDict[str, dict] = OrderedDict()
+        self._claims_lock = threading.Lock()
+
+    def cached_claims(self, token: str) -> Optional[dict]:
+        """The token's claims if it was verified before and hasn't expired since."""
+        with self._claims_lock:
+            claims = self._claims.get(token)
+            if claims is None:
+                return None
+            if claims["exp"] <= self._clock():
+                del self._claims[token]
+                return None
+
+            self._claims.move_to_end(token)
+            return claims
+
+    def verify(self, token: str) -> dict:
+        """
+        Returns the token's claims. Raises MbdException (401) if the token is
+        malformed, forged, expired or not meant for us.
+        """
+        claims = self.cached_claims(token)
+        if claims is not None:
+            return claims
+
+        claims = self._verify(token)
+
+        with self._claims_lock:
+            self._claims[token] = claims
+            self._claims.move_to_end(token)
+            while len(self._claims) > self.claims_cache_size:
+                self._claims.popitem(last=False)
+
+        return claims
+
+    def _verify(self, token: str) -> dict:
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(decode_base64_url(header_segment))
+            claims = json.loads(decode_base64_url(payload_segment))
+            signature = decode_base64_url(signature_segment)
+        except ValueError:
+            raise _unauthorized("Malformed token")
+
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            raise _unauthorized("Malformed token")
+        if header.get("alg") != "RS256":
+            raise _unauthorized("Unsupported token algorithm")
+
+        key = self._get_key(header.get("kid"))
+        if key is None:
+            raise _unauthorized("Unknown signing key")
+        signed = f"{header_segment}.{payload_segment}".encode("ascii")
+        if not verify_rs256(signed, signature, *key):
+            raise _unauthorized("Invalid token signature")
+
+        if not isinstance(claims.get("exp"), (int, float)):
+            raise _unauthorized("Malformed token")
+        if claims["exp"] <= self._clock():
+            raise _unauthorized("Token has expired")
+        if claims.get("iss") != self.issuer:
+            raise _unauthorized("Token was issued by someone else")
+        if claims.get("token_use") not in ("id", "access"):
+            raise _unauthorized("Unsupported token use")
+        # ID tokens name the client as their audience, access tokens as client_id
+        audience = claims.get("aud", claims.get("client_id"))
+        if self.client_id is not None and audience != self.client_id:
+            raise _unauthorized("Token was issued to another client")
+        if not isinstance(claims.get("sub"), str):
+            raise _unauthorized("Malformed token")
+
+        return claims
+
+    def _get_key(self, kid: Optional[str]) -> Optional[tuple[int, int]]:
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        with self._keys_lock:
+            # Another thread may have refreshed the keys while this one waited
+            if kid in self._keys:
+                return self._keys[kid]
+
+            # Keys rotate rarely; don't let tokens with made-up key IDs make us
+            # refetch on every request
+            now = self._clock()
+            if (
+                self._keys_fetched_at is not None
+                and now - self._keys_fetched_at < self.jwks_min_refresh_seconds
+            ):
+                return None
+
+            logger.info("Fetching signing keys from %s", self.jwks_url)
+            try:
+                jwks = self._fetch(self.jwks_url)
+            except Exception as e:
+                # Not counted as a fetch, so the next request tries again rather
+                # than rejecting every new key ID as unknown
+                logger.error("Failed to fetch signing keys: %s", e)
+                raise MbdException(
+                    status_code=503, errors=["Unable to verify tokens right now"]
+                )
+            self._keys_fetched_at = now
+
+            self._keys = {
+                jwk["kid"]: (
+                    int.from_bytes(decode_base64_url(jwk["n"]), "big"),
+                    int.from_bytes(decode_base64_url(jwk["e"]), "big"),
+                )
+                for jwk in jwks.get("keys", [])
+                if jwk.get("kty") == "RSA" and "kid" in jwk
+            }
+            return self._keys.get(kid)
+
+
+class UnverifiedTokenDecoder:
+    """Stands in for TokenVerifier when AUTH_VERIFY_TOKENS=false."""
+
+    def cached_claims(self, token: str) -> Optional[dict]:
+        return self.verify(token)
+
+    def verify(self, token: str) -> dict:
+        try:
+            return decode_jwt(token)["payload"]
+        except (ValueError, KeyError):
+            raise _unauthorized("Malformed token")
+
+
+@functools.cache
+def get_verifier() -> TokenVerifier | UnverifiedTokenDecoder:
+    if os.getenv("AUTH_VERIFY_TOKENS", "true").lower() == "false":
+        logger.warning("AUTH_VERIFY_TOKENS=false: token signatures are NOT verified")
+        return UnverifiedTokenDecoder()
+
+    user_pool_id = os.getenv("COGNITO_USER_POOL_ID")
+    if not user_pool_id:
+        raise RuntimeError(
+            "COGNITO_USER_POOL_ID is required to verify tokens "
+            "(or set AUTH_VERIFY_TOKENS=false for local development)"
+        )
+
+    region = os.getenv("COGNITO_REGION", "us-west-2")
+    issuer = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}"
+
+    return TokenVerifier(
+        issuer=issuer,
+        jwks_url=os.getenv("AUTH_JWKS_URL", f"{issuer}/.well-known/jwks.json"),
+        client_id=os.getenv("COGNITO_APP_CLIENT_ID"),
+        claims_cache_size=int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "1024")),
+        jwks_min_refresh_seconds=float(
+            os.getenv("AUTH_JWKS_MIN_REFRESH_SECONDS", "60")
+        ),
+    )
+
+
+def _bearer_token(authorization: str) -> str:
+    return authorization.removeprefix("Bearer ").strip()
+
+
+def _unauthorized(reason: str) -> MbdException:
+    return MbdException(status_code=401, errors=[reason])
@@ -0,0 +1,99 @@
+"""
+Batched writes. DynamoDB's BatchWriteItem takes up to 25 items per call and may
+hand some of them back unprocessed when the table is throttled, so those are
+resent with exponential backoff until they go through or we run out of attempts.
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from typing import Callable, Sequence, Type
+
+from pynamodb.exceptions import PutError
+
+from shared.dynamodb import MbdModel
+
+logger = logging.getLogger("uvicorn.error")
+
+# DynamoDB's limit on items per BatchWriteItem call
+BATCH_WRITE_SIZE = 25
+# Calls per chunk, including the first, before unprocessed items are given up on
+BATCH_WRITE_MAX_ATTEMPTS = 6
+BATCH_WRITE_BASE_DELAY_SECONDS = 0.05
+BATCH_WRITE_MAX_DELAY_SECONDS = 2.0
+# Chunks of one import written at a time. Well under DB_MAX_WORKERS, so a large
+# import leaves database threads free for other requests
+BATCH_WRITE_MAX_CONCURRENCY = int(os.getenv("BATCH_WRITE_MAX_CONCURRENCY", "4"))
+
+
+def chunked(items: Sequence, size: int = BATCH_WRITE_SIZE) -> list[Sequence]:
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def batch_put(
+    model: Type[MbdModel],
+    items: Sequence[MbdModel],
+    max_attempts: int = BATCH_WRITE_MAX_ATTEMPTS,
+    sleep: Callable[[float], None] = time.sleep,
+) -> list[int]:
+    """
+    Put up to 25 items with a single BatchWriteItem call, resending unprocessed
+    items with capped exponential backoff and full jitter.
+
+    Args:
+        model: The items' model
+        items: The items to put. Their keys must be unique.
+        max_attempts: Calls to make before giving up on unprocessed items
+        sleep: Waits between attempts; replaceable for tests
+
+    Returns:
+        Positions in `items` of those that could not be written
+    """
+    if len(items) > BATCH_WRITE_SIZE:
+        raise ValueError(f"At most {BATCH_WRITE_SIZE} items can be written at once")
+    if not items:
+        return []
+
+    table_name = model.Meta.table_name
+    key_names = [model._hash_key_attribute().attr_name]
+    if model._range_key_attribute() is not None:
+        key_names.append(model._range_key_attribute().attr_name)
+
+    def item_key(serialized: dict) -> str:
+        return json.dumps([serialized[name] for name in key_names], sort_keys=True)
+
+    pending = [item.serialize() for item in items]
+    positions = {item_key(serialized): i for i, serialized in enumerate(pending)}
+    connection = model._get_connection()
+
+    for attempt in range(max_attempts):
+        if attempt > 0:
+            delay = min(
+                BATCH_WRITE_MAX_DELAY_SECONDS,
+                BATCH_WRITE_BASE_DELAY_SECONDS * 2 ** (attempt - 1),
+            )
+            sleep(random.uniform(0, delay))
+            logger.info(
+                "Resending %d unprocessed items to %s (attempt %d)",
+                len(pending),
+                table_name,
+                attempt + 1,
+            )
+
+        try:
+            data = connection.batch_write_item(put_items=pending)
+        except PutError as e:
+            # Throttling is already retried by botocore; anything left is fatal
+            logger.error("Batch write to %s failed: %s", table_name, e)
+            break
+
+        pending = [
+            request["PutRequest"]["Item"]
+            for request in (data or {}).get("UnprocessedItems", {}).get(table_name, [])
+        ]
+        if not pending:
+            return []
+
+    return sorted(positions[item_key(serialized)] for serialized in pending)
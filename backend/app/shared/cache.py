@@ -0,0 +1,196 @@
+"""
+Read-through caching for rarely changing, per-user items (preferences, food
+catalogs), with invalidation on writes.
+
+Items are cached in their serialized DynamoDB form, so every read hands out a
+fresh model instance and callers can never mutate a cached copy. The backend is
+chosen with CACHE_BACKEND:
+- "memory" (default): a TTL + LRU cache local to the process. Cheap, but each
+  Lambda container or uvicorn worker has its own copy, so a write through one
+  worker can leave another serving the old value until it expires.
+- "redis": any Redis-compatible server at CACHE_REDIS_URL, shared by every
+  worker. Needs the `redis` package.
+- "none": caching disabled; every read goes to the database.
+CACHE_TTL_SECONDS and CACHE_MAX_ENTRIES tune the entries' lifetime and the
+in-memory cache size.
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Optional, Protocol, Type, TypeVar
+
+from pynamodb.models import Model
+
+from shared.config import bootstrap
+
+bootstrap()
+
+logger = logging.getLogger("uvicorn.error")
+
+M = TypeVar("M", bound=Model)
+
+# Every ModelCache, for reporting
+_model_caches: list["ModelCache"] = []
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[str]: ...
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+
+class InMemoryCache:
+    """
+    Thread-safe cache with per-entry expiry that evicts the least recently used
+    entry once `max_entries` is reached.
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisCache:
+    """Cache shared between workers, on any Redis-compatible server."""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "CACHE_BACKEND=redis needs the `redis` package installed"
+            ) from e
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(key)
+        return None if value is None else value.decode("utf-8")
+
+    def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        self._client.set(key, value, px=int(ttl_seconds * 1000))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+
+@functools.cache
+def get_cache_backend() -> Optional[CacheBackend]:
+    backend = os.getenv("CACHE_BACKEND", "memory")
+    logger.info("Cache backend: %s", backend)
+
+    if backend == "memory":
+        return InMemoryCache(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")))
+    if backend == "redis":
+        return RedisCache(os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    if backend == "none":
+        return None
+
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+
+class ModelCache(Generic[M]):
+    """
+    Read-through cache for one model, keyed by user ID. Counts hits and misses.
+    """
+
+    def __init__(
+        self,
+        model: Type[M],
+        backend: Optional[CacheBackend] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.model = model
+        self.namespace = model.__name__
+        self.ttl_seconds = (
+            float(os.getenv("CACHE_TTL_SECONDS", "60"))
+            if ttl_seconds is None
+            else ttl_seconds
+        )
+        self.hits = 0
+        self.misses = 0
+        self._backend = backend
+        _model_caches.append(self)
+
+    @property
+    def backend(self) -> Optional[CacheBackend]:
+        # Resolved on first use, so tests and scripts can configure the environment first
+        return get_cache_backend() if self._backend is None else self._backend
+
+    def get(self, key: str, load: Callable[[], M]) -> M:
+        """
+        Returns the cached item for `key`, calling `load` to read it from the
+        database on a miss.
+        """
+        backend = self.backend
+        if backend is None:
+            return load()
+
+        cache_key = self._cache_key(key)
+
+        data = backend.get(cache_key)
+        if data is not None:
+            self.hits += 1
+            return self.model.from_raw_data(json.loads(data))
+
+        self.misses += 1
+        item = load()
+        backend.set(cache_key, json.dumps(item.serialize()), self.ttl_seconds)
+
+        return item
+
+    def invalidate(self, key: str) -> None:
+        backend = self.backend
+        if backend is not None:
+            backend.delete(self._cache_key(key))
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _cache_key(self, key: str) -> str:
+        return f"mbd:{self.namespace}:{key}"
+
+
+def cache_stats() -> dict[str, dict]:
+    """Hit and miss counts of every model cache in this process."""
+    return {cache.namespace: cache.stats() for cache in _model_caches}
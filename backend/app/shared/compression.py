@@ -0,0 +1,239 @@
+"""
+Response compression. JSON, NDJSON and CSV responses of at least
+COMPRESSION_MIN_BYTES are compressed with the first of COMPRESSION_ENCODINGS
+the client accepts:
+- "br": Brotli at COMPRESSION_BROTLI_QUALITY (0-11). Needs the `brotli` package;
+  without it, the default leaves Brotli out.
+- "gzip": at COMPRESSION_GZIP_LEVEL (1-9)
+
+Streamed responses (the journal export) are compressed chunk by chunk, and each
+chunk is flushed, so the client can decode it as soon as it arrives. Our ETags
+are weak, so they stay valid for every encoding of a response.
+
+benchmarks/compression.py measures the bytes saved and the CPU it costs.
+"""
+
+import functools
+import os
+import zlib
+from typing import Callable, Optional, Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+COMPRESSIBLE_MEDIA_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/",
+)
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes:
+        """Everything still buffered, so the client can decode what it has."""
+        ...
+
+    def finish(self) -> bytes: ...
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        # wbits=31: a gzip header and trailer, rather than raw zlib
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int):
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+@functools.cache
+def brotli_available() -> bool:
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def default_encodings() -> str:
+    return "br,gzip" if brotli_available() else "gzip"
+
+
+def compressor_factories(
+    encodings: str,
+    gzip_level: int = COMPRESSION_GZIP_LEVEL,
+    brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+) -> dict[str, Callable[[], Compressor]]:
+    """
+    Makers of a compressor per encoding, in order of preference, from a
+    comma-separated list like COMPRESSION_ENCODINGS.
+    """
+    factories = {}
+    for encoding in (e.strip() for e in encodings.split(",")):
+        if encoding == "gzip":
+            factories[encoding] = functools.partial(GzipCompressor, gzip_level)
+        elif encoding == "br":
+            if not brotli_available():
+                raise RuntimeError(
+                    "COMPRESSION_ENCODINGS=br needs the `brotli` package installed"
+                )
+            factories[encoding] = functools.partial(BrotliCompressor, brotli_quality)
+        elif encoding:
+            raise ValueError(f"Unsupported compression encoding: {encoding}")
+    return factories
+
+
+def accepted_encoding(accept_encoding: str, encodings) -> Optional[str]:
+    """The first of `encodings` an Accept-Encoding header allows, if any."""
+    qualities = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip()] = quality
+
+    for encoding in encodings:
+        if qualities.get(encoding, qualities.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing response bodies, streamed or not. See the
+    module docstring for what is compressed, and how.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_BYTES,
+        encodings: Optional[str] = None,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        if encodings is None:
+            encodings = os.getenv("COMPRESSION_ENCODINGS", default_encodings())
+        self.factories = compressor_factories(encodings, gzip_level, brotli_quality)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.factories:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = accepted_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), self.factories
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        response = _CompressedResponse(
+            self.factories[encoding], encoding, self.minimum_size, send
+        )
+        await self.app(scope, receive, response.send)
+
+
+class _CompressedResponse:
+    """
+    Compresses one response as it is sent. Its start is held back until the
+    first body message shows whether the response is worth compressing.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Compressor],
+        encoding: str,
+        minimum_size: int,
+        send: Send,
+    ):
+        self.factory = factory
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self._send = send
+        self.start: Optional[Message] = None
+        # Set once the response is being compressed
+        self.compressor: Optional[Compressor] = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message.get("headers", []))
+            if "content-encoding" in headers or not headers.get(
+                "content-type", ""
+            ).startswith(COMPRESSIBLE_MEDIA_TYPES):
+                await self._send(message)
+            else:
+                self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            # Whole responses under the threshold aren't worth it; streamed ones
+            # are assumed to be large
+            if not more_body and len(body) < self.minimum_size:
+                await self._send(start)
+                await self._send(message)
+                return
+
+            self.compressor = self.factory()
+            start["headers"] = list(start.get("headers", []))
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            del headers["Content-Length"]
+            if not more_body:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await self._send(start)
+                await self._send({**message, "body": body})
+                return
+            await self._send(start)
+
+        if self.compressor is None:
+            await self._send(message)
+            return
+
+        body = self.compressor.compress(body)
+        body += self.compressor.flush() if more_body else self.compressor.finish()
+        await self._send({**message, "body": body})
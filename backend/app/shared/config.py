@@ -0,0 +1,28 @@
+import functools
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from shared.correlation import install_log_record_factory
+
+ENV = os.getenv("ENVIRONMENT")
+
+logger = logging.getLogger("uvicorn.error")
+
+
+@functools.cache
+def bootstrap() -> None:
+    """
+    One-time process setup: logging, then the .env file for ENVIRONMENT.
+    Every module that reads configuration calls this before doing so; only the
+    first call does any work, so warm Lambda invocations never repeat it.
+    """
+    logger.setLevel(logging.INFO)
+    install_log_record_factory()
+
+    if ENV is not None:
+        logger.info("Loading environment: %s", ENV)
+        load_dotenv(f".env.{ENV}")
+    else:
+        logger.warning("Hmm... no ENV value set")
@@ -0,0 +1,109 @@
+"""
+Correlation IDs tie a request's log lines and its response together.
+
+Every request gets the ID sent in its X-Correlation-ID header, or a new one.
+It is echoed in the response header, kept in a context variable for the
+duration of the request (work handed to `run_blocking` sees it too) and
+stamped on every log record as `correlation_id`, for use in log formats as
+`%(correlation_id)s`.
+"""
+
+import logging
+import traceback
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("uvicorn.error")
+
+CORRELATION_ID_HEADER = "X-Correlation-ID"
+# Client-supplied IDs longer than this are replaced, rather than logged
+MAX_CORRELATION_ID_LENGTH = 128
+
+correlation_id_var: ContextVar[Optional[str]] = ContextVar(
+    "correlation_id", default=None
+)
+
+_HEADER_KEY = CORRELATION_ID_HEADER.lower().encode("latin-1")
+
+
+def install_log_record_factory() -> None:
+    """Adds the current correlation ID (None outside requests) to every log record."""
+    default_factory = logging.getLogRecordFactory()
+
+    def record_factory(*args, **kwargs) -> logging.LogRecord:
+        record = default_factory(*args, **kwargs)
+        record.correlation_id = correlation_id_var.get()
+        return record
+
+    logging.setLogRecordFactory(record_factory)
+
+
+class CorrelationIdMiddleware:
+    """
+    Pure ASGI middleware: assigns the correlation ID and turns unhandled
+    exceptions into a 500 carrying it. Unlike `@app.middleware("http")`, it
+    doesn't run the app in a separate task or copy the response body through a
+    stream, so streaming responses pass straight through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        correlation_id = _client_correlation_id(scope) or str(uuid.uuid4())
+        # For handlers, as request.state.correlation_id
+        scope.setdefault("state", {})["correlation_id"] = correlation_id
+        header = (_HEADER_KEY, correlation_id.encode("latin-1"))
+        response_started = False
+
+        async def send_with_correlation_id(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                headers = message.setdefault("headers", [])
+                if isinstance(headers, list):
+                    headers.append(header)
+                else:
+                    message["headers"] = [*headers, header]
+            await send(message)
+
+        token = correlation_id_var.set(correlation_id)
+        try:
+            await self.app(scope, receive, send_with_correlation_id)
+        except Exception:
+            logger.error("Exception occurred: %s", traceback.format_exc())
+            logger.error("[Correlation ID: %s]", correlation_id)
+            if response_started:
+                # Too late to change the status; the connection is cut short
+                raise
+
+            response = JSONResponse(
+                {
+                    "detail": "An internal server error occurred. Please contact your belly's diary maintainers"
+                },
+                status_code=500,
+            )
+            await response(scope, receive, send_with_correlation_id)
+        finally:
+            correlation_id_var.reset(token)
+
+
+def _client_correlation_id(scope: Scope) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == _HEADER_KEY:
+            correlation_id = value.decode("latin-1")
+            if (
+                0 < len(correlation_id) <= MAX_CORRELATION_ID_LENGTH
+                and correlation_id.isprintable()
+            ):
+                return correlation_id
+            return None
+    return None
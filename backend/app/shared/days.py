@@ -0,0 +1,63 @@
+"""
+Calendar days in users' timezones. Meals and symptoms are stored in UTC, but a
+user's "yesterday" or "last 3 days" are days where they live: this maps those
+days to UTC bounds for queries.
+
+Bounds are cached per (zone, local date), as every request for the same day asks
+for the same ones, and a request computes "today" once, in a LocalDays.
+"""
+
+import functools
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Users who haven't chosen a timezone. All days used to be Pacific ones
+DEFAULT_TIMEZONE = "America/Los_Angeles"
+
+
+def is_timezone(zone: str) -> bool:
+    """Whether `zone` is an IANA timezone name, e.g. "Europe/Paris"."""
+    try:
+        ZoneInfo(zone)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+@functools.lru_cache(maxsize=4096)
+def day_bounds(zone: str, local_date: date) -> tuple[datetime, datetime]:
+    """
+    The start of `local_date` in `zone` and the start of the next day, in UTC.
+    Days around daylight saving changes are 23 or 25 hours long.
+    """
+    tz = ZoneInfo(zone)
+    start = datetime.combine(local_date, time.min, tzinfo=tz)
+    end = datetime.combine(local_date + timedelta(days=1), time.min, tzinfo=tz)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+class LocalDays:
+    """A user's calendar as of one instant (now, by default)."""
+
+    def __init__(self, zone: str, now: Optional[datetime] = None):
+        self.zone = zone
+        self.now = datetime.now(timezone.utc) if now is None else now
+        self.today = self.now.astimezone(ZoneInfo(zone)).date()
+
+    def day(self, days_ago: int) -> tuple[datetime, datetime]:
+        """UTC bounds of the local day `days_ago` days before today."""
+        return day_bounds(self.zone, self.today - timedelta(days=days_ago))
+
+    def window(self, days: int, offset: int = 0) -> tuple[datetime, datetime]:
+        """
+        UTC bounds of `days` whole local days, the last of them `offset` days
+        before today. Windows for consecutive offsets (offset, offset + days,
+        ...) meet without overlapping. No days is an empty window.
+        """
+        _, end = self.day(offset)
+        if days < 1:
+            return end, end
+
+        start, _ = self.day(offset + days - 1)
+        return start, end
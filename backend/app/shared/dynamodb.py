@@ -0,0 +1,305 @@
+"""
+One DynamoDB connection (and botocore client) per process, shared by every
+model and transaction and reused across warm Lambda invocations.
+
+Settings come from the environment:
+- DYNAMODB_HOST: endpoint override, for local DynamoDB stand-ins
+- DYNAMODB_MAX_POOL_CONNECTIONS: HTTP connection pool size; defaults to the
+  size of the database thread pool so no worker ever waits for a socket
+- DYNAMODB_CONNECT_TIMEOUT_SECONDS / DYNAMODB_READ_TIMEOUT_SECONDS
+- DYNAMODB_MAX_RETRY_ATTEMPTS: retries on top of the first attempt
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Optional, Type, TypeVar
+
+import botocore.config
+from pynamodb.attributes import Attribute
+from pynamodb.connection import Connection, TableConnection
+from pynamodb.constants import ALL_OLD, ATTRIBUTES
+from pynamodb.exceptions import TransactWriteError
+from pynamodb.expressions.condition import Condition
+from pynamodb.indexes import Index
+from pynamodb.models import Model, ResultIterator
+from pynamodb.transactions import TransactWrite
+
+from shared import metrics
+from shared.config import bootstrap
+from shared.exceptions import MbdException
+from shared.executor import DB_MAX_WORKERS
+
+logger = logging.getLogger("uvicorn.error")
+
+bootstrap()
+
+DYNAMODB_REGION = "us-west-2"
+
+M = TypeVar("M", bound="MbdModel")
+
+
+class SharedConnection(Connection):
+    """
+    A Connection whose botocore client is created once, under a lock, with TCP
+    keep-alive so pooled sockets survive between warm invocations.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._client_lock:
+            # botocore can cache empty credentials after a metadata service hiccup;
+            # a client without credentials is replaced, as PynamoDB does
+            if not self._client or (
+                self._client._request_signer
+                and not self._client._request_signer._credentials
+            ):
+                config = botocore.config.Config(
+                    parameter_validation=False,
+                    connect_timeout=self._connect_timeout_seconds,
+                    read_timeout=self._read_timeout_seconds,
+                    max_pool_connections=self._max_pool_connections,
+                    retries={
+                        "total_max_attempts": 1 + self._max_retry_attempts_exception,
+                        "mode": "standard",
+                    },
+                    tcp_keepalive=True,
+                )
+                self._client = self.session.create_client(
+                    "dynamodb", self.region, endpoint_url=self.host, config=config
+                )
+                self._client.meta.events.register_first(
+                    "before-send.*.*", self._before_send
+                )
+            return self._client
+
+    def dispatch(self, operation_name: str, operation_kwargs: dict) -> dict:
+        # PynamoDB already asks every data operation for its consumed capacity
+        data = None
+        start = time.perf_counter()
+        try:
+            data = super().dispatch(operation_name, operation_kwargs)
+            return data
+        finally:
+            metrics.record_dynamodb_call(
+                operation_name,
+                operation_kwargs,
+                data,
+                time.perf_counter() - start,
+            )
+
+
+@functools.cache
+def get_connection() -> SharedConnection:
+    return SharedConnection(
+        region=DYNAMODB_REGION,
+        host=os.getenv("DYNAMODB_HOST"),
+        max_pool_connections=int(
+            os.getenv("DYNAMODB_MAX_POOL_CONNECTIONS", DB_MAX_WORKERS)
+        ),
+        connect_timeout_seconds=float(
+            os.getenv("DYNAMODB_CONNECT_TIMEOUT_SECONDS", "2")
+        ),
+        read_timeout_seconds=float(os.getenv("DYNAMODB_READ_TIMEOUT_SECONDS", "5")),
+        max_retry_attempts=int(os.getenv("DYNAMODB_MAX_RETRY_ATTEMPTS", "3")),
+    )
+
+
+class MbdModel(Model):
+    """
+    Base class for MBD tables. Routes every table's operations through the shared
+    connection instead of PynamoDB's default of one connection per model class.
+    """
+
+    @classmethod
+    def _get_connection(cls) -> TableConnection:
+        table_connection = super()._get_connection()
+        connection = get_connection()
+
+        if table_connection.connection is not connection:
+            if cls.Meta.table_name not in connection._tables:
+                connection.add_meta_table(table_connection.get_meta_table())
+            table_connection.connection = connection
+
+        return table_connection
+
+    def save_replacing(self: M, condition: Optional[Condition] = None) -> Optional[M]:
+        """
+        Save this item, like `save`, and return the item it overwrote, if any.
+        """
+        args, kwargs = self._get_save_args(condition=condition)
+        data = self._get_connection().put_item(
+            *args, return_values=ALL_OLD, **kwargs
+        )
+        self.update_local_version_attribute()
+
+        previous = (data or {}).get(ATTRIBUTES)
+        return type(self).from_raw_data(previous) if previous else None
+
+    @classmethod
+    def query_projected(
+        cls: Type[M],
+        hash_key: Any,
+        range_key_condition: Optional[Condition] = None,
+        filter_condition: Optional[Condition] = None,
+        attributes: Optional[Iterable[Attribute]] = None,
+        index: Optional[Index] = None,
+        **kwargs,
+    ) -> ResultIterator[M]:
+        """
+        `query`, reading only the given attributes of each item (plus its range
+        key, which cursors and ordering rely on). Filter conditions are applied
+        by DynamoDB, so items that don't match are neither returned nor
+        deserialized, though they still count towards read capacity and `limit`.
+        With `index`, the index is queried instead of the table.
+
+        Items read with `attributes` are partial: never save them.
+        """
+        query = cls.query if index is None else index.query
+        return query(
+            hash_key=hash_key,
+            range_key_condition=range_key_condition,
+            filter_condition=filter_condition,
+            attributes_to_get=cls._projection(attributes),
+            **kwargs,
+        )
+
+    @classmethod
+    def query_raw(
+        cls,
+        hash_key: Any,
+        range_key_condition: Optional[Condition] = None,
+        attributes: Optional[Iterable[Attribute]] = None,
+        scan_index_forward: Optional[bool] = None,
+    ) -> ResultIterator[dict]:
+        """
+        Like `query_projected`, but yields the items as DynamoDB returns them,
+        in its wire format, without deserializing them into models.
+        """
+        return ResultIterator(
+            cls._get_connection().query,
+            (cls._serialize_keys(hash_key)[0],),
+            dict(
+                range_key_condition=range_key_condition,
+                attributes_to_get=cls._projection(attributes),
+                scan_index_forward=scan_index_forward,
+            ),
+        )
+
+    @classmethod
+    def _projection(
+        cls, attributes: Optional[Iterable[Attribute]]
+    ) -> Optional[list[str]]:
+        if attributes is None:
+            return None
+
+        names = {attribute.attr_name for attribute in attributes}
+        range_key = cls._range_key_attribute()
+        if range_key is not None:
+            names.add(range_key.attr_name)
+        # Sorted, so the same projection always makes the same request
+        return sorted(names)
+
+
+class MbdTransaction(TransactWrite):
+    """
+    A TransactWrite that knows why each of its writes' conditions could fail.
+    Each write takes an optional `conflict`, the error to report if its
+    condition fails; see `transaction`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (model, conflict) of each write, by kind, as DynamoDB receives them
+        self._checks: list[tuple[Any, Optional[str]]] = []
+        self._deletes: list[tuple[Any, Optional[str]]] = []
+        self._puts: list[tuple[Any, Optional[str]]] = []
+        self._updates: list[tuple[Any, Optional[str]]] = []
+
+    def condition_check(
+        self, model_cls, hash_key, range_key=None, condition=None, conflict=None
+    ):
+        super().condition_check(model_cls, hash_key, range_key, condition)
+        self._checks.append((model_cls, conflict))
+
+    def delete(self, model, condition=None, *, conflict=None, **kwargs):
+        super().delete(model, condition, **kwargs)
+        self._deletes.append((model, conflict))
+
+    def save(self, model, condition=None, return_values=None, *, conflict=None):
+        super().save(model, condition, return_values)
+        self._puts.append((model, conflict))
+
+    def update(
+        self,
+        model,
+        actions,
+        condition=None,
+        return_values=None,
+        *,
+        conflict=None,
+        **kwargs,
+    ):
+        super().update(model, actions, condition, return_values, **kwargs)
+        self._updates.append((model, conflict))
+
+    def failed_writes(self, e: TransactWriteError) -> list[tuple[Any, Optional[str]]]:
+        """The writes whose conditions cancelled the transaction."""
+        # PynamoDB sends checks, then deletes, puts and updates, whatever order
+        # they were added in; cancellation reasons follow the same order
+        writes = self._checks + self._deletes + self._puts + self._updates
+        return [
+            write
+            for write, reason in zip(writes, e.cancellation_reasons)
+            if reason is not None and reason.code == "ConditionalCheckFailed"
+        ]
+
+
+class TransactionConflict(MbdException):
+    """
+    A transaction was cancelled because conditions failed. A 409 listing the
+    failed writes' conflicts; `models` are the items (or, for condition checks,
+    model classes) they were written to.
+    """
+
+    def __init__(self, models: list, errors: list[str]):
+        super().__init__(status_code=409, errors=errors)
+        self.models = models
+
+
+@contextmanager
+def transaction(
+    failure: str,
+    client_request_token: Optional[str] = None,
+    connection: Optional[Connection] = None,
+) -> Iterator[MbdTransaction]:
+    """
+    A transaction on the shared connection, committed when the block exits.
+
+    Raises:
+        TransactionConflict: If conditions failed
+        MbdException: A 500 with the `failure` message, if it failed otherwise
+    """
+    try:
+        with MbdTransaction(
+            connection=connection or get_connection(),
+            client_request_token=client_request_token,
+        ) as write:
+            yield write
+    except TransactWriteError as e:
+        logger.error(f"Transaction error: {str(e)}")
+
+        failed = write.failed_writes(e)
+        if failed:
+            raise TransactionConflict(
+                [model for model, _ in failed],
+                [conflict or failure for _, conflict in failed],
+            )
+        raise MbdException(status_code=500, errors=[failure])
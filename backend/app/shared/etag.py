@@ -0,0 +1,72 @@
+"""
+Conditional GETs. Responses for a user's resources carry a weak ETag, and a
+request whose If-None-Match already names it gets an empty 304 instead of the
+body.
+
+Items with a version number are validated from the version alone, without
+building the response; anything else is validated from a hash of its content,
+which still saves sending it.
+"""
+
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Response
+
+# Per-user data: shared caches must not store it, and clients must revalidate
+# before reusing it
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+ETAG_HEADER = "ETag"
+
+
+def version_etag(*key: Any) -> str:
+    """Weak ETag for an item identified by `key`, which should include its version."""
+    return _weak_etag(repr(key).encode())
+
+
+def content_etag(body: bytes, *headers: Optional[str]) -> str:
+    """Weak ETag for a serialized response body and any headers that go with it."""
+    return _weak_etag(repr(headers).encode() + body)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names `etag`, using weak comparison."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    opaque_tag = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque_tag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def conditional(
+    response: Response,
+    etag: str,
+    if_none_match: Optional[str],
+    cache_control: str = PRIVATE_CACHE_CONTROL,
+) -> Optional[Response]:
+    """
+    Adds validators to an endpoint's response.
+
+    Returns:
+        A 304 response to return instead of the body when the client already
+        has this version, otherwise None
+    """
+    headers = {
+        ETAG_HEADER: etag,
+        "Cache-Control": cache_control,
+        "Vary": "Authorization",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+
+def _weak_etag(data: bytes) -> str:
+    return f'W/"{hashlib.sha256(data).hexdigest()[:32]}"'
@@ -0,0 +1,33 @@
+"""
+The database thread pool. PynamoDB is synchronous, so the repositories hand every
+database call to run_blocking, and request handlers never block the event loop.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+# The event loop stays free to serve other requests while a DynamoDB round trip is
+# in flight, and the pool size caps how many calls a single worker process can
+# have outstanding at once.
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=DB_MAX_WORKERS, thread_name_prefix="mbd-db"
+)
+
+
+async def run_blocking(func: Callable[..., T], /, *args, **kwargs) -> T:
+    """
+    Runs a blocking call on the shared database thread pool and awaits its result.
+    Context variables of the caller are visible inside the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_executor, call)
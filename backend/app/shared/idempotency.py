@@ -0,0 +1,216 @@
+"""
+Idempotency-Key support for write endpoints, so a client can retry a write
+whose response it never received without the write happening twice.
+
+The first request with a key claims it in DynamoDB, runs, and stores its
+response under the key. A retry with the same key and the same request gets the
+stored response back, with an Idempotent-Replayed header, and nothing is written
+again. The same key with a different request is rejected with a 422, and a retry
+that arrives while the first request is still running gets a 409. Requests that
+fail release their key, so a retry runs them again.
+
+Keys are per user and kept for IDEMPOTENCY_TTL_SECONDS (a day by default).
+Until its request completes, a key is only leased, for IDEMPOTENCY_LEASE_SECONDS:
+a Lambda that times out never releases its key, and a retry takes the key over
+once the lease has run out. Requests without a key are not affected and cost
+nothing extra.
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+from typing import Annotated, Any, AsyncIterator, Optional
+
+from fastapi import Depends, Header, Request
+from fastapi.responses import Response
+
+from shared.auth import current_user_id
+from shared.exceptions import MbdException
+from shared.executor import run_blocking
+from shared.lazy import lazy_import
+from shared.responses import FastJSONResponse, dumps
+
+logger = logging.getLogger("uvicorn.error")
+
+# Keeps PynamoDB out of the cold start, see main.py
+store = lazy_import("shared.idempotency_store")
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Longer than a request can run: the Lambda timeout, in infrastructure/lambda.tf,
+# is 10 seconds
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "30"))
+
+
+class IdempotentRequest:
+    """
+    A write request, and the Idempotency-Key it was sent with, if any. Endpoints
+    return `replay()` if it has a response, and otherwise build their response
+    with `respond()`:
+
+        if (replay := await idempotent.replay()) is not None:
+            return replay
+        ...
+        return await idempotent.respond(content)
+    """
+
+    def __init__(self, request: Request, user_id: str, key: Optional[str]):
+        self.request = request
+        self.user_id = user_id
+        self.key = key
+        self._fingerprint: Optional[bytes] = None
+        # Identifies this request's claim on the key
+        self._lease = uuid.uuid4().hex
+        # Whether this request holds the key and hasn't stored a response yet
+        self._claimed = False
+
+    @property
+    def client_request_token(self) -> Optional[str]:
+        """A DynamoDB transaction token unique to the user and key, if any."""
+        if self.key is None:
+            return None
+        digest = hashlib.sha256(f"{self.user_id}\n{self.key}".encode("utf-8"))
+        # Tokens are at most 36 characters
+        return digest.hexdigest()[:36]
+
+    async def replay(self) -> Optional[Response]:
+        """
+        The stored response of an earlier request with the same key, or None
+        once this request holds the key (or has none) and should go ahead.
+        """
+        if self.key is None:
+            return None
+
+        self._fingerprint = await self._request_fingerprint()
+        cached = store.cached_response(self.user_id, self.key)
+        if cached is not None:
+            return self._replay(*cached)
+
+        record = await run_blocking(
+            store.claim,
+            self.user_id,
+            self.key,
+            self._fingerprint,
+            self._lease,
+            IDEMPOTENCY_LEASE_SECONDS,
+        )
+        if record is None:
+            self._claimed = True
+            return None
+
+        if record.fingerprint != self._fingerprint:
+            raise _key_reused()
+        if not record.completed:
+            raise MbdException(
+                status_code=409,
+                errors=[
+                    f"A request with this {IDEMPOTENCY_KEY_HEADER} is still in progress"
+                ],
+                headers={"Retry-After": "1"},
+            )
+
+        body = record.response_body()
+        if body is None:
+            raise MbdException(
+                status_code=409,
+                errors=[
+                    f"The request with this {IDEMPOTENCY_KEY_HEADER} completed with"
+                    f" status {record.status_code}, but its response was too large"
+                    " to keep"
+                ],
+            )
+        store.remember(
+            self.user_id,
+            self.key,
+            record.fingerprint,
+            record.status_code,
+            body,
+            IDEMPOTENCY_TTL_SECONDS,
+        )
+        return self._replay(record.fingerprint, record.status_code, body)
+
+    async def respond(self, content: Any, status_code: int = 200) -> Response:
+        """The JSON response for `content`, stored under the key if there is one."""
+        body = dumps(content)
+        if self._claimed:
+            try:
+                stored = await run_blocking(
+                    store.complete,
+                    self.user_id,
+                    self.key,
+                    self._fingerprint,
+                    self._lease,
+                    status_code,
+                    body,
+                    IDEMPOTENCY_TTL_SECONDS,
+                )
+                self._claimed = False
+                if not stored:
+                    logger.warning(
+                        "Lost the lease on %s to a retry, whose response is kept",
+                        self.key,
+                    )
+            except Exception:
+                # The write went through, so it is still reported as done. The
+                # key is released: a retry runs again, as it would without one.
+                logger.exception("Failed to store the response to %s", self.key)
+
+        return FastJSONResponse(body, status_code=status_code)
+
+    async def release(self) -> None:
+        if self._claimed:
+            self._claimed = False
+            await run_blocking(store.release, self.user_id, self.key, self._lease)
+
+    def _replay(self, fingerprint: bytes, status_code: int, body: bytes) -> Response:
+        if fingerprint != self._fingerprint:
+            raise _key_reused()
+        return FastJSONResponse(
+            body, status_code=status_code, headers={REPLAYED_HEADER: "true"}
+        )
+
+    async def _request_fingerprint(self) -> bytes:
+        # Reading the body here keeps it for the endpoint; streamed bodies are
+        # replayed from memory
+        digest = hashlib.sha256()
+        digest.update(f"{self.request.method} {self.request.url.path}\n".encode())
+        digest.update(await self.request.body())
+        return digest.digest()[:16]
+
+
+async def idempotent_request(
+    request: Request,
+    user_id: Annotated[str, Depends(current_user_id)],
+    idempotency_key: Annotated[str | None, Header()] = None,
+) -> AsyncIterator[IdempotentRequest]:
+    """Dependency for write endpoints. Releases the key if the endpoint fails."""
+    if idempotency_key is not None and not (
+        0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH
+        and idempotency_key.isascii()
+        and idempotency_key.isprintable()
+    ):
+        raise MbdException(
+            status_code=400,
+            errors=[
+                f"{IDEMPOTENCY_KEY_HEADER} must be 1-{MAX_IDEMPOTENCY_KEY_LENGTH}"
+                " printable ASCII characters"
+            ],
+        )
+
+    idempotent = IdempotentRequest(request, user_id, idempotency_key)
+    try:
+        yield idempotent
+    finally:
+        await idempotent.release()
+
+
+def _key_reused() -> MbdException:
+    return MbdException(
+        status_code=422,
+        errors=[
+            f"This {IDEMPOTENCY_KEY_HEADER} was already used for a different request"
+        ],
+    )
@@ -0,0 +1,216 @@
+"""
+Storage for shared/idempotency.py: one small item per idempotency key, expired
+by DynamoDB TTL, plus an in-process cache of completed responses so a retry
+that lands on the same worker is answered without a database call.
+
+Each claim carries a random lease token, and only the holder of the current
+lease can store a response or release the key: a request whose lease ran out
+and was taken over can't overwrite its successor's result.
+
+Responses are stored compressed. One that is still over
+IDEMPOTENCY_MAX_BODY_BYTES (DynamoDB items are at most 400KB) is left out: the
+key is still completed, so a retry is refused rather than run again.
+
+Loaded on first use, as it brings in PynamoDB.
+"""
+
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pynamodb.attributes import (
+    BinaryAttribute,
+    NumberAttribute,
+    TTLAttribute,
+    UnicodeAttribute,
+)
+from pynamodb.exceptions import DeleteError, PutError
+
+from shared.cache import InMemoryCache
+from shared.config import bootstrap
+from shared.dynamodb import MbdModel
+
+logger = logging.getLogger("uvicorn.error")
+
+bootstrap()
+
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_MAX_ENTRIES", "1024"))
+# Compressed response bodies kept in an item, leaving room for its other attributes
+IDEMPOTENCY_MAX_BODY_BYTES = 350_000
+
+
+class MbdIdempotencyKey(MbdModel):
+    class Meta:
+        table_name = os.getenv("IDEMPOTENCY_DB_NAME")
+        region = "us-west-2"
+
+    user_id = UnicodeAttribute(hash_key=True)
+    idempotency_key = UnicodeAttribute(range_key=True)
+    # Digest of the request that first used the key
+    fingerprint = BinaryAttribute(legacy_encoding=False)
+    # Token of the request holding the key
+    lease = UnicodeAttribute(null=True)
+    # The response, once the first request has completed. The body is left out
+    # if it is too large
+    status_code = NumberAttribute(null=True)
+    body = BinaryAttribute(legacy_encoding=False, null=True)
+    # "zlib", or None for bodies stored as they are
+    body_encoding = UnicodeAttribute(null=True)
+    expires_at = TTLAttribute()
+
+    @property
+    def completed(self) -> bool:
+        return self.status_code is not None
+
+    def response_body(self) -> Optional[bytes]:
+        """The body of the stored response, or None if it was too large to keep."""
+        if self.body is None or self.body_encoding is None:
+            return self.body
+        return zlib.decompress(self.body)
+
+
+# "<user ID>\n<idempotency key>" -> "<fingerprint hex> <status code> <body>"
+_responses = InMemoryCache(max_entries=IDEMPOTENCY_CACHE_MAX_ENTRIES)
+
+
+def cached_response(
+    user_id: str, idempotency_key: str
+) -> Optional[tuple[bytes, int, bytes]]:
+    """The fingerprint, status code and body of a completed request, if cached."""
+    value = _responses.get(_cache_key(user_id, idempotency_key))
+    if value is None:
+        return None
+
+    fingerprint, status_code, body = value.split(" ", 2)
+    return bytes.fromhex(fingerprint), int(status_code), body.encode("utf-8")
+
+
+def claim(
+    user_id: str,
+    idempotency_key: str,
+    fingerprint: bytes,
+    lease: str,
+    lease_seconds: float,
+) -> Optional[MbdIdempotencyKey]:
+    """
+    Claim the key for a request about to run, under the token `lease`, for
+    `lease_seconds`. Keys whose lease has run out without a response are taken
+    over.
+
+    Returns:
+        None if the key is now this request's, otherwise the key as the request
+        that holds it left it (in progress or completed)
+    """
+    now = datetime.now(timezone.utc)
+    record = MbdIdempotencyKey(
+        user_id=user_id,
+        idempotency_key=idempotency_key,
+        fingerprint=fingerprint,
+        lease=lease,
+        expires_at=now + timedelta(seconds=lease_seconds),
+    )
+
+    # The holder may release the key between our failed claim and our read of
+    # it, so there are two tries
+    for _ in range(2):
+        try:
+            # TTL deletes expired keys within days, not instantly
+            record.save(
+                condition=MbdIdempotencyKey.idempotency_key.does_not_exist()
+                | (MbdIdempotencyKey.expires_at < now)
+            )
+            return None
+        except PutError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+
+        try:
+            return MbdIdempotencyKey.get(
+                user_id, idempotency_key, consistent_read=True
+            )
+        except MbdIdempotencyKey.DoesNotExist:
+            continue
+
+    raise RuntimeError(f"Could not claim idempotency key {idempotency_key}")
+
+
+def complete(
+    user_id: str,
+    idempotency_key: str,
+    fingerprint: bytes,
+    lease: str,
+    status_code: int,
+    body: bytes,
+    ttl_seconds: float,
+) -> bool:
+    """
+    Store the response of the request holding the key, for `ttl_seconds`.
+
+    Returns:
+        False if the lease was lost to another request, which keeps the key
+    """
+    compressed = zlib.compress(body)
+    if len(compressed) > IDEMPOTENCY_MAX_BODY_BYTES:
+        logger.warning(
+            "The response to %s is too large to keep (%d bytes compressed)",
+            idempotency_key,
+            len(compressed),
+        )
+        compressed = None
+
+    try:
+        MbdIdempotencyKey(
+            user_id=user_id,
+            idempotency_key=idempotency_key,
+            fingerprint=fingerprint,
+            lease=lease,
+            status_code=status_code,
+            body=compressed,
+            body_encoding=None if compressed is None else "zlib",
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds),
+        ).save(condition=MbdIdempotencyKey.lease == lease)
+    except PutError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+        return False
+
+    if compressed is not None:
+        remember(user_id, idempotency_key, fingerprint, status_code, body, ttl_seconds)
+    return True
+
+
+def remember(
+    user_id: str,
+    idempotency_key: str,
+    fingerprint: bytes,
+    status_code: int,
+    body: bytes,
+    ttl_seconds: float,
+) -> None:
+    """Cache a completed request's response in this process."""
+    _responses.set(
+        _cache_key(user_id, idempotency_key),
+        f"{fingerprint.hex()} {status_code} {body.decode('utf-8')}",
+        ttl_seconds,
+    )
+
+
+def release(user_id: str, idempotency_key: str, lease: str) -> None:
+    """
+    Give up the key of a request that failed, so a retry runs it again. Keys
+    that are completed, or held under another lease, are left alone.
+    """
+    try:
+        MbdIdempotencyKey(user_id=user_id, idempotency_key=idempotency_key).delete(
+            condition=MbdIdempotencyKey.status_code.does_not_exist()
+            & (MbdIdempotencyKey.lease == lease)
+        )
+    except DeleteError as e:
+        if e.cause_response_code != "ConditionalCheckFailedException":
+            raise
+
+
+def _cache_key(user_id: str, idempotency_key: str) -> str:
+    return f"{user_id}\n{idempotency_key}"
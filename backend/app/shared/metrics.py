@@ -0,0 +1,492 @@
+"""
+Request and DynamoDB instrumentation.
+
+`MetricsMiddleware` times every request and reports it per route template
+(e.g. /foods/suggested/{meal_type}), together with the DynamoDB calls it made,
+the capacity units they consumed and the items they read or wrote. Every
+DynamoDB call is also reported on its own, from `SharedConnection.dispatch`.
+
+Where the numbers go is set by METRICS_EXPORTER:
+- "emf" (default): one CloudWatch Embedded Metric Format line on stdout per
+  request and per DynamoDB call. In Lambda, CloudWatch Logs turns these into
+  metrics in the METRICS_NAMESPACE namespace, with no extra packages or layers.
+- "otel": OpenTelemetry instruments, following the semantic conventions for
+  HTTP servers and database clients. Needs the `opentelemetry-api` package, and
+  an SDK or the ADOT Lambda layer to actually send anything; without them
+  nothing is recorded.
+- "memory": kept in process, in an InMemoryExporter. For tests and benchmarks.
+- "none": nothing is recorded.
+"""
+
+import bisect
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional, Protocol, Sequence
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("uvicorn.error")
+
+# Bucket boundaries, in seconds, recommended for http.server.request.duration
+DURATION_BUCKETS_SECONDS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0
+)  # fmt: skip
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "MealJournal")
+
+
+@dataclass(slots=True)
+class RequestStats:
+    """DynamoDB usage of one request. Updated from the database threads."""
+
+    dynamodb_calls: int = 0
+    consumed_capacity: float = 0.0
+    items: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_call(self, consumed_capacity: float, items: int) -> None:
+        with self._lock:
+            self.dynamodb_calls += 1
+            self.consumed_capacity += consumed_capacity
+            self.items += items
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+class MetricsExporter(Protocol):
+    def record_request(
+        self,
+        method: str,
+        route: str,
+        status_code: int,
+        duration_seconds: float,
+        stats: RequestStats,
+    ) -> None: ...
+
+    def record_dynamodb_call(
+        self,
+        operation: str,
+        table: str,
+        duration_seconds: float,
+        consumed_capacity: float,
+        items: int,
+        error: bool,
+    ) -> None: ...
+
+
+class Histogram:
+    """Explicit-bucket histogram, as OpenTelemetry aggregates them."""
+
+    def __init__(self, boundaries: Sequence[float] = DURATION_BUCKETS_SECONDS):
+        self.boundaries = tuple(boundaries)
+        # One more bucket than boundaries, for values above the last one
+        self.bucket_counts = [0] * (len(self.boundaries) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.boundaries, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (inf past the last)."""
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.boundaries[i] if i < len(self.boundaries) else float("inf")
+        return 0.0
+
+
+@dataclass(slots=True)
+class RequestRecord:
+    method: str
+    route: str
+    status_code: int
+    duration_seconds: float
+    dynamodb_calls: int
+    consumed_capacity: float
+    items: int
+
+
+@dataclass(slots=True)
+class DynamoDBCallRecord:
+    operation: str
+    table: str
+    duration_seconds: float
+    consumed_capacity: float
+    items: int
+    error: bool
+
+
+class InMemoryExporter:
+    """
+    Keeps every record, and a latency histogram per endpoint, in memory.
+    Unbounded: meant for tests and benchmarks.
+    """
+
+    def __init__(self):
+        self.requests: list[RequestRecord] = []
+        self.dynamodb_calls: list[DynamoDBCallRecord] = []
+        # (method, route) -> request latency
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def record_request(
+        self,
+        method: str,
+        route: str,
+        status_code: int,
+        duration_seconds: float,
+        stats: RequestStats,
+    ) -> None:
+        with self._lock:
+            self.requests.append(
+                RequestRecord(
+                    method,
+                    route,
+                    status_code,
+                    duration_seconds,
+                    stats.dynamodb_calls,
+                    stats.consumed_capacity,
+                    stats.items,
+                )
+            )
+            histogram = self.latency.get((method, route))
+            if histogram is None:
+                histogram = self.latency[(method, route)] = Histogram()
+            histogram.record(duration_seconds)
+
+    def record_dynamodb_call(
+        self,
+        operation: str,
+        table: str,
+        duration_seconds: float,
+        consumed_capacity: float,
+        items: int,
+        error: bool,
+    ) -> None:
+        with self._lock:
+            self.dynamodb_calls.append(
+                DynamoDBCallRecord(
+                    operation, table, duration_seconds, consumed_capacity, items, error
+                )
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.dynamodb_calls.clear()
+            self.latency.clear()
+
+
+class EmbeddedMetricsExporter:
+    """
+    Writes CloudWatch Embedded Metric Format lines. Each line is one JSON
+    object: the metric values, their dimensions, and an "_aws" section naming
+    which of its fields are metrics. The other fields, like the status code, are
+    kept in the logs for queries without becoming metrics.
+    """
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE, stream=None):
+        self.namespace = namespace
+        self._stream = sys.stdout if stream is None else stream
+        self._lock = threading.Lock()
+
+    def record_request(
+        self,
+        method: str,
+        route: str,
+        status_code: int,
+        duration_seconds: float,
+        stats: RequestStats,
+    ) -> None:
+        self._write(
+            {"Method": method, "Route": route},
+            {
+                "RequestDuration": (duration_seconds * 1000, "Milliseconds"),
+                "RequestDynamoDBCalls": (stats.dynamodb_calls, "Count"),
+                "RequestConsumedCapacity": (stats.consumed_capacity, "None"),
+            },
+            {"StatusCode": status_code},
+        )
+
+    def record_dynamodb_call(
+        self,
+        operation: str,
+        table: str,
+        duration_seconds: float,
+        consumed_capacity: float,
+        items: int,
+        error: bool,
+    ) -> None:
+        self._write(
+            {"Operation": operation, "Table": table},
+            {
+                "DynamoDBDuration": (duration_seconds * 1000, "Milliseconds"),
+                "DynamoDBConsumedCapacity": (consumed_capacity, "None"),
+                "DynamoDBItems": (items, "Count"),
+                "DynamoDBErrors": (int(error), "Count"),
+            },
+        )
+
+    def _write(
+        self,
+        dimensions: dict[str, str],
+        values: dict[str, tuple[float, str]],
+        properties: Optional[dict] = None,
+    ) -> None:
+        line = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [list(dimensions)],
+                        "Metrics": [
+                            {"Name": name, "Unit": unit}
+                            for name, (_, unit) in values.items()
+                        ],
+                    }
+                ],
+            },
+            **dimensions,
+            **{name: value for name, (value, _) in values.items()},
+            **(properties or {}),
+        }
+        # Written whole, not through logging: CloudWatch only reads lines that are
+        # nothing but the JSON object
+        with self._lock:
+            self._stream.write(json.dumps(line) + "\n")
+            self._stream.flush()
+
+
+class OpenTelemetryExporter:
+    """Records through the OpenTelemetry metrics API."""
+
+    def __init__(self):
+        from opentelemetry import metrics
+
+        meter = metrics.get_meter("meal-journal")
+        self._request_duration = meter.create_histogram(
+            "http.server.request.duration",
+            unit="s",
+            description="Duration of HTTP server requests",
+        )
+        self._request_dynamodb_calls = meter.create_histogram(
+            "mbd.request.dynamodb.calls",
+            unit="{call}",
+            description="DynamoDB calls made by one request",
+        )
+        self._request_consumed_capacity = meter.create_histogram(
+            "mbd.request.dynamodb.consumed_capacity",
+            unit="{capacity_unit}",
+            description="DynamoDB capacity units consumed by one request",
+        )
+        self._operation_duration = meter.create_histogram(
+            "db.client.operation.duration",
+            unit="s",
+            description="Duration of DynamoDB calls",
+        )
+        self._consumed_capacity = meter.create_counter(
+            "mbd.dynamodb.consumed_capacity",
+            unit="{capacity_unit}",
+            description="DynamoDB capacity units consumed",
+        )
+        self._items = meter.create_counter(
+            "mbd.dynamodb.items",
+            unit="{item}",
+            description="Items read or written by DynamoDB calls",
+        )
+
+    def record_request(
+        self,
+        method: str,
+        route: str,
+        status_code: int,
+        duration_seconds: float,
+        stats: RequestStats,
+    ) -> None:
+        attributes = {
+            "http.request.method": method,
+            "http.route": route,
+            "http.response.status_code": status_code,
+        }
+        self._request_duration.record(duration_seconds, attributes)
+        self._request_dynamodb_calls.record(stats.dynamodb_calls, attributes)
+        self._request_consumed_capacity.record(stats.consumed_capacity, attributes)
+
+    def record_dynamodb_call(
+        self,
+        operation: str,
+        table: str,
+        duration_seconds: float,
+        consumed_capacity: float,
+        items: int,
+        error: bool,
+    ) -> None:
+        attributes = {
+            "db.system": "aws.dynamodb",
+            "db.operation.name": operation,
+            "aws.dynamodb.table_names": table,
+        }
+        if error:
+            attributes["error.type"] = "ClientError"
+        self._operation_duration.record(duration_seconds, attributes)
+        self._consumed_capacity.add(consumed_capacity, attributes)
+        self._items.add(items, attributes)
+
+
+@functools.cache
+def get_exporter() -> Optional[MetricsExporter]:
+    exporter = os.getenv("METRICS_EXPORTER", "emf")
+    if exporter == "emf":
+        return EmbeddedMetricsExporter()
+    if exporter == "memory":
+        return InMemoryExporter()
+    if exporter == "otel":
+        try:
+            return OpenTelemetryExporter()
+        except ImportError:
+            logger.warning(
+                "METRICS_EXPORTER=otel needs the `opentelemetry-api` package; "
+                "metrics are disabled"
+            )
+            return None
+    if exporter != "none":
+        raise ValueError(f"Unknown METRICS_EXPORTER: {exporter}")
+    return None
+
+
+def record_dynamodb_call(
+    operation: str,
+    operation_kwargs: dict,
+    data: Optional[dict],
+    duration_seconds: float,
+) -> None:
+    """
+    Reports one DynamoDB call, and adds it to the current request's stats.
+    `data` is the response, or None if the call failed.
+    """
+    exporter = get_exporter()
+    if exporter is None:
+        return
+
+    consumed_capacity = _consumed_capacity(data)
+    items = _item_count(operation, operation_kwargs, data)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add_call(consumed_capacity, items)
+
+    exporter.record_dynamodb_call(
+        operation,
+        _table_names(operation_kwargs),
+        duration_seconds,
+        consumed_capacity,
+        items,
+        data is None,
+    )
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each request, with its DynamoDB usage."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        exporter = get_exporter()
+        if scope["type"] != "http" or exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            _request_stats.reset(token)
+            # The router leaves the matched route in the scope. Route templates,
+            # unlike paths, don't grow a new series per user or food.
+            route = scope.get("route")
+            exporter.record_request(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status_code,
+                duration,
+                stats,
+            )
+
+
+def _consumed_capacity(data: Optional[dict]) -> float:
+    capacity = (data or {}).get("ConsumedCapacity")
+    if capacity is None:
+        return 0.0
+    # A dict for single-table operations, a list per table for batches and
+    # transactions
+    if isinstance(capacity, dict):
+        capacity = [capacity]
+    return float(sum(table.get("CapacityUnits", 0) for table in capacity))
+
+
+def _item_count(operation: str, operation_kwargs: dict, data: Optional[dict]) -> int:
+    if data is None:
+        return 0
+    if operation in ("Query", "Scan"):
+        return data.get("Count", 0)
+    if operation == "GetItem":
+        return 1 if "Item" in data else 0
+    if operation in ("PutItem", "UpdateItem", "DeleteItem"):
+        return 1
+    if operation == "BatchGetItem":
+        return sum(len(items) for items in data.get("Responses", {}).values())
+    if operation == "BatchWriteItem":
+        requested = sum(
+            len(requests) for requests in operation_kwargs["RequestItems"].values()
+        )
+        unprocessed = sum(
+            len(requests) for requests in data.get("UnprocessedItems", {}).values()
+        )
+        return requested - unprocessed
+    if operation in ("TransactWriteItems", "TransactGetItems"):
+        return len(operation_kwargs["TransactItems"])
+    return 0
+
+
+def _table_names(operation_kwargs: dict) -> str:
+    if "TableName" in operation_kwargs:
+        return operation_kwargs["TableName"]
+    if "RequestItems" in operation_kwargs:
+        return ",".join(sorted(operation_kwargs["RequestItems"]))
+    if "TransactItems" in operation_kwargs:
+        return ",".join(
+            sorted(
+                {
+                    action["TableName"]
+                    for item in operation_kwargs["TransactItems"]
+                    for action in item.values()
+                }
+            )
+        )
+    return ""
@@ -0,0 +1,27 @@
+"""
+Newline-delimited JSON (one JSON value per line), for bodies too large to parse
+or build in one piece.
+"""
+
+import json
+from typing import AsyncIterable, AsyncIterator
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def iter_ndjson_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into its non-blank lines, as they arrive."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+def decode_ndjson_line(line: bytes) -> object:
+    """Parse one line. Raises ValueError if it is not valid JSON."""
+    return json.loads(line)
@@ -0,0 +1,114 @@
+"""
+Cursor-based paging over a user's partition, newest first.
+
+The cursor handed to clients is DynamoDB's `LastEvaluatedKey`, serialized as
+base64url JSON. It is opaque to clients and is checked against the caller's
+user ID before being used as an `ExclusiveStartKey`.
+"""
+
+import base64
+import binascii
+import json
+from typing import TYPE_CHECKING, Iterable, Optional, Type, TypeVar
+
+from shared.auth import decode_base64_url
+from shared.exceptions import MbdException
+
+if TYPE_CHECKING:
+    # Only needed for annotations; main.py imports this module at cold start
+    from pynamodb.attributes import Attribute
+    from pynamodb.expressions.condition import Condition
+    from pynamodb.indexes import Index
+
+    from shared.dynamodb import MbdModel
+
+# Response header carrying the cursor for the next page. Absent on the last page.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 100
+
+M = TypeVar("M", bound="MbdModel")
+
+
+def query_page(
+    model: Type[M],
+    user_id: str,
+    range_key_condition: Optional["Condition"],
+    limit: int,
+    cursor: Optional[str] = None,
+    filter_condition: Optional["Condition"] = None,
+    attributes: Optional[Iterable["Attribute"]] = None,
+    index: Optional["Index"] = None,
+) -> tuple[list[M], Optional[str]]:
+    """
+    Read one page of a user's items, newest first.
+
+    Args:
+        model: The model to query; its hash key must be the user ID
+        user_id: The user ID
+        range_key_condition: Optional condition on the range key
+        limit: Maximum number of items to return
+        cursor: Cursor returned with the previous page, if any
+        filter_condition: Optional condition applied by DynamoDB. `limit`
+            counts the items read before filtering, so a page may come back
+            short (or empty) with a cursor for the next one
+        attributes: The attributes to read, if not all of them
+        index: An index of the model to query instead of its table. Its hash
+            key must be the user ID too
+
+    Returns:
+        The items on this page and the cursor for the next one (None if this
+        is the last page)
+    """
+    results = model.query_projected(
+        hash_key=user_id,
+        range_key_condition=range_key_condition,
+        filter_condition=filter_condition,
+        attributes=attributes,
+        index=index,
+        scan_index_forward=False,
+        limit=limit,
+        last_evaluated_key=(
+            decode_cursor(cursor, user_id, _key_names(model, index)) if cursor else None
+        ),
+    )
+    items = list(results)
+
+    return items, encode_cursor(results.last_evaluated_key)
+
+
+def encode_cursor(last_evaluated_key: Optional[dict]) -> Optional[str]:
+    if not last_evaluated_key:
+        return None
+
+    data = json.dumps(last_evaluated_key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, user_id: str, key_names: Optional[set[str]] = None
+) -> dict:
+    try:
+        key = json.loads(decode_base64_url(cursor).decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        key = None
+
+    # A cursor is only valid within the caller's own partition, and for the
+    # table or index it came from
+    if (
+        not isinstance(key, dict)
+        or key.get("user_id") != {"S": user_id}
+        or (key_names is not None and set(key) != key_names)
+    ):
+        raise MbdException(status_code=400, errors=["Invalid cursor"])
+
+    return key
+
+
+def _key_names(model: Type["MbdModel"], index: Optional["Index"]) -> set[str]:
+    """Attributes of the LastEvaluatedKey of a query on the table or index."""
+    names = {model._hash_key_attribute().attr_name}
+    if model._range_key_attribute() is not None:
+        names.add(model._range_key_attribute().attr_name)
+    if index is not None:
+        names.update(attr.attr_name for attr in index.Meta.attributes.values())
+    return names
@@ -0,0 +1,46 @@
+"""
+Fast JSON responses for endpoints returning large lists of DTOs.
+
+When an endpoint returns plain dicts, FastAPI validates them against the
+return annotation and copies them through `jsonable_encoder` before they are
+serialized. DTOs built by `to_dto()` are already JSON-ready, so endpoints that
+return a `FastJSONResponse` skip both steps and the content is serialized
+exactly once, with orjson when it is installed and the standard `json` module
+otherwise.
+
+Headers set on an endpoint's `response: Response` parameter are not copied to
+a response the endpoint returns itself; pass them in with `headers=`.
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, as JSONResponse renders it."""
+    if orjson is not None:
+        return orjson.dumps(content)
+
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for content that is already JSON-ready. Content serialized
+    beforehand with `dumps`, e.g. to hash it for an ETag, is sent as is.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+
+        return dumps(content)
@@ -0,0 +1,72 @@
+"""
+Async data access for symptom entries.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from aggregates.aggregates import apply_deltas, symptoms_entry_deltas
+from dto.symptoms_create import SymptomsCreate
+from shared.executor import run_blocking
+from shared.pagination import query_page
+from symptoms.symptoms import MbdSymptomsEntry
+
+
+async def save_symptoms_entry(user_id: str, request: SymptomsCreate) -> MbdSymptomsEntry:
+    symptom_entry = MbdSymptomsEntry(
+        user_id=user_id,
+        date_time=request.date_time,
+        symptoms=request.symptoms,
+    )
+    await run_blocking(_save_symptoms_entry, symptom_entry)
+
+    return symptom_entry
+
+
+async def get_symptoms_entries_between(
+    user_id: str, start: datetime, end: datetime
+) -> list[MbdSymptomsEntry]:
+    return await run_blocking(_query_symptoms_entries_between, user_id, start, end)
+
+
+async def get_symptoms_entry_page(
+    user_id: str,
+    start: Optional[datetime],
+    end: datetime,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> tuple[list[MbdSymptomsEntry], Optional[str]]:
+    if start is None:
+        range_key_condition = MbdSymptomsEntry.date_time <= end
+    else:
+        range_key_condition = MbdSymptomsEntry.date_time.between(start, end)
+
+    return await run_blocking(
+        query_page,
+        MbdSymptomsEntry,
+        user_id,
+        range_key_condition,
+        limit,
+        cursor,
+        attributes=MbdSymptomsEntry.DTO_ATTRIBUTES,
+    )
+
+
+def _save_symptoms_entry(symptom_entry: MbdSymptomsEntry) -> None:
+    previous = symptom_entry.save_replacing()
+
+    deltas = symptoms_entry_deltas([symptom_entry])
+    if previous is not None:
+        symptoms_entry_deltas([previous], sign=-1, deltas=deltas)
+    apply_deltas(symptom_entry.user_id, deltas)
+
+
+def _query_symptoms_entries_between(
+    user_id: str, start: datetime, end: datetime
+) -> list[MbdSymptomsEntry]:
+    return list(
+        MbdSymptomsEntry.query(
+            hash_key=user_id,
+            range_key_condition=MbdSymptomsEntry.date_time.between(start, end),
+        )
+    )
@@ -1,7 +1,5 @@
 import os
 import logging
-from dotenv import load_dotenv
-from pynamodb.models import Model
 from pynamodb.attributes import (
     UnicodeAttribute,
     UTCDateTimeAttribute,
@@ -9,21 +7,17 @@ from pynamodb.attributes import (
     MapAttribute,
 )
 
-logger = logging.getLogger("uvicorn.error")
-logger.setLevel(logging.INFO)
+from shared.config import bootstrap
+from shared.dynamodb import MbdModel
 
-ENV = os.getenv("ENVIRONMENT")
+logger = logging.getLogger("uvicorn.error")
 
-if ENV is not None:
-    logger.info("Loading environment: %s", ENV)
-    load_dotenv(f".env.{ENV}")
-else:
-    logger.warning("Hmm... no ENV value set")
+bootstrap()
 
 logger.info(f"{os.getenv('SYMPTOMS_DB_NAME')=}")
 
 
-class MbdSymptomsEntry(Model):
+class MbdSymptomsEntry(MbdModel):
     class Meta:
         table_name = os.getenv("SYMPTOMS_DB_NAME")
         region = "us-west-2"
@@ -32,8 +26,13 @@ class MbdSymptomsEntry(Model):
     date_time = UTCDateTimeAttribute(range_key=True)
     symptoms = ListAttribute(of=UnicodeAttribute, default=lambda: [])
 
+    # See MbdMeal.DTO_ATTRIBUTES
+    DTO_ATTRIBUTES = (date_time, symptoms)
+
     def to_dto(self) -> dict:
+        # See MbdMeal.to_dto
+        values = self.attribute_values
         return {
-            "date_time": self.date_time.isoformat(),
-            "symptoms": self.symptoms,
+            "date_time": values["date_time"].isoformat(),
+            "symptoms": values.get("symptoms"),
         }
@@ -0,0 +1,189 @@
+"""
+Per-request cost of verifying Cognito tokens.
+
+Serves a JWKS from a local HTTP server standing in for the user pool, signs
+--tokens tokens with a freshly generated 2048-bit RSA key, and times:
+
+- "first call": a new verifier's first token, which fetches the JWKS
+- "signature": verifying a token the verifier hasn't seen, with the keys cached
+- "cached": a token that was verified before, i.e. every request after a
+  client's first, on the event loop through the `current_user_id` dependency
+
+Run from backend/:
+    PYTHONPATH=app uv run python benchmarks/auth.py [--tokens 200] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from shared import auth
+
+ISSUER = "https://cognito-idp.us-west-2.amazonaws.com/us-west-2_bench"
+KID = "bench-key"
+
+
+def is_probable_prime(n: int, rounds: int = 40) -> bool:
+    if n < 4:
+        return n in (2, 3)
+    for p in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+        if n % p == 0:
+            return n == p
+
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for _ in range(rounds):
+        x = pow(random.randrange(2, n - 1), d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def generate_key(bits: int = 2048, e: int = 65537) -> tuple[int, int, int]:
+    """(n, e, d) of a new RSA key. Good enough for a benchmark, not for real use."""
+    while True:
+        primes = []
+        while len(primes) < 2:
+            candidate = random.getrandbits(bits // 2) | (3 << (bits // 2 - 2)) | 1
+            if is_probable_prime(candidate):
+                primes.append(candidate)
+        p, q = primes
+        phi = (p - 1) * (q - 1)
+        if p != q and phi % e != 0:
+            return p * q, e, pow(e, -1, phi)
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def sign(claims: dict, n: int, d: int) -> str:
+    key_length = (n.bit_length() + 7) // 8
+    header = b64url(json.dumps({"alg": "RS256", "kid": KID}).encode())
+    payload = b64url(json.dumps(claims).encode())
+    digest_info = (
+        auth.SHA256_DIGEST_INFO
+        + hashlib.sha256(f"{header}.{payload}".encode()).digest()
+    )
+    encoded = (
+        b"\x00\x01"
+        + b"\xff" * (key_length - len(digest_info) - 3)
+        + b"\x00"
+        + digest_info
+    )
+    signature = pow(int.from_bytes(encoded, "big"), d, n)
+    return f"{header}.{payload}.{b64url(signature.to_bytes(key_length, 'big'))}"
+
+
+def serve_jwks(n: int, e: int) -> ThreadingHTTPServer:
+    body = json.dumps(
+        {
+            "keys": [
+                {
+                    "kty": "RSA",
+                    "kid": KID,
+                    "alg": "RS256",
+                    "use": "sig",
+                    "n": b64url(n.to_bytes((n.bit_length() + 7) // 8, "big")),
+                    "e": b64url(e.to_bytes(3, "big")),
+                }
+            ]
+        }
+    ).encode()
+
+    class JwksHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), JwksHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def new_verifier(jwks_url: str) -> auth.TokenVerifier:
+    return auth.TokenVerifier(issuer=ISSUER, jwks_url=jwks_url, client_id="bench")
+
+
+def per_call_us(timings: list[float]) -> str:
+    p99 = statistics.quantiles(timings, n=100)[98]
+    return f"median {statistics.median(timings) * 1e6:8.1f} us, p99 {p99 * 1e6:8.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    n, e, d = generate_key()
+    server = serve_jwks(n, e)
+    jwks_url = f"http://127.0.0.1:{server.server_port}/.well-known/jwks.json"
+
+    exp = time.time() + 3600
+    tokens = [
+        sign(
+            {"sub": f"user-{i}", "iss": ISSUER, "aud": "bench", "token_use": "id", "exp": exp},
+            n,
+            d,
+        )
+        for i in range(args.tokens)
+    ]
+
+    first_call = []
+    for _ in range(args.repeat):
+        verifier = new_verifier(jwks_url)
+        start = time.perf_counter()
+        verifier.verify(tokens[0])
+        first_call.append(time.perf_counter() - start)
+
+    verifier = new_verifier(jwks_url)
+    verifier.verify(tokens[0])
+    signature = []
+    for token in tokens[1:]:
+        start = time.perf_counter()
+        verifier.verify(token)
+        signature.append(time.perf_counter() - start)
+
+    async def cached_requests() -> list[float]:
+        timings = []
+        for _ in range(args.repeat):
+            for token in tokens:
+                start = time.perf_counter()
+                await auth.current_user_id(f"Bearer {token}")
+                timings.append(time.perf_counter() - start)
+        return timings
+
+    with patch.object(auth, "get_verifier", return_value=verifier):
+        cached = asyncio.run(cached_requests())
+
+    server.shutdown()
+
+    print(f"first call: {per_call_us(first_call)}")
+    print(f" signature: {per_call_us(signature)}")
+    print(f"    cached: {per_call_us(cached)}")
+
+
+if __name__ == "__main__":
+    main()
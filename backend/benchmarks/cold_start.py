@@ -0,0 +1,93 @@
+"""
+Cold-start cost of the Lambda entry point (`main.handler`).
+
+Each run starts a fresh interpreter in app/ and imports `main`, which is what
+the Lambda runtime does before the first invocation. Reports:
+
+- wall-clock time until `main.handler` is ready (median of --runs)
+- the same, when the lazily imported repositories are also loaded up front,
+  i.e. the import cost deferred to the first request that needs them
+- a `python -X importtime` breakdown of the slowest top-level packages
+
+Run from backend/:
+    uv run python benchmarks/cold_start.py [--runs 10] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+IMPORT_HANDLER = "import main; main.handler"
+IMPORT_EVERYTHING = (
+    IMPORT_HANDLER
+    + "; import foods.repository, meals.repository, symptoms.repository,"
+    + " preferences.repository"
+)
+TIMED = "import time; start = time.perf_counter(); {}; print(time.perf_counter() - start)"
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(APP_DIR),
+        "CORS_ALLOWED_ORIGINS": os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:3000"),
+    }
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=APP_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def median_import_ms(statement: str, runs: int) -> float:
+    timings = [
+        float(run_python("-c", TIMED.format(statement)).stdout.strip()) * 1000
+        for _ in range(runs)
+    ]
+    return statistics.median(timings)
+
+
+def importtime_by_package(statement: str) -> dict[str, int]:
+    """Self time in microseconds, summed per top-level package."""
+    stderr = run_python("-X", "importtime", "-c", statement).stderr
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    # Warm the bytecode cache so the first run isn't an outlier
+    run_python("-c", IMPORT_EVERYTHING)
+
+    handler_ms = median_import_ms(IMPORT_HANDLER, args.runs)
+    everything_ms = median_import_ms(IMPORT_EVERYTHING, args.runs)
+    print(f"handler ready:           {handler_ms:8.1f} ms (median of {args.runs})")
+    print(f"with repositories eager: {everything_ms:8.1f} ms")
+    print(f"deferred to first use:   {everything_ms - handler_ms:8.1f} ms")
+
+    print("\nslowest packages at cold start (-X importtime, self time):")
+    totals = importtime_by_package(IMPORT_HANDLER)
+    for name, self_us in sorted(totals.items(), key=lambda t: -t[1])[: args.top]:
+        print(f"  {name:<24} {self_us / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
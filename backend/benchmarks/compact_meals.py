@@ -0,0 +1,128 @@
+"""
+Memory and CPU of CompactMeals against MbdMeal models for long meal histories.
+
+Builds --meals-per-day meals a day of 1-4 foods drawn from --foods foods, over
+each of --months, as the wire-format items a Query returns. Then, for each
+representation:
+
+- "models": `MbdMeal.from_raw_data` per item, what `MbdMeal.query` yields
+- "compact": `CompactMeals.decode` over the same items
+
+reports the memory the decoded history holds (measured with tracemalloc), the
+time to decode it, and the time to decode it and score food-symptom
+correlations over it, as GET /insights/correlations does.
+
+Run from backend/:
+    PYTHONPATH=app uv run python benchmarks/compact_meals.py [--months 3 12 60] [--foods 300]
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from foods.food import MbdFood
+from insights.correlations import compute_correlations
+from meals.compact import CompactMeals
+from meals.meal import MbdMeal
+from symptoms.symptoms import MbdSymptomsEntry
+
+
+def build_items(months: int, foods: int, meals_per_day: int, seed=1):
+    rng = random.Random(seed)
+    catalog = [
+        MbdFood(food_id=str(uuid4()), name=f"Food {i}", thumbnail="🍎")
+        for i in range(foods)
+    ]
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    items = []
+    symptoms_entries = []
+    for day in range(months * 30):
+        for meal_number in range(meals_per_day):
+            meal = MbdMeal(
+                user_id="bench-user",
+                meal_type=("Breakfast", "Lunch", "Dinner", "Snack")[meal_number % 4],
+                date_time=start
+                + timedelta(days=day, hours=7 + meal_number * 4, minutes=rng.randrange(60)),
+                # Favour a few staples, as real diaries do
+                foods=rng.sample(catalog[: foods // 10], 1)
+                + rng.sample(catalog, rng.randrange(0, 4)),
+            )
+            items.append(meal.serialize())
+        if rng.random() < 0.7:
+            symptoms_entries.append(
+                MbdSymptomsEntry(
+                    user_id="bench-user",
+                    date_time=start + timedelta(days=day, hours=rng.randrange(24)),
+                    symptoms=[f"Symptom {rng.randrange(15)}"],
+                )
+            )
+
+    return items, symptoms_entries
+
+
+def decode_models(items):
+    return [MbdMeal.from_raw_data(item) for item in items]
+
+
+def decode_compact(items):
+    return CompactMeals.decode(items)
+
+
+def retained_mb(decode, items) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        meals = decode(items)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del meals
+    return (after - before) / 1e6
+
+
+def best_of_ms(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--months", type=int, nargs="+", default=[3, 12, 60])
+    parser.add_argument("--foods", type=int, default=300)
+    parser.add_argument("--meals-per-day", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'months':>6} {'meals':>7} {'':>8} {'memory':>10} {'decode':>10}"
+        f" {'+ correlations':>15}"
+    )
+    for months in args.months:
+        items, symptoms_entries = build_items(
+            months, args.foods, args.meals_per_day
+        )
+        for name, decode in (("models", decode_models), ("compact", decode_compact)):
+            memory = retained_mb(decode, items)
+            decode_ms = best_of_ms(args.repeat, decode, items)
+            total_ms = best_of_ms(
+                args.repeat,
+                lambda: compute_correlations(decode(items), symptoms_entries),
+            )
+            print(
+                f"{months:>6} {len(items):>7} {name:>8} {memory:7.1f} MB"
+                f" {decode_ms:7.1f} ms {total_ms:12.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Bytes on the wire and compression CPU for foods, history and export responses.
+
+Builds the bodies the app sends (GET /foods for a catalog of --foods foods,
+GET /meals/history for --meals meals of three foods, and GET /export as NDJSON
+in 64 KiB streamed chunks) and compresses each with the compressors behind
+CompressionMiddleware, for every encoding and level in --gzip-levels and
+--brotli-qualities (Brotli only with the `brotli` package installed).
+
+Reports the uncompressed and compressed sizes, the ratio, and the CPU time per
+response (best of --repeat). Streamed bodies are flushed after every chunk, as
+the middleware does, which costs a little ratio.
+
+Run from backend/:
+    PYTHONPATH=app uv run python benchmarks/compression.py [--foods 100 1000] [--meals 100 1000 10000]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from foods.food import MbdFood, MbdFoodList
+from journal.export import EXPORT_CHUNK_BYTES
+from meals.meal import MbdMeal
+from shared.compression import BrotliCompressor, GzipCompressor, brotli_available
+from shared.responses import dumps
+
+THUMBNAILS = "🍎🥝🥣🍌🥪🍪🫐🥑🍳🥗🍝🍣"
+
+
+def build_catalog(count: int, rng: random.Random) -> list[MbdFood]:
+    return [
+        MbdFood(
+            food_id=str(uuid4()),
+            name=f"Food {i}",
+            thumbnail=rng.choice(THUMBNAILS),
+        )
+        for i in range(count)
+    ]
+
+
+def foods_body(foods: int, rng: random.Random) -> list[bytes]:
+    food_list = MbdFoodList(user_id="bench-user", foods=build_catalog(foods, rng))
+    return [dumps(food_list.to_dto())]
+
+
+def build_meals(count: int, rng: random.Random) -> list[MbdMeal]:
+    catalog = build_catalog(200, rng)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return [
+        MbdMeal(
+            user_id="bench-user",
+            meal_type=rng.choice(("Breakfast", "Lunch", "Dinner", "Snack")),
+            date_time=start + timedelta(hours=6 * i, minutes=rng.randrange(60)),
+            foods=rng.sample(catalog, 3),
+        )
+        for i in range(count)
+    ]
+
+
+def history_body(meals: int, rng: random.Random) -> list[bytes]:
+    return [dumps([meal.to_dto() for meal in build_meals(meals, rng)])]
+
+
+def export_body(meals: int, rng: random.Random) -> list[bytes]:
+    lines = b"".join(
+        dumps({"type": "meal", **meal.to_dto()}) + b"\n"
+        for meal in build_meals(meals, rng)
+    )
+    return [
+        lines[i : i + EXPORT_CHUNK_BYTES]
+        for i in range(0, len(lines), EXPORT_CHUNK_BYTES)
+    ]
+
+
+def compress(factory, chunks: list[bytes]) -> bytes:
+    compressor = factory()
+    if len(chunks) == 1:
+        return compressor.compress(chunks[0]) + compressor.finish()
+
+    out = [compressor.compress(chunk) + compressor.flush() for chunk in chunks]
+    out.append(compressor.finish())
+    return b"".join(out)
+
+
+def best_of_ms(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--foods", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--meals", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--gzip-levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--brotli-qualities", type=int, nargs="+", default=[1, 4, 11])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    payloads = [(f"foods x{n}", foods_body(n, rng)) for n in args.foods]
+    payloads += [(f"history x{n}", history_body(n, rng)) for n in args.meals]
+    payloads += [(f"export x{n}", export_body(n, rng)) for n in args.meals]
+
+    compressors = [
+        (f"gzip-{level}", lambda level=level: GzipCompressor(level))
+        for level in args.gzip_levels
+    ]
+    if brotli_available():
+        compressors += [
+            (f"br-{quality}", lambda quality=quality: BrotliCompressor(quality))
+            for quality in args.brotli_qualities
+        ]
+    else:
+        print("brotli is not installed; gzip only\n")
+
+    print(
+        f"{'payload':<16} {'encoding':<9} {'bytes':>10} {'on wire':>10}"
+        f" {'ratio':>6} {'CPU':>9}"
+    )
+    for name, chunks in payloads:
+        size = sum(len(chunk) for chunk in chunks)
+        for encoding, factory in compressors:
+            compressed = compress(factory, chunks)
+            cpu_ms = best_of_ms(args.repeat, compress, factory, chunks)
+            print(
+                f"{name:<16} {encoding:<9} {size:>10} {len(compressed):>10}"
+                f" {size / len(compressed):>5.1f}x {cpu_ms:>6.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Concurrent-request throughput with a slow database.
+
+Fires batches of concurrent GET /preferences requests at two apps whose
+DynamoDB call is replaced by a fixed sleep:
+
+- "blocking": the pre-repository handler, which calls PynamoDB directly inside
+  an `async def` and stalls the event loop for the whole round trip.
+- "repository": the real app, which awaits the call on the database thread pool.
+
+Run from backend/:
+    PYTHONPATH=app uv run python benchmarks/concurrency.py [--requests 200] [--concurrency 50] [--latency-ms 20]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Annotated
+from unittest.mock import patch
+
+os.environ.setdefault("CORS_ALLOWED_ORIGINS", "http://localhost:3000")
+# Metrics lines would be mixed into the results
+os.environ.setdefault("METRICS_EXPORTER", "none")
+
+import httpx
+from fastapi import Depends, FastAPI
+
+import main as api
+from preferences.preferences import MbdPreferences
+
+
+def build_blocking_app() -> FastAPI:
+    blocking_app = FastAPI()
+
+    @blocking_app.get("/preferences")
+    async def get_preferences(
+        user_id: Annotated[str, Depends(api.current_user_id)],
+    ) -> dict:
+        try:
+            prefs = MbdPreferences.get(user_id)
+        except MbdPreferences.DoesNotExist:
+            prefs = MbdPreferences(user_id=user_id)
+        return prefs.to_dto()
+
+    return blocking_app
+
+
+async def measure(app, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one_request():
+            async with semaphore:
+                response = await client.get(
+                    "/preferences", headers={"Authorization": "Bearer bench"}
+                )
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one_request() for _ in range(requests)])
+        return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    def slow_get(user_id):
+        time.sleep(args.latency_ms / 1000)
+        raise MbdPreferences.DoesNotExist()
+
+    blocking_app = build_blocking_app()
+    for app in (blocking_app, api.app):
+        app.dependency_overrides[api.current_user_id] = lambda: "bench-user"
+
+    with patch.object(MbdPreferences, "get", side_effect=slow_get):
+        for name, app in (("blocking", blocking_app), ("repository", api.app)):
+            throughput = asyncio.run(measure(app, args.requests, args.concurrency))
+            print(f"{name:>10}: {throughput:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
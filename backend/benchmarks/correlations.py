@@ -0,0 +1,158 @@
+"""
+Food-symptom correlations over synthetic histories: a per-meal loop vs. the
+bitset implementation behind GET /insights/correlations.
+
+Each synthetic user logs `--meals-per-day` meals of 1-4 foods drawn from
+`--foods` foods, and a symptom entry on most days, for `--years` years. Both
+implementations score the default lag windows and must agree.
+
+- "loop": for every meal, find the symptom entries within each window (by
+  bisection) and count food/symptom pairs
+- "bitset": insights.correlations.compute_correlations
+
+Run from backend/:
+    PYTHONPATH=app uv run python benchmarks/correlations.py [--years 1 5] [--foods 300] [--symptoms 15]
+"""
+
+import argparse
+import bisect
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from foods.food import MbdFood
+from insights.correlations import (
+    BUCKET_SECONDS,
+    DEFAULT_MIN_OCCURRENCES,
+    DEFAULT_WINDOWS,
+    compute_correlations,
+)
+from meals.meal import MbdMeal
+from symptoms.symptoms import MbdSymptomsEntry
+
+# The endpoint's latency budget for a five-year history
+BUDGET_MS = 200
+
+
+def build_history(years: int, foods: int, symptoms: int, meals_per_day: int, seed=1):
+    rng = random.Random(seed)
+    catalog = [
+        MbdFood(food_id=str(uuid4()), name=f"Food {i}", thumbnail="🍎")
+        for i in range(foods)
+    ]
+    symptom_names = [f"Symptom {i}" for i in range(symptoms)]
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    meals = []
+    symptoms_entries = []
+    for day in range(years * 365):
+        for meal_number in range(meals_per_day):
+            meals.append(
+                MbdMeal(
+                    user_id="bench-user",
+                    meal_type="Lunch",
+                    date_time=start
+                    + timedelta(days=day, hours=7 + meal_number * 4, minutes=rng.randrange(60)),
+                    # Favour a few staples, as real diaries do
+                    foods=rng.sample(catalog[: foods // 10], 1)
+                    + rng.sample(catalog, rng.randrange(0, 4)),
+                )
+            )
+        if rng.random() < 0.7:
+            symptoms_entries.append(
+                MbdSymptomsEntry(
+                    user_id="bench-user",
+                    date_time=start + timedelta(days=day, hours=rng.randrange(24)),
+                    symptoms=rng.sample(symptom_names, rng.randrange(1, 3)),
+                )
+            )
+
+    return meals, symptoms_entries
+
+
+def loop_correlations(meals, symptoms_entries, windows, min_occurrences):
+    origin = min(item.date_time for item in (*meals, *symptoms_entries))
+
+    def bucket(date_time):
+        return int((date_time - origin).total_seconds()) // BUCKET_SECONDS
+
+    symptom_buckets = sorted(
+        (bucket(entry.date_time), symptom)
+        for entry in symptoms_entries
+        for symptom in entry.symptoms
+    )
+    bucket_keys = [b for b, _ in symptom_buckets]
+
+    # Hours in which each food, and any meal, was eaten
+    meal_hours = {bucket(meal.date_time) for meal in meals}
+    food_hours = {}
+    for meal in meals:
+        for food in meal.foods:
+            food_hours.setdefault(food.food_id, set()).add(bucket(meal.date_time))
+
+    results = []
+    for min_lag, max_lag in windows:
+        followed = {}
+        for hour in meal_hours:
+            lo = bisect.bisect_left(bucket_keys, hour + min_lag)
+            hi = bisect.bisect_left(bucket_keys, hour + max_lag)
+            followed[hour] = {symptom for _, symptom in symptom_buckets[lo:hi]}
+
+        baseline = Counter(s for symptoms in followed.values() for s in symptoms)
+        for food_id, hours in food_hours.items():
+            if len(hours) < min_occurrences:
+                continue
+            pairs = Counter(s for hour in hours for s in followed[hour])
+            for symptom, count in pairs.items():
+                confidence = count / len(hours)
+                lift = confidence / (baseline[symptom] / len(meal_hours))
+                results.append((food_id, symptom, min_lag, count, round(lift, 6)))
+
+    return sorted(results)
+
+
+def bitset_correlations(meals, symptoms_entries, windows, min_occurrences):
+    return sorted(
+        (c.food_id, c.symptom, c.min_lag_hours, c.co_occurrences, round(c.lift, 6))
+        for c in compute_correlations(meals, symptoms_entries, windows, min_occurrences)
+    )
+
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--foods", type=int, default=300)
+    parser.add_argument("--symptoms", type=int, default=15)
+    parser.add_argument("--meals-per-day", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for years in args.years:
+        meals, symptoms_entries = build_history(
+            years, args.foods, args.symptoms, args.meals_per_day
+        )
+        params = (meals, symptoms_entries, DEFAULT_WINDOWS, DEFAULT_MIN_OCCURRENCES)
+        assert loop_correlations(*params) == bitset_correlations(*params)
+
+        loop_ms = best_of(args.repeat, loop_correlations, *params)
+        bitset_ms = best_of(args.repeat, bitset_correlations, *params)
+        print(
+            f"{years} years ({len(meals)} meals, {len(symptoms_entries)} symptom entries): "
+            f"loop {loop_ms:8.1f} ms, bitset {bitset_ms:8.1f} ms"
+            f" ({'within' if bitset_ms <= BUDGET_MS else 'over'} the {BUDGET_MS} ms budget)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Food catalog lookups: linear scans over MbdFoodList.foods vs. the FoodCatalog index.
+
+For catalogs of 1k to 10k foods, times the work POST /foods and GET /foods/{id}
+do once the user's food list has been loaded:
+
+- "scan": the case-insensitive name check, the filter that rebuilds the list,
+  and a `next(...)` search by ID
+- "index": building the FoodCatalog, then the same checks against its index
+
+Run from backend/:
+    PYTHONPATH=app uv run python benchmarks/food_catalog.py [--sizes 1000 2000 5000 10000]
+"""
+
+import argparse
+import timeit
+from uuid import uuid4
+
+from foods.catalog import FoodCatalog
+from foods.food import MbdFood, MbdFoodList
+
+
+def build_food_list(size: int) -> MbdFoodList:
+    return MbdFoodList(
+        user_id="bench-user",
+        foods=[
+            MbdFood(food_id=str(uuid4()), name=f"Food {i}", thumbnail="🍎")
+            for i in range(size)
+        ],
+    )
+
+
+def scan(food_list: MbdFoodList, new_food: MbdFood, lookup_id: str):
+    any(f.name.lower() == new_food.name.lower() for f in food_list.foods)
+    list(filter((lambda f: f.food_id != new_food.food_id), food_list.foods))
+    next((f for f in food_list.foods if f.food_id == lookup_id), None)
+
+
+def index(catalog: FoodCatalog, new_food: MbdFood, lookup_id: str):
+    catalog.find_by_name(new_food.name)
+    catalog.get(new_food.food_id)
+    catalog.get(lookup_id)
+
+
+def best_of(stmt, number: int) -> float:
+    """Best per-call time in microseconds."""
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000]
+    )
+    args = parser.parse_args()
+
+    print(f"{'foods':>8} {'scan (us)':>12} {'build (us)':>12} {'index (us)':>12}")
+    for size in args.sizes:
+        food_list = build_food_list(size)
+        new_food = MbdFood(food_id=str(uuid4()), name="Not Yet Added", thumbnail="🥝")
+        # Worst case for the scan: the food being looked up is last
+        lookup_id = food_list.foods[-1].food_id
+        catalog = FoodCatalog(food_list)
+
+        scan_us = best_of(lambda: scan(food_list, new_food, lookup_id), 20)
+        build_us = best_of(lambda: FoodCatalog(food_list), 20)
+        index_us = best_of(lambda: index(catalog, new_food, lookup_id), 10000)
+        print(f"{size:>8} {scan_us:>12.1f} {build_us:>12.1f} {index_us:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Response serialization cost for meal history payloads of 1k-10k meals.
+
+Serves the same `to_dto()` list of meals, each with three foods, three ways:
+
+- "default": returned as plain dicts, so FastAPI validates them against the
+  `list[dict]` return annotation and runs them through `jsonable_encoder`
+  before serializing them with the `json` module
+- "fast/json": returned as a `FastJSONResponse`, serialized once with `json`
+  (what the app does when orjson isn't installed)
+- "fast/orjson": the same, serialized with orjson
+
+Times whole requests through the ASGI app, from building the DTOs to reading
+the body, with no database involved.
+
+Run from backend/:
+    PYTHONPATH=app uv run python benchmarks/json_response.py [--sizes 1000,5000,10000] [--requests 20]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+os.environ.setdefault("CORS_ALLOWED_ORIGINS", "http://localhost:3000")
+
+import httpx
+from fastapi import FastAPI
+
+from foods.food import MbdFood
+from meals.meal import MbdMeal
+from shared import responses
+from shared.responses import FastJSONResponse
+
+
+def build_meals(count: int) -> list[MbdMeal]:
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    foods = [
+        MbdFood(food_id=f"food-{i}", name=f"Food {i}", thumbnail="🥣")
+        for i in range(3)
+    ]
+    return [
+        MbdMeal(
+            user_id="bench-user",
+            date_time=start + timedelta(minutes=i),
+            meal_type="Lunch",
+            foods=foods,
+        )
+        for i in range(count)
+    ]
+
+
+def build_app(meals: list[MbdMeal]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default")
+    async def default() -> list[dict]:
+        return [meal.to_dto() for meal in meals]
+
+    @app.get("/fast")
+    async def fast() -> list[dict]:
+        return FastJSONResponse([meal.to_dto() for meal in meals])
+
+    return app
+
+
+async def median_request_ms(app: FastAPI, path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,5000,10000")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    if responses.orjson is None:
+        print("orjson is not installed; fast/orjson is skipped")
+
+    print(f"{'meals':>6} {'default':>10} {'fast/json':>10} {'fast/orjson':>12}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        app = build_app(build_meals(size))
+
+        default_ms = asyncio.run(median_request_ms(app, "/default", args.requests))
+        with patch.object(responses, "orjson", None):
+            fast_json_ms = asyncio.run(median_request_ms(app, "/fast", args.requests))
+        fast_orjson = (
+            f"{asyncio.run(median_request_ms(app, '/fast', args.requests)):9.1f} ms"
+            if responses.orjson is not None
+            else "-"
+        )
+
+        print(f"{size:>6} {default_ms:7.1f} ms {fast_json_ms:7.1f} ms {fast_orjson:>12}")
+
+
+if __name__ == "__main__":
+    main()
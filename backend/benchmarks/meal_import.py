@@ -0,0 +1,137 @@
+"""
+Meal import throughput: one POST /meals per meal vs. POST /meals/batch.
+
+Both paths run against a fake DynamoDB where every call takes a fixed round
+trip: the meal writes (PutItem or BatchWriteItem) and the UpdateItems that add
+the meals to the user's aggregates. The fake only knows the meals and aggregates
+tables, so a write to any other table fails the run. Single-meal requests are
+sent with the given client concurrency, as an importing client would.
+
+Reports meals/s and DynamoDB calls per meal, by operation.
+
+Run from backend/:
+    PYTHONPATH=app uv run python benchmarks/meal_import.py [--meals 2000] [--concurrency 10] [--latency-ms 20]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from uuid import uuid4
+
+os.environ.setdefault("CORS_ALLOWED_ORIGINS", "http://localhost:3000")
+os.environ.setdefault("MEALS_DB_NAME", "mbd_meals")
+os.environ.setdefault("USER_AGGREGATES_DB_NAME", "mbd_user_aggregates")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+# Metrics lines would be mixed into the results
+os.environ.setdefault("METRICS_EXPORTER", "none")
+
+import httpx
+from botocore.client import BaseClient
+from botocore.exceptions import ClientError
+
+import main as api
+
+HEADERS = {"Authorization": "Bearer bench"}
+# The tables an import writes to
+TABLES = {os.environ["MEALS_DB_NAME"], os.environ["USER_AGGREGATES_DB_NAME"]}
+
+
+def build_meals(count: int) -> list[dict]:
+    # Recent meals, three of 200 foods each, so every food count, last-eaten time
+    # and day aggregate gets updated
+    rng = random.Random(1)
+    foods = [
+        {"food_id": str(uuid4()), "name": f"Food {i}", "thumbnail": "🥣"}
+        for i in range(200)
+    ]
+    start = datetime.now(timezone.utc) - timedelta(days=20)
+    return [
+        {
+            "meal_type": rng.choice(("Breakfast", "Lunch", "Dinner", "Snack")),
+            "date_time": (start + timedelta(minutes=i)).isoformat(),
+            "foods": rng.sample(foods, 3),
+        }
+        for i in range(count)
+    ]
+
+
+async def import_one_by_one(meals: list[dict], concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=api.app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one_request(meal):
+            async with semaphore:
+                response = await client.post("/meals", headers=HEADERS, json=meal)
+                response.raise_for_status()
+
+        await asyncio.gather(*[one_request(meal) for meal in meals])
+
+
+async def import_batch(meals: list[dict]) -> None:
+    transport = httpx.ASGITransport(app=api.app)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        response = await client.post("/meals/batch", headers=HEADERS, json=meals)
+        response.raise_for_status()
+        assert response.json()["failed"] == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--meals", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    calls = Counter()
+    calls_lock = threading.Lock()
+
+    def slow_call(client, operation_name, operation_kwargs):
+        time.sleep(args.latency_ms / 1000)
+        with calls_lock:
+            calls[operation_name] += 1
+
+        tables = set(operation_kwargs.get("RequestItems", ())) or {
+            operation_kwargs.get("TableName")
+        }
+        if not tables <= TABLES:
+            raise ClientError(
+                {"Error": {"Code": "ResourceNotFoundException"}}, operation_name
+            )
+        if operation_name == "UpdateItem":
+            return {"Attributes": operation_kwargs["Key"]}
+        return {}
+
+    meals = build_meals(args.meals)
+
+    api.app.dependency_overrides[api.current_user_id] = lambda: "bench-user"
+
+    with patch.object(BaseClient, "_make_api_call", slow_call):
+        for name, run in (
+            ("one by one", lambda: import_one_by_one(meals, args.concurrency)),
+            ("batch", lambda: import_batch(meals)),
+        ):
+            calls.clear()
+            start = time.perf_counter()
+            asyncio.run(run())
+            throughput = args.meals / (time.perf_counter() - start)
+            per_meal = ", ".join(
+                f"{operation} {count / args.meals:.2f}"
+                for operation, count in sorted(calls.items())
+            )
+            print(f"{name:>10}: {throughput:8.1f} meals/s ({per_meal} calls/meal)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Per-request overhead of the correlation-ID middleware.
+
+Sends --requests sequential requests to a trivial endpoint of three apps:
+
+- "none": no middleware, the baseline
+- "http": the previous `@app.middleware("http")` implementation, which runs
+  on BaseHTTPMiddleware
+- "asgi": `CorrelationIdMiddleware`, the pure ASGI replacement
+
+and reports the median time per request and its overhead over the baseline,
+for a small JSON response and a streamed one of --chunks chunks.
+
+Run from backend/:
+    PYTHONPATH=app uv run python benchmarks/middleware.py [--requests 2000] [--chunks 100]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import traceback
+import uuid
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from shared.correlation import CorrelationIdMiddleware
+
+
+def add_http_middleware(app: FastAPI) -> None:
+    @app.middleware("http")
+    async def add_correlation_id(request: Request, call_next):
+        correlation_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
+        request.state.correlation_id = correlation_id
+
+        try:
+            response = await call_next(request)
+        except Exception:
+            response = JSONResponse(
+                {"detail": "An internal server error occurred."}, status_code=500
+            )
+            traceback.print_exc()
+
+        response.headers["X-Correlation-ID"] = correlation_id
+        return response
+
+
+def build_app(middleware: str, chunks: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/json")
+    async def json_endpoint() -> dict:
+        return {"hello": "world"}
+
+    @app.get("/stream")
+    async def stream_endpoint() -> StreamingResponse:
+        async def lines():
+            for i in range(chunks):
+                yield f"{i}\n"
+
+        return StreamingResponse(lines(), media_type="text/plain")
+
+    if middleware == "http":
+        add_http_middleware(app)
+    elif middleware == "asgi":
+        app.add_middleware(CorrelationIdMiddleware)
+
+    return app
+
+
+async def median_request_us(app: FastAPI, path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=100)
+    args = parser.parse_args()
+
+    for path in ("/json", "/stream"):
+        baseline = None
+        for middleware in ("none", "http", "asgi"):
+            app = build_app(middleware, args.chunks)
+            per_request = asyncio.run(median_request_us(app, path, args.requests))
+            baseline = per_request if baseline is None else baseline
+            print(
+                f"{path:>7} {middleware:>4}: {per_request:8.1f} us/request"
+                f" ({per_request - baseline:+7.1f} us)"
+            )
+
+
+if __name__ == "__main__":
+    main()
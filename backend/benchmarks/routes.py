@@ -0,0 +1,475 @@
+"""
+Throughput and p50/p95/p99 latency of every API route against a local DynamoDB.
+
+Starts a moto server standing in for DynamoDB, or uses --endpoint (e.g. DynamoDB
+Local on http://localhost:8000), creates the tables and seeds --users synthetic
+users with --days days of history each: three meals a day from a catalog of
+--foods foods, symptoms most days, preferences and daily aggregates. Then sends
+--requests requests to each route in main.py, --concurrency at a time, through
+the ASGI app in this process, so every number includes the real queries,
+(de)serialization and handler work.
+
+Results are printed and saved as JSON, with the commit they were measured at,
+to --output (default benchmarks/results/routes-<commit>.json). --compare prints
+the change from an earlier results file.
+
+Run from backend/ (moto is only needed without --endpoint):
+    PYTHONPATH=app uv run --with "moto[server]" python benchmarks/routes.py [--users 20] [--days 365] [--requests 200] [--concurrency 10] [--compare results.json]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import subprocess
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Annotated, Callable, Optional
+
+os.environ.setdefault("CORS_ALLOWED_ORIGINS", "http://localhost:3000")
+os.environ.setdefault("PREFERENCES_DB_NAME", "mbd_user_preferences")
+os.environ.setdefault("MEALS_DB_NAME", "mbd_meals")
+os.environ.setdefault("FOODS_DB_NAME", "mbd_foods")
+os.environ.setdefault("USER_FOODS_DB_NAME", "mbd_user_foods")
+os.environ.setdefault("SYMPTOMS_DB_NAME", "mbd_symptoms")
+os.environ.setdefault("USER_AGGREGATES_DB_NAME", "mbd_user_aggregates")
+os.environ.setdefault("IDEMPOTENCY_DB_NAME", "mbd_idempotency_keys")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("METRICS_EXPORTER", "memory")
+# Local stand-ins are much slower than DynamoDB on large queries
+os.environ.setdefault("DYNAMODB_READ_TIMEOUT_SECONDS", "60")
+
+import httpx
+from fastapi import Header
+from fastapi.routing import APIRoute
+
+import main as api
+from aggregates.aggregates import MbdUserAggregate
+from aggregates.rebuild import rebuild_user
+from foods.food import MbdFood, MbdFoodList, MbdUserFood
+from meals.meal import MbdMeal
+from preferences.preferences import MbdPreferences
+from shared import metrics
+from shared.batch import batch_put, chunked
+from shared.idempotency_store import MbdIdempotencyKey
+from symptoms.symptoms import MbdSymptomsEntry
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+MODELS = (
+    MbdPreferences,
+    MbdMeal,
+    MbdFoodList,
+    MbdUserFood,
+    MbdSymptomsEntry,
+    MbdUserAggregate,
+    MbdIdempotencyKey,
+)
+MEAL_TYPES = ("Breakfast", "Lunch", "Dinner")
+SYMPTOMS = ("Bloating", "Headache", "Nausea", "Fatigue", "Cramps")
+THUMBNAILS = "🍎🍌🥦🥕🍞🧀🥚🍗🍚🥗"
+# Meals written by the benchmark start here, clear of the seeded history
+WRITE_START = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class SeededUser:
+    user_id: str
+    food_ids: list[str]
+    meal_times: list[datetime]
+
+
+@dataclass
+class Scenario:
+    method: str
+    route: str
+    # (user, request number) -> (URL, JSON body)
+    build: Callable[[SeededUser, int], tuple[str, Optional[object]]]
+
+
+@dataclass
+class RouteResult:
+    requests: int
+    errors: int
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    dynamodb_calls_per_request: float
+    consumed_capacity_per_request: float
+
+
+def start_moto() -> tuple[str, Callable[[], None]]:
+    from moto.server import ThreadedMotoServer
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    # Don't log every request
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    return f"http://127.0.0.1:{port}", server.stop
+
+
+def create_tables() -> None:
+    for model in MODELS:
+        if not model.exists():
+            model.create_table(billing_mode="PAY_PER_REQUEST", wait=True)
+
+
+def seed_user(
+    user_id: str, days: int, food_count: int, rng: random.Random
+) -> SeededUser:
+    foods = [
+        MbdFood(
+            food_id=str(uuid.UUID(int=rng.getrandbits(128))),
+            name=f"Food {user_id} {i}",
+            thumbnail=THUMBNAILS[i % len(THUMBNAILS)],
+        )
+        for i in range(food_count)
+    ]
+    MbdFoodList(user_id=user_id, foods=foods).save()
+    MbdPreferences(user_id=user_id).save()
+
+    # Regulars show up in most meals, so suggestions have something to find
+    regulars = foods[:5]
+    today = datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    meals, entries = [], []
+    for day in range(days, 0, -1):
+        date = today - timedelta(days=day)
+        for hour, meal_type in zip((8, 12, 18), MEAL_TYPES):
+            meal_foods = rng.sample(foods, 2) + rng.sample(regulars, 1)
+            meals.append(
+                MbdMeal(
+                    user_id=user_id,
+                    date_time=date + timedelta(hours=hour, minutes=rng.randrange(60)),
+                    meal_type=meal_type,
+                    foods=meal_foods,
+                )
+            )
+        if rng.random() < 0.6:
+            entries.append(
+                MbdSymptomsEntry(
+                    user_id=user_id,
+                    date_time=date + timedelta(hours=rng.randrange(8, 23)),
+                    symptoms=rng.sample(SYMPTOMS, rng.randrange(1, 3)),
+                )
+            )
+
+    for model, items in ((MbdMeal, meals), (MbdSymptomsEntry, entries)):
+        for chunk in chunked(items):
+            failed = batch_put(model, chunk)
+            if failed:
+                raise RuntimeError(
+                    f"Seeding {len(failed)} {model.__name__} items failed"
+                )
+
+    rebuild_user(user_id)
+
+    return SeededUser(
+        user_id=user_id,
+        food_ids=[food.food_id for food in foods],
+        meal_times=[meal.date_time for meal in meals],
+    )
+
+
+def build_scenarios() -> list[Scenario]:
+    def meal_body(user: SeededUser, date_time: datetime) -> dict:
+        return {
+            "meal_type": random.choice(MEAL_TYPES),
+            "date_time": date_time.isoformat(),
+            "foods": [
+                {"food_id": food_id, "name": "Bench food", "thumbnail": "🍎"}
+                for food_id in random.sample(user.food_ids, 3)
+            ],
+        }
+
+    # Written items get timestamps unique to this run, so they never collide
+    write_times = itertools.count(int(time.time()) % 10**6 * 1000)
+
+    def new_meal_time() -> datetime:
+        return WRITE_START + timedelta(seconds=next(write_times))
+
+    def update_meal(user: SeededUser, i: int):
+        date_time = random.choice(user.meal_times)
+        return "/meals", {
+            **meal_body(user, date_time),
+            "original_date_time": date_time.isoformat(),
+        }
+
+    def journal_entry(user: SeededUser, i: int):
+        new_food = {
+            "food_id": str(uuid.uuid4()),
+            "name": f"New food {uuid.uuid4()}",
+            "thumbnail": "🥝",
+        }
+        meal = meal_body(user, new_meal_time())
+        meal["foods"].append(new_food)
+        return "/journal/entries", {
+            "meal": meal,
+            "symptoms": random.sample(SYMPTOMS, 2),
+            "new_foods": [new_food],
+        }
+
+    return [
+        Scenario("GET", "/", lambda user, i: ("/", None)),
+        Scenario("GET", "/preferences", lambda user, i: ("/preferences", None)),
+        Scenario(
+            "POST",
+            "/preferences",
+            lambda user, i: (
+                "/preferences",
+                {
+                    "defaultMealTimes": ["8:00", "12:30", "18:00"],
+                    "useThumbnails": True,
+                },
+            ),
+        ),
+        Scenario(
+            "POST",
+            "/foods",
+            lambda user, i: (
+                "/foods",
+                {
+                    "food_id": str(uuid.uuid4()),
+                    "name": f"New food {uuid.uuid4()}",
+                    "thumbnail": "🥝",
+                },
+            ),
+        ),
+        Scenario(
+            "GET",
+            "/foods/{food_id}",
+            lambda user, i: (f"/foods/{random.choice(user.food_ids)}", None),
+        ),
+        Scenario("GET", "/foods", lambda user, i: ("/foods", None)),
+        Scenario(
+            "POST",
+            "/meals",
+            lambda user, i: ("/meals", meal_body(user, new_meal_time())),
+        ),
+        Scenario(
+            "POST",
+            "/meals/batch",
+            lambda user, i: (
+                "/meals/batch",
+                [meal_body(user, new_meal_time()) for _ in range(25)],
+            ),
+        ),
+        Scenario("PUT", "/meals", update_meal),
+        Scenario(
+            "GET", "/meals/history", lambda user, i: ("/meals/history?days=7", None)
+        ),
+        Scenario(
+            "GET",
+            "/foods/suggested/{meal_type}",
+            lambda user, i: (f"/foods/suggested/{random.choice(MEAL_TYPES)}", None),
+        ),
+        Scenario(
+            "POST",
+            "/symptoms",
+            lambda user, i: (
+                "/symptoms",
+                {
+                    "date_time": new_meal_time().isoformat(),
+                    "symptoms": random.sample(SYMPTOMS, 2),
+                },
+            ),
+        ),
+        Scenario(
+            "GET", "/symptoms/history", lambda user, i: ("/symptoms/history?days=7", None)
+        ),
+        Scenario("POST", "/journal/entries", journal_entry),
+        Scenario(
+            "GET",
+            "/insights/correlations",
+            lambda user, i: ("/insights/correlations?days=90", None),
+        ),
+        Scenario("GET", "/export", lambda user, i: ("/export", None)),
+    ]
+
+
+def check_coverage(scenarios: list[Scenario]) -> None:
+    covered = {(scenario.method, scenario.route) for scenario in scenarios}
+    for route in api.app.routes:
+        if not isinstance(route, APIRoute) or not route.include_in_schema:
+            continue
+        for method in route.methods:
+            if (method, route.path) not in covered:
+                print(f"Warning: {method} {route.path} has no scenario")
+
+
+async def run_scenario(
+    scenario: Scenario, users: list[SeededUser], requests: int, concurrency: int
+) -> RouteResult:
+    exporter: metrics.InMemoryExporter = metrics.get_exporter()
+    exporter.clear()
+    transport = httpx.ASGITransport(app=api.app)
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+    errors = 0
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+
+        async def one_request(i: int):
+            nonlocal errors
+            user = random.choice(users)
+            url, body = scenario.build(user, i)
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.request(
+                        scenario.method,
+                        url,
+                        json=body,
+                        headers={"Authorization": f"Bearer {user.user_id}"},
+                    )
+                    failed = response.status_code >= 400
+                except Exception:
+                    # e.g. a streamed response failing after it started
+                    failed = True
+                timings.append(time.perf_counter() - start)
+            errors += failed
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one_request(i) for i in range(requests)])
+        elapsed = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(timings, n=100)
+    recorded = exporter.requests or [None]
+    return RouteResult(
+        requests=requests,
+        errors=errors,
+        throughput_rps=requests / elapsed,
+        p50_ms=statistics.median(timings) * 1000,
+        p95_ms=percentiles[94] * 1000,
+        p99_ms=percentiles[98] * 1000,
+        dynamodb_calls_per_request=statistics.mean(
+            record.dynamodb_calls if record else 0 for record in recorded
+        ),
+        consumed_capacity_per_request=statistics.mean(
+            record.consumed_capacity if record else 0 for record in recorded
+        ),
+    )
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_comparison(results: dict, previous: dict) -> None:
+    print(f"\nChange from {previous['commit']} ({previous['timestamp']}):")
+    for name, result in results["routes"].items():
+        before = previous["routes"].get(name)
+        if before is None:
+            continue
+        changes = "  ".join(
+            f"{metric} {(result[metric] - before[metric]) / before[metric]:+7.1%}"
+            for metric in ("p50_ms", "p99_ms", "throughput_rps")
+            if before[metric]
+        )
+        print(f"{name:<36} {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--endpoint", help="DynamoDB endpoint; starts moto if unset")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--foods", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="Earlier results file")
+    args = parser.parse_args()
+
+    stop = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        endpoint, stop = start_moto()
+    # Read when the shared connection is first created, below
+    os.environ["DYNAMODB_HOST"] = endpoint
+
+    # The bearer token is the user ID; authentication isn't what's measured here
+    async def bench_user_id(authorization: Annotated[str, Header()]) -> str:
+        return authorization.removeprefix("Bearer ")
+
+    api.app.dependency_overrides[api.current_user_id] = bench_user_id
+
+    try:
+        print(f"Seeding {args.users} users x {args.days} days at {endpoint}...")
+        create_tables()
+        rng = random.Random(args.seed)
+        users = [
+            seed_user(f"bench-user-{n}", args.days, args.foods, rng)
+            for n in range(args.users)
+        ]
+
+        scenarios = build_scenarios()
+        check_coverage(scenarios)
+
+        results = {
+            "commit": current_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "endpoint": args.endpoint or "moto",
+            "settings": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("output", "compare", "endpoint")
+            },
+            "routes": {},
+        }
+        print(
+            f"{'route':<36} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+            f" {'calls':>6} {'RCU/WCU':>8} {'errors':>6}"
+        )
+        for scenario in scenarios:
+            name = f"{scenario.method} {scenario.route}"
+            result = asyncio.run(
+                run_scenario(scenario, users, args.requests, args.concurrency)
+            )
+            results["routes"][name] = asdict(result)
+            print(
+                f"{name:<36} {result.throughput_rps:8.1f} {result.p50_ms:8.1f}"
+                f" {result.p95_ms:8.1f} {result.p99_ms:8.1f}"
+                f" {result.dynamodb_calls_per_request:6.1f}"
+                f" {result.consumed_capacity_per_request:8.1f} {result.errors:6d}"
+            )
+    finally:
+        if stop is not None:
+            stop()
+
+    output = args.output or RESULTS_DIR / f"routes-{results['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nSaved to {output}")
+
+    if args.compare is not None:
+        print_comparison(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 resource "aws_api_gateway_rest_api" "mbd_rest_api" {
   name        = "MealJournalAPI"
   description = "API Gateway for Meal Journal"
+  # Compressed responses leave the Lambda base64 encoded; this has API Gateway
+  # decode them for the client (see app/shared/compression.py)
+  binary_media_types = ["*/*"]
 }
 
 
@@ -53,6 +56,9 @@ resource "aws_api_gateway_integration" "proxy_options" {
   resource_id = aws_api_gateway_resource.proxy.id
   http_method = aws_api_gateway_method.proxy_options.http_method
   type        = "MOCK"
+  # With binary_media_types = ["*/*"], preflights would otherwise pass through
+  # as binary and no longer match the application/json template below
+  content_handling = "CONVERT_TO_TEXT"
 
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
@@ -97,7 +103,9 @@ resource "aws_api_gateway_deployment" "main" {
       rest_api_id  = aws_api_gateway_rest_api.mbd_rest_api.id
       resources    = aws_api_gateway_resource.proxy.id
       methods      = [aws_api_gateway_method.proxy.http_method, aws_api_gateway_method.proxy_options.http_method, aws_api_gateway_integration_response.options.response_parameters]
-      integrations = [aws_api_gateway_integration.proxy.uri, aws_api_gateway_integration.proxy_options.uri]
+      integrations = [aws_api_gateway_integration.proxy.uri, aws_api_gateway_integration.proxy_options.uri, aws_api_gateway_integration.proxy_options.content_handling]
+      # Only takes effect once redeployed
+      binary_media_types = aws_api_gateway_rest_api.mbd_rest_api.binary_media_types
     }))
   }
 
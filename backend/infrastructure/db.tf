@@ -27,6 +27,21 @@ resource "aws_dynamodb_table" "mbd_meals" {
     name = "date_time"
     type = "S"
   }
+
+  # "<meal type>#<date_time>", for a user's meals of one type
+  attribute {
+    name = "meal_type_date_time"
+    type = "S"
+  }
+
+  # Global, as local indexes can't be added to an existing table.
+  # Meals saved before it existed are backfilled by app/meals/migrate.py
+  global_secondary_index {
+    name            = "meal_type_date_time-index"
+    hash_key        = "user_id"
+    range_key       = "meal_type_date_time"
+    projection_type = "ALL"
+  }
 }
 
 resource "aws_dynamodb_table" "mbd_foods" {
@@ -41,6 +56,37 @@ resource "aws_dynamodb_table" "mbd_foods" {
   }
 }
 
+# One item per food, replacing the single item per user in mbd_foods
+resource "aws_dynamodb_table" "mbd_user_foods" {
+  name                        = "mbd_user_foods"
+  billing_mode                = "PAY_PER_REQUEST"
+  hash_key                    = "user_id"
+  range_key                   = "food_id"
+  deletion_protection_enabled = true
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "food_id"
+    type = "S"
+  }
+
+  # Lower-cased food name, for duplicate name checks
+  attribute {
+    name = "name_key"
+    type = "S"
+  }
+
+  local_secondary_index {
+    name            = "name_key-index"
+    range_key       = "name_key"
+    projection_type = "ALL"
+  }
+}
+
 resource "aws_dynamodb_table" "mbd_symptoms" {
   name                        = "mbd_symptoms"
   billing_mode                = "PAY_PER_REQUEST"
@@ -60,6 +106,57 @@ resource "aws_dynamodb_table" "mbd_symptoms" {
   }
 }
 
+# Per-user counts kept up to date on meal and symptom writes, see app/aggregates
+resource "aws_dynamodb_table" "mbd_user_aggregates" {
+  name                        = "mbd_user_aggregates"
+  billing_mode                = "PAY_PER_REQUEST"
+  hash_key                    = "user_id"
+  range_key                   = "aggregate"
+  deletion_protection_enabled = true
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+
+  # "totals", or "day#<date>" for the rolling window
+  attribute {
+    name = "aggregate"
+    type = "S"
+  }
+
+  # Day items expire once they leave the rolling window
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
+# Responses to write requests sent with an Idempotency-Key, see
+# app/shared/idempotency.py. Keys are dropped by TTL after a day.
+resource "aws_dynamodb_table" "mbd_idempotency_keys" {
+  name                        = "mbd_idempotency_keys"
+  billing_mode                = "PAY_PER_REQUEST"
+  hash_key                    = "user_id"
+  range_key                   = "idempotency_key"
+  deletion_protection_enabled = true
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "idempotency_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
 # Whenever adding new tables, update the following in Lambda side:
 # 1. Environment variable for the table name
 # 2. IAM policy for the Lambda function to access the new table
@@ -63,9 +63,13 @@ resource "aws_iam_policy" "lambda_dynamodb_access" {
           "dynamodb:UpdateItem",
           "dynamodb:DeleteItem",
           "dynamodb:Scan",
-          "dynamodb:Query"
+          "dynamodb:Query",
+          "dynamodb:BatchWriteItem"
+        ]
+        Resource = [
+          aws_dynamodb_table.mbd_meals.arn,
+          "${aws_dynamodb_table.mbd_meals.arn}/index/*"
         ]
-        Resource = aws_dynamodb_table.mbd_meals.arn
       },
       {
         Effect = "Allow"
@@ -79,6 +83,21 @@ resource "aws_iam_policy" "lambda_dynamodb_access" {
         ]
         Resource = aws_dynamodb_table.mbd_foods.arn
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:PutItem",
+          "dynamodb:GetItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem",
+          "dynamodb:Scan",
+          "dynamodb:Query"
+        ]
+        Resource = [
+          aws_dynamodb_table.mbd_user_foods.arn,
+          "${aws_dynamodb_table.mbd_user_foods.arn}/index/*"
+        ]
+      },
 
       {
         Effect = "Allow"
@@ -92,6 +111,27 @@ resource "aws_iam_policy" "lambda_dynamodb_access" {
         ]
         Resource = aws_dynamodb_table.mbd_symptoms.arn
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:PutItem",
+          "dynamodb:GetItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem",
+          "dynamodb:Scan",
+          "dynamodb:Query"
+        ]
+        Resource = aws_dynamodb_table.mbd_user_aggregates.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:PutItem",
+          "dynamodb:GetItem",
+          "dynamodb:DeleteItem"
+        ]
+        Resource = aws_dynamodb_table.mbd_idempotency_keys.arn
+      },
     ]
   })
 }
@@ -118,7 +158,16 @@ resource "aws_lambda_function" "mbd_api_lambda_handler" {
       PREFERENCES_DB_NAME = aws_dynamodb_table.mbd_user_preferences.name
       MEALS_DB_NAME       = aws_dynamodb_table.mbd_meals.name
       FOODS_DB_NAME       = aws_dynamodb_table.mbd_foods.name
+      USER_FOODS_DB_NAME  = aws_dynamodb_table.mbd_user_foods.name
+      FOODS_STORAGE_MODE  = "list" # list -> dual -> items, see app/foods/migrate.py
       SYMPTOMS_DB_NAME    = aws_dynamodb_table.mbd_symptoms.name
+      USER_AGGREGATES_DB_NAME = aws_dynamodb_table.mbd_user_aggregates.name
+      IDEMPOTENCY_DB_NAME     = aws_dynamodb_table.mbd_idempotency_keys.name
+      # CloudWatch metrics from the logs, see app/shared/metrics.py
+      METRICS_EXPORTER        = "emf"
+      METRICS_NAMESPACE       = "MealJournal"
+      COGNITO_USER_POOL_ID    = aws_cognito_user_pool.mj_user_pool.id
+      COGNITO_APP_CLIENT_ID   = aws_cognito_user_pool_client.mj_user_pool_client.id
       CORS_ALLOWED_ORIGINS = join(",", [
         "http://localhost:3000", # Always allow localhost for development
         "https://${aws_cloudfront_distribution.mbd_web_distribution.domain_name}"
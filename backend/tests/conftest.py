@@ -1,11 +1,16 @@
 import os
 from unittest.mock import patch
+
 import pytest
 from fastapi.testclient import TestClient
 
 os.environ["CORS_ALLOWED_ORIGINS"] = "http://localhost:3000"
+# Tests mock the models; cached copies would leak between tests
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["METRICS_EXPORTER"] = "none"
 
-from app.main import app
+from app.main import app, current_user_id
+from shared.days import DEFAULT_TIMEZONE
 
 
 @pytest.fixture
@@ -16,11 +21,23 @@ def client():
     return TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def mock_user_timezone():
+    """
+    Users are in the default timezone, so requests that need it don't read
+    preferences. Tests of other timezones set the mock's return value.
+    """
+    with patch(
+        "preferences.repository.get_timezone", return_value=DEFAULT_TIMEZONE
+    ) as mock_get_timezone:
+        yield mock_get_timezone
+
+
 @pytest.fixture
 def mock_get_user_id():
-    with patch("app.main.get_user_id") as mock:
-        mock.return_value = "test-user"
-        yield mock
+    app.dependency_overrides[current_user_id] = lambda: "test-user"
+    yield
+    app.dependency_overrides.pop(current_user_id, None)
 
 
 @pytest.fixture
@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from botocore.exceptions import ClientError
+from pynamodb.exceptions import UpdateError
+
+from aggregates.aggregates import (
+    TOTALS_KEY,
+    MbdUserAggregate,
+    apply_deltas,
+    day_key,
+    meal_deltas,
+    symptoms_entry_deltas,
+)
+from aggregates.rebuild import compute_aggregates, rebuild_user
+from foods.food import MbdFood
+from meals.meal import MbdMeal
+from shared.dynamodb import get_connection
+from symptoms.symptoms import MbdSymptomsEntry
+
+NOW = datetime.now(timezone.utc)
+OATS = MbdFood(food_id=str(uuid4()), name="Oats", thumbnail="🥣")
+KIWI = MbdFood(food_id=str(uuid4()), name="Kiwi", thumbnail="🥝")
+
+
+def meal(date_time, meal_type, *foods):
+    return MbdMeal(
+        user_id="test-user", meal_type=meal_type, date_time=date_time, foods=list(foods)
+    )
+
+
+def update_error(code):
+    return UpdateError(cause=ClientError({"Error": {"Code": code}}, "UpdateItem"))
+
+
+def conditional_check_failed():
+    return update_error("ConditionalCheckFailedException")
+
+
+def test_meal_deltas__counts_food_per_meal_type_for_totals_and_day():
+    breakfast = meal(NOW - timedelta(hours=1), "Breakfast", OATS, KIWI)
+    old_lunch = meal(NOW - timedelta(days=400), "Lunch", OATS)
+
+    deltas = meal_deltas([breakfast, old_lunch])
+
+    # Days past the rolling window only count towards the totals
+    assert set(deltas) == {TOTALS_KEY, day_key(breakfast.date_time)}
+    totals = deltas[TOTALS_KEY]
+    assert totals.meal_count == 2
+    assert totals.food_counts == {
+        f"Breakfast#{OATS.food_id}": 1,
+        f"Breakfast#{KIWI.food_id}": 1,
+        f"Lunch#{OATS.food_id}": 1,
+    }
+    assert totals.last_eaten == {
+        OATS.food_id: breakfast.date_time,
+        KIWI.food_id: breakfast.date_time,
+    }
+    assert totals.expires_at is None
+    assert deltas[day_key(breakfast.date_time)].expires_at > NOW
+
+
+def test_meal_deltas__update_moves_counts_between_foods():
+    previous = meal(NOW, "Breakfast", OATS)
+    updated = meal(NOW, "Breakfast", KIWI)
+
+    deltas = meal_deltas([updated])
+    meal_deltas([previous], sign=-1, deltas=deltas)
+
+    assert deltas[TOTALS_KEY].meal_count == 0
+    assert deltas[TOTALS_KEY].food_counts == {
+        f"Breakfast#{KIWI.food_id}": 1,
+        f"Breakfast#{OATS.food_id}": -1,
+    }
+    # Removing a meal never rolls last_eaten back
+    assert deltas[TOTALS_KEY].last_eaten == {KIWI.food_id: NOW}
+
+
+@patch.object(MbdUserAggregate, "update")
+def test_apply_deltas__creates_maps_on_first_write(mock_update):
+    entry = MbdSymptomsEntry(user_id="test-user", date_time=NOW, symptoms=["Gas"])
+    mock_update.side_effect = [conditional_check_failed(), None, None] * 2
+
+    apply_deltas("test-user", symptoms_entry_deltas([entry]))
+
+    # For both the totals and the day: the counts update, the maps, then the retry
+    assert mock_update.call_count == 6
+    counts_update, create_maps, retry = mock_update.call_args_list[:3]
+    assert counts_update == retry
+    assert len(create_maps.kwargs["actions"]) == 3
+
+
+@patch.object(MbdUserAggregate, "update")
+def test_apply_deltas__last_eaten_falls_back_to_one_food_at_a_time(mock_update):
+    breakfast = meal(NOW - timedelta(days=400), "Breakfast", OATS, KIWI)
+    # Counts, then all of last_eaten at once, then one food at a time
+    mock_update.side_effect = [None, conditional_check_failed(), None, None]
+
+    apply_deltas("test-user", meal_deltas([breakfast]))
+
+    assert mock_update.call_count == 4
+    assert [len(call.kwargs["actions"]) for call in mock_update.call_args_list] == [
+        3,
+        2,
+        1,
+        1,
+    ]
+
+
+@patch.object(MbdUserAggregate, "update")
+def test_apply_deltas__logs_failures(mock_update):
+    mock_update.side_effect = update_error("ProvisionedThroughputExceededException")
+
+    # The journal entry is already saved; aggregates are fixed up by the rebuild
+    apply_deltas("test-user", meal_deltas([meal(NOW, "Lunch", OATS)]))
+
+
+@patch.object(MbdUserAggregate, "update")
+def test_apply_deltas__raises_invalid_updates(mock_update):
+    mock_update.side_effect = update_error("ValidationException")
+
+    with pytest.raises(UpdateError):
+        apply_deltas("test-user", meal_deltas([meal(NOW, "Lunch", OATS)]))
+
+
+def test_apply_deltas__splits_large_imports_into_small_updates(mock_aws_credentials):
+    foods = [
+        MbdFood(food_id=str(uuid4()), name=f"Food {i}", thumbnail="🥣")
+        for i in range(300)
+    ]
+    meals = [
+        meal(NOW - timedelta(hours=i), "Lunch", foods[i], foods[-i - 1])
+        for i in range(300)
+    ]
+    expressions = []
+
+    def fake_dynamodb_call(client, operation_name, operation_kwargs):
+        assert operation_name == "UpdateItem"
+        for name in ("UpdateExpression", "ConditionExpression"):
+            expression = operation_kwargs.get(name, "")
+            expressions.append(expression)
+            if len(expression.encode()) > 4096:
+                raise ClientError(
+                    {"Error": {"Code": "ValidationException"}}, operation_name
+                )
+        return {"Attributes": operation_kwargs["Key"]}
+
+    with (
+        patch.object(MbdUserAggregate.Meta, "table_name", "mbd_user_aggregates"),
+        patch.object(MbdUserAggregate, "_connection", None),
+        patch(
+            "botocore.client.BaseClient._make_api_call",
+            autospec=True,
+            side_effect=fake_dynamodb_call,
+        ),
+    ):
+        get_connection.cache_clear()
+        apply_deltas("test-user", meal_deltas(meals))
+        get_connection.cache_clear()
+
+    set_foods = sum(expression.count(" = ") for expression in expressions)
+    # Every food's count on the totals, and its last_eaten
+    assert set_foods >= 2 * len(foods)
+    assert max(len(expression.encode()) for expression in expressions) < 4096
+
+
+@patch.object(MbdUserAggregate, "delete")
+@patch.object(MbdUserAggregate, "save")
+@patch.object(MbdUserAggregate, "query")
+@patch.object(MbdSymptomsEntry, "query", return_value=[])
+@patch.object(MbdMeal, "query")
+def test_rebuild_user__rewrites_stale_aggregates(
+    mock_meal_query, mock_symptoms_query, mock_query, mock_save, mock_delete
+):
+    meals = [meal(NOW - timedelta(days=2), "Lunch", OATS)]
+    mock_meal_query.return_value = meals
+    expected = compute_aggregates("test-user")
+
+    stale_totals = expected[TOTALS_KEY]
+    stale_totals.meal_count = 3
+    emptied_day = MbdUserAggregate(
+        user_id="test-user", aggregate=day_key(NOW), meal_count=0
+    )
+    expired_day = MbdUserAggregate(
+        user_id="test-user", aggregate=day_key(NOW - timedelta(days=90)), meal_count=1
+    )
+    current_day = compute_aggregates("test-user")[day_key(meals[0].date_time)]
+    mock_query.return_value = [stale_totals, emptied_day, expired_day, current_day]
+
+    assert rebuild_user("test-user", check_only=True) == sorted(
+        [TOTALS_KEY, day_key(NOW)]
+    )
+    mock_save.assert_not_called()
+
+    rebuild_user("test-user")
+    mock_save.assert_called_once()
+    mock_delete.assert_called_once()
@@ -3,9 +3,11 @@ from unittest.mock import patch, MagicMock
 from uuid import uuid4
 
 from foods.food import MbdFood
+from meals.meal import MbdMeal
+from shared.pagination import encode_cursor
 
 
-@patch("app.main.MbdFoodList.get")
+@patch("foods.repository.MbdFoodList.get")
 async def test_create_food__returns_new_food(mock_get, client, mock_get_user_id):
     # Mock the food list
     mock_food_list = MagicMock()
@@ -37,7 +39,7 @@ async def test_create_food__returns_new_food(mock_get, client, mock_get_user_id)
     mock_food_list.save.assert_called_once()
 
 
-@patch("app.main.MbdFoodList.get")
+@patch("foods.repository.MbdFoodList.get")
 async def test_create_food__returns_bad_request_if_food_exists(
     mock_get, client, mock_get_user_id
 ):
@@ -72,7 +74,7 @@ async def test_create_food__returns_bad_request_if_food_exists(
     mock_food_list.save.assert_not_called()
 
 
-@patch("app.main.MbdFoodList.get")
+@patch("foods.repository.MbdFoodList.get")
 async def test_create_food__returns_bad_request_if_food_exists_ignoring_case(
     mock_get, client, mock_get_user_id
 ):
@@ -107,7 +109,7 @@ async def test_create_food__returns_bad_request_if_food_exists_ignoring_case(
     mock_food_list.save.assert_not_called()
 
 
-@patch("app.main.get_suggested_foods")
+@patch("app.main.foods_repository.get_suggested_foods")
 async def test_get_suggested_foods_endpoint(
     mock_get_suggested_foods, client, mock_get_user_id
 ):
@@ -148,7 +150,7 @@ async def test_get_suggested_foods_endpoint(
     mock_get_suggested_foods.assert_called_once_with("test-user", meal_type)
 
 
-@patch("app.main.MbdSymptomsEntry.query")
+@patch("symptoms.repository.MbdSymptomsEntry.query")
 async def test_get_symptom_history__returns_symptom_history(
     mock_query, client, mock_get_user_id
 ):
@@ -192,7 +194,7 @@ async def test_get_symptom_history__returns_symptom_history(
     # We can't directly compare the range_key_condition objects, but we can verify it was called
 
 
-@patch("app.main.MbdSymptomsEntry.query")
+@patch("symptoms.repository.MbdSymptomsEntry.query")
 async def test_get_symptom_history__with_custom_days_and_offset(
     mock_query, client, mock_get_user_id
 ):
@@ -215,3 +217,213 @@ async def test_get_symptom_history__with_custom_days_and_offset(
     args, kwargs = mock_query.call_args
     assert kwargs["hash_key"] == "test-user"
     # We can't directly compare the range_key_condition objects, but we can verify it was called
+
+
+@patch("symptoms.repository.MbdSymptomsEntry.query")
+async def test_get_symptom_history__with_limit_returns_page_and_cursor(
+    mock_query, client, mock_get_user_id
+):
+    # Mock a page of results with more to come
+    entry = MagicMock()
+    entry.to_dto.return_value = {"symptoms": ["Bloating"]}
+    results = MagicMock()
+    results.__iter__.return_value = iter([entry])
+    results.last_evaluated_key = {
+        "user_id": {"S": "test-user"},
+        "date_time": {"S": "2025-01-01T00:00:00.000000+0000"},
+    }
+    mock_query.return_value = results
+
+    # Make the request
+    response = client.get(
+        "/symptoms/history?limit=1",
+        headers={"Authorization": "Bearer test-token"},
+    )
+
+    # Verify the response
+    assert response.status_code == 200
+    assert response.json() == [{"symptoms": ["Bloating"]}]
+    next_cursor = response.headers["X-Next-Cursor"]
+
+    # Verify the query reads newest first, one page at a time
+    _, kwargs = mock_query.call_args
+    assert kwargs["scan_index_forward"] is False
+    assert kwargs["limit"] == 1
+    assert kwargs["last_evaluated_key"] is None
+
+    # The cursor resumes from the last evaluated key
+    results.__iter__.return_value = iter([])
+    results.last_evaluated_key = None
+    response = client.get(
+        f"/symptoms/history?limit=1&cursor={next_cursor}",
+        headers={"Authorization": "Bearer test-token"},
+    )
+
+    assert response.status_code == 200
+    assert "X-Next-Cursor" not in response.headers
+    _, kwargs = mock_query.call_args
+    assert kwargs["last_evaluated_key"] == {
+        "user_id": {"S": "test-user"},
+        "date_time": {"S": "2025-01-01T00:00:00.000000+0000"},
+    }
+
+
+@patch("meals.repository.MbdMeal.query")
+async def test_get_meal_history__rejects_cursor_for_another_user(
+    mock_query, client, mock_get_user_id
+):
+    cursor = encode_cursor(
+        {
+            "user_id": {"S": "someone-else"},
+            "date_time": {"S": "2025-01-01T00:00:00.000000+0000"},
+        }
+    )
+
+    response = client.get(
+        f"/meals/history?limit=10&cursor={cursor}",
+        headers={"Authorization": "Bearer test-token"},
+    )
+
+    assert response.status_code == 400
+    mock_query.assert_not_called()
+
+
+@patch("meals.repository.MbdMeal.query")
+async def test_get_meal_history__with_meal_type_reads_the_meal_type_index(
+    mock_query, client, mock_get_user_id
+):
+    meal = MbdMeal(
+        user_id="test-user",
+        meal_type="Breakfast",
+        date_time=datetime(2025, 1, 1, 8, tzinfo=timezone.utc),
+    )
+    results = MagicMock()
+    results.__iter__.return_value = iter([meal])
+    results.last_evaluated_key = {
+        "user_id": {"S": "test-user"},
+        "date_time": {"S": "2025-01-01T08:00:00.000000+0000"},
+        "meal_type_date_time": {"S": "Breakfast#2025-01-01T08:00:00.000000+0000"},
+    }
+    mock_query.return_value = results
+
+    response = client.get(
+        "/meals/history?limit=1&meal_type=Breakfast",
+        headers={"Authorization": "Bearer test-token"},
+    )
+
+    assert response.status_code == 200
+    assert [m["meal_type"] for m in response.json()] == ["Breakfast"]
+    args, kwargs = mock_query.call_args
+    assert args == ("test-user",)
+    assert kwargs["index_name"] == "meal_type_date_time-index"
+    assert kwargs["scan_index_forward"] is False
+
+    # The cursor resumes on the index, but not on the table
+    next_cursor = response.headers["X-Next-Cursor"]
+    results.__iter__.return_value = iter([])
+    results.last_evaluated_key = None
+    response = client.get(
+        f"/meals/history?limit=1&meal_type=Breakfast&cursor={next_cursor}",
+        headers={"Authorization": "Bearer test-token"},
+    )
+    assert response.status_code == 200
+    _, kwargs = mock_query.call_args
+    assert kwargs["last_evaluated_key"]["meal_type_date_time"] == {
+        "S": "Breakfast#2025-01-01T08:00:00.000000+0000"
+    }
+
+    mock_query.reset_mock()
+    response = client.get(
+        f"/meals/history?limit=1&cursor={next_cursor}",
+        headers={"Authorization": "Bearer test-token"},
+    )
+    assert response.status_code == 400
+    mock_query.assert_not_called()
+
+
+def test_meal_serialize__sets_the_meal_type_index_key():
+    meal = MbdMeal(
+        user_id="test-user",
+        meal_type="Lunch",
+        date_time=datetime(2025, 1, 1, 12, tzinfo=timezone.utc),
+    )
+
+    assert meal.serialize()["meal_type_date_time"] == {
+        "S": "Lunch#2025-01-01T12:00:00.000000+0000"
+    }
+
+    meal.meal_type = "Dinner"
+    assert meal.serialize()["meal_type_date_time"] == {
+        "S": "Dinner#2025-01-01T12:00:00.000000+0000"
+    }
+
+
+@patch("meals.repository.apply_deltas")
+@patch("meals.repository.batch_put")
+async def test_save_meal_batch__reports_each_item(
+    mock_batch_put, mock_apply_deltas, client, mock_get_user_id
+):
+    mock_batch_put.return_value = []
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    meals = [
+        {
+            "meal_type": "Lunch",
+            "date_time": (start + timedelta(hours=i)).isoformat(),
+            "foods": [],
+        }
+        for i in range(30)
+    ]
+    meals[3] = {"meal_type": "Lunch", "foods": []}
+    meals[4]["date_time"] = meals[5]["date_time"]
+
+    response = client.post(
+        "/meals/batch",
+        headers={"Authorization": "Bearer test-token"},
+        json=meals,
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["saved"] == 28
+    assert data["failed"] == 2
+    assert [result["index"] for result in data["results"]] == list(range(30))
+    assert data["results"][3]["status"] == "invalid"
+    assert data["results"][3]["errors"] == ["date_time: Field required"]
+    assert data["results"][5]["status"] == "failed"
+    # Numbered as sent, not among the valid items
+    assert data["results"][5]["errors"] == ["Duplicate of meal 4, at the same date_time"]
+    # 28 unique meals, written in chunks of 25
+    assert [len(call.args[1]) for call in mock_batch_put.call_args_list] == [25, 3]
+
+
+@patch("meals.repository.apply_deltas")
+@patch("meals.repository.batch_put")
+async def test_save_meal_batch__accepts_ndjson(
+    mock_batch_put, mock_apply_deltas, client, mock_get_user_id
+):
+    mock_batch_put.return_value = [1]
+    body = "\n".join(
+        [
+            '{"meal_type": "Lunch", "date_time": "2025-01-01T12:00:00Z", "foods": []}',
+            '{"meal_type": "Dinner", "date_time": "2025-01-01T18:00:00Z", "foods": []}',
+            "not json",
+        ]
+    )
+
+    response = client.post(
+        "/meals/batch",
+        headers={
+            "Authorization": "Bearer test-token",
+            "Content-Type": "application/x-ndjson",
+        },
+        content=body,
+    )
+
+    assert response.status_code == 200
+    assert [
+        (result["status"], result["errors"]) for result in response.json()["results"]
+    ] == [
+        ("saved", []),
+        ("failed", ["Failed to save meal. Please try again."]),
+        ("invalid", ["Invalid JSON"]),
+    ]
@@ -0,0 +1,231 @@
+import base64
+import hashlib
+import json
+
+import pytest
+
+from shared.auth import SHA256_DIGEST_INFO, TokenVerifier, current_user_id
+from shared.exceptions import MbdException
+
+ISSUER = "https://cognito-idp.us-west-2.amazonaws.com/us-west-2_test"
+CLIENT_ID = "test-client"
+
+# A 2048-bit RSA key used only to sign test tokens
+TEST_KEY_N = int(
+    "deeadd0a7db957c4ece7873060ab7de620b4653e374d7abd1e88e7ffdd783b9a"
+    "c5fad2e62fc87e0a240c5f3ac4bce3532dd6cddd7d744c6204d3c2f41a9ee64e"
+    "ea85061c64197cd4f069eb7127dbbe2bb089f625dd5335c81c0e4d510fcbc8d2"
+    "f48455a337fc80cabbc197b3b066d00c7685f6afaa3af1188e7252e15caa970a"
+    "3575fc8d42af9becb6687e4061ac41aa8c0c440bbdfc59fef3a36e875a76b8c2"
+    "bc69bbe4cfda494f0c2e869088ccff46e9595d937f21574644eba4baa50e6d36"
+    "369d46df1bcbb6b0f1be934cc117e0d0c3e292acd848b0abaf5b54406ba9f76e"
+    "f49acccab3b93312753dbb537995c6deabe33100cbdee3e8a03cb3f6a02dc85d",
+    16,
+)
+TEST_KEY_D = int(
+    "212311abb867bfb681844e078629f2ae58689344ede1f71fbb8a7223b4ba3af0"
+    "b583252c5c530b501a440fe343bbfe76441ca7d547e1176504bf03e92c8c8d6e"
+    "3d6a26853c3e165d431b19098fa41894bf0aab216826b1452777daccca32800e"
+    "6d3f14c9e2b886deb18d6ed877c86374a42922dec1c93eee1312c738ed565b30"
+    "3d5318062a17a4f93f21278282f1cdb3c548e2964d54cfbbf32a3580dba496af"
+    "159c90f5a704ee2d394f916cbfc3e1c2b10cebb066e63d90fb3e7c92a8b8fb3f"
+    "681c2664a4f77680e5937736aac0504f4b53d56c52fa8bc07d12cdd8f78a1b1d"
+    "94a03c34f234af86ba1910d57f5701527140168b7c5536b48a0becbfb22089a3",
+    16,
+)
+TEST_KEY_E = 65537
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeJwks:
+    def __init__(self, *kids):
+        self.kids = list(kids)
+        self.fetches = 0
+        # Fetches still to fail
+        self.failures = 0
+
+    def __call__(self, url):
+        self.fetches += 1
+        if self.failures:
+            self.failures -= 1
+            raise OSError("Network is unreachable")
+        return {
+            "keys": [
+                {
+                    "kty": "RSA",
+                    "kid": kid,
+                    "alg": "RS256",
+                    "n": b64url(TEST_KEY_N.to_bytes(256, "big")),
+                    "e": b64url(TEST_KEY_E.to_bytes(3, "big")),
+                }
+                for kid in self.kids
+            ]
+        }
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def sign(claims: dict, kid: str = "key-1") -> str:
+    header = b64url(json.dumps({"alg": "RS256", "kid": kid}).encode())
+    payload = b64url(json.dumps(claims).encode())
+    digest_info = SHA256_DIGEST_INFO + hashlib.sha256(f"{header}.{payload}".encode()).digest()
+    encoded = b"\x00\x01" + b"\xff" * (256 - len(digest_info) - 3) + b"\x00" + digest_info
+    signature = pow(int.from_bytes(encoded, "big"), TEST_KEY_D, TEST_KEY_N)
+    return f"{header}.{payload}.{b64url(signature.to_bytes(256, 'big'))}"
+
+
+def claims_for(clock: FakeClock, **overrides) -> dict:
+    return {
+        "sub": "user-1",
+        "iss": ISSUER,
+        "aud": CLIENT_ID,
+        "token_use": "id",
+        "exp": clock.now + 3600,
+        **overrides,
+    }
+
+
+def build_verifier(clock: FakeClock, jwks: FakeJwks, **kwargs) -> TokenVerifier:
+    return TokenVerifier(
+        issuer=ISSUER,
+        jwks_url="http://jwks.test",
+        client_id=CLIENT_ID,
+        fetch=jwks,
+        clock=clock,
+        **kwargs,
+    )
+
+
+def test_verify__returns_claims_of_valid_token():
+    clock = FakeClock()
+    verifier = build_verifier(clock, FakeJwks("key-1"))
+
+    claims = verifier.verify(sign(claims_for(clock)))
+
+    assert claims["sub"] == "user-1"
+
+
+@pytest.mark.parametrize(
+    "overrides, error",
+    [
+        ({"exp": 1_699_999_999}, "Token has expired"),
+        ({"iss": "https://evil.example.com"}, "Token was issued by someone else"),
+        ({"aud": "other-client"}, "Token was issued to another client"),
+        ({"token_use": "refresh"}, "Unsupported token use"),
+    ],
+)
+def test_verify__rejects_tokens_not_meant_for_us(overrides, error):
+    clock = FakeClock()
+    verifier = build_verifier(clock, FakeJwks("key-1"))
+
+    with pytest.raises(MbdException) as exc_info:
+        verifier.verify(sign(claims_for(clock, **overrides)))
+
+    assert exc_info.value.status_code == 401
+    assert exc_info.value.detail == [error]
+
+
+def test_verify__rejects_tampered_token():
+    clock = FakeClock()
+    verifier = build_verifier(clock, FakeJwks("key-1"))
+    header, _, signature = sign(claims_for(clock)).split(".")
+    forged_payload = b64url(json.dumps(claims_for(clock, sub="someone-else")).encode())
+
+    with pytest.raises(MbdException) as exc_info:
+        verifier.verify(f"{header}.{forged_payload}.{signature}")
+
+    assert exc_info.value.detail == ["Invalid token signature"]
+
+
+def test_verify__caches_claims_until_token_expires():
+    clock = FakeClock()
+    verifier = build_verifier(clock, FakeJwks("key-1"))
+    token = sign(claims_for(clock, exp=clock.now + 60))
+
+    verifier.verify(token)
+    assert verifier.cached_claims(token)["sub"] == "user-1"
+
+    clock.now += 60
+    assert verifier.cached_claims(token) is None
+    with pytest.raises(MbdException):
+        verifier.verify(token)
+
+
+def test_verify__evicts_least_recently_used_claims():
+    clock = FakeClock()
+    verifier = build_verifier(clock, FakeJwks("key-1"), claims_cache_size=2)
+    tokens = [sign(claims_for(clock, sub=f"user-{i}")) for i in range(3)]
+
+    verifier.verify(tokens[0])
+    verifier.verify(tokens[1])
+    verifier.verify(tokens[0])
+    verifier.verify(tokens[2])
+
+    assert verifier.cached_claims(tokens[0]) is not None
+    assert verifier.cached_claims(tokens[1]) is None
+
+
+def test_verify__refetches_keys_for_unknown_key_id():
+    clock = FakeClock()
+    jwks = FakeJwks("key-1")
+    verifier = build_verifier(clock, jwks)
+    verifier.verify(sign(claims_for(clock)))
+
+    # The user pool rotates its keys
+    jwks.kids = ["key-1", "key-2"]
+    clock.now += 120
+    claims = verifier.verify(sign(claims_for(clock, sub="user-2"), kid="key-2"))
+
+    assert claims["sub"] == "user-2"
+    assert jwks.fetches == 2
+
+
+def test_verify__limits_refetches_for_made_up_key_ids():
+    clock = FakeClock()
+    jwks = FakeJwks("key-1")
+    verifier = build_verifier(clock, jwks, jwks_min_refresh_seconds=60)
+    verifier.verify(sign(claims_for(clock)))
+
+    for i in range(5):
+        with pytest.raises(MbdException) as exc_info:
+            verifier.verify(sign(claims_for(clock, sub=f"user-{i}"), kid="made-up"))
+        assert exc_info.value.detail == ["Unknown signing key"]
+
+    assert jwks.fetches == 1
+
+
+def test_verify__failed_key_fetch_is_retried_on_the_next_request():
+    clock = FakeClock()
+    jwks = FakeJwks("key-1")
+    jwks.failures = 1
+    verifier = build_verifier(clock, jwks, jwks_min_refresh_seconds=60)
+    token = sign(claims_for(clock))
+
+    with pytest.raises(MbdException) as exc_info:
+        verifier.verify(token)
+    assert exc_info.value.status_code == 503
+
+    assert verifier.verify(token)["sub"] == "user-1"
+    assert jwks.fetches == 2
+
+
+async def test_current_user_id__requires_authorization_header():
+    with pytest.raises(MbdException) as exc_info:
+        await current_user_id(None)
+
+    assert exc_info.value.status_code == 401
+
+
+def test_endpoints__reject_requests_without_token(client):
+    response = client.get("/preferences")
+
+    assert response.status_code == 401
@@ -0,0 +1,89 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+from dto.meal_create import MealCreate
+from meals.meal import MbdMeal
+from meals.repository import save_meals
+from shared.batch import BATCH_WRITE_MAX_CONCURRENCY, batch_put
+
+
+def make_meals(count):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        MbdMeal(
+            user_id="test-user",
+            meal_type="Lunch",
+            date_time=start + timedelta(hours=i),
+        )
+        for i in range(count)
+    ]
+
+
+def unprocessed(*meals):
+    return {
+        "UnprocessedItems": {
+            MbdMeal.Meta.table_name: [
+                {"PutRequest": {"Item": meal.serialize()}} for meal in meals
+            ]
+        }
+    }
+
+
+@patch.object(MbdMeal, "_get_connection")
+def test_batch_put__resends_unprocessed_items_with_backoff(mock_get_connection):
+    meals = make_meals(3)
+    connection = MagicMock()
+    connection.batch_write_item.side_effect = [unprocessed(meals[1]), {}]
+    mock_get_connection.return_value = connection
+    sleep = MagicMock()
+
+    failed = batch_put(MbdMeal, meals, sleep=sleep)
+
+    assert failed == []
+    assert connection.batch_write_item.call_count == 2
+    assert connection.batch_write_item.call_args.kwargs["put_items"] == [
+        meals[1].serialize()
+    ]
+    sleep.assert_called_once()
+
+
+@patch.object(MbdMeal, "_get_connection")
+def test_batch_put__reports_items_still_unprocessed(mock_get_connection):
+    meals = make_meals(3)
+    connection = MagicMock()
+    connection.batch_write_item.return_value = unprocessed(meals[2], meals[0])
+    mock_get_connection.return_value = connection
+
+    failed = batch_put(MbdMeal, meals, max_attempts=3, sleep=MagicMock())
+
+    assert failed == [0, 2]
+    assert connection.batch_write_item.call_count == 3
+
+
+@patch("meals.repository.apply_deltas")
+async def test_save_meals__bounds_chunks_in_flight(mock_apply_deltas):
+    lock = threading.Lock()
+    in_flight = 0
+    most_in_flight = 0
+
+    def slow_batch_put(model, chunk):
+        nonlocal in_flight, most_in_flight
+        with lock:
+            in_flight += 1
+            most_in_flight = max(most_in_flight, in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight -= 1
+        return []
+
+    requests = [
+        MealCreate(meal_type="Lunch", date_time=meal.date_time, foods=[])
+        for meal in make_meals(500)
+    ]
+    with patch("meals.repository.batch_put", slow_batch_put):
+        errors = await save_meals("test-user", requests)
+
+    assert errors == [None] * 500
+    assert most_in_flight == BATCH_WRITE_MAX_CONCURRENCY
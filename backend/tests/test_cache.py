@@ -0,0 +1,125 @@
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from pynamodb.exceptions import PutError
+from botocore.exceptions import ClientError
+
+from dto.food_create import FoodCreate
+from dto.preferences_update import PreferencesUpdate
+from foods import repository as foods_repository
+from foods.food import MbdFood, MbdFoodList
+from preferences import repository as preferences_repository
+from preferences.preferences import MbdPreferences
+from shared.cache import InMemoryCache, ModelCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_in_memory_cache__expires_entries_after_ttl():
+    clock = FakeClock()
+    cache = InMemoryCache(clock=clock)
+
+    cache.set("key", "value", ttl_seconds=10)
+    clock.now = 9.9
+    assert cache.get("key") == "value"
+
+    clock.now = 10
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_in_memory_cache__evicts_least_recently_used():
+    cache = InMemoryCache(max_entries=2)
+
+    cache.set("a", "1", ttl_seconds=60)
+    cache.set("b", "2", ttl_seconds=60)
+    cache.get("a")
+    cache.set("c", "3", ttl_seconds=60)
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_model_cache__reads_through_and_counts_hits_and_misses():
+    cache = ModelCache(MbdPreferences, backend=InMemoryCache(), ttl_seconds=60)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return MbdPreferences(user_id="test-user", default_meal_times=["8:00"])
+
+    first = cache.get("test-user", load)
+    second = cache.get("test-user", load)
+
+    assert len(loads) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1}
+    # Every read gets its own copy
+    assert second is not first
+    assert second.default_meal_times == ["8:00"]
+    assert second.use_thumbnails is True
+
+
+@pytest.fixture
+def memory_caches():
+    with patch.object(
+        preferences_repository.preferences_cache, "_backend", InMemoryCache()
+    ), patch.object(foods_repository.food_list_cache, "_backend", InMemoryCache()):
+        yield
+
+
+@patch.object(MbdPreferences, "update")
+@patch.object(MbdPreferences, "get")
+async def test_preferences__cached_until_updated(mock_get, mock_update, memory_caches):
+    mock_get.return_value = MbdPreferences(user_id="test-user")
+
+    await preferences_repository.get_preferences("test-user")
+    await preferences_repository.get_preferences("test-user")
+    assert mock_get.call_count == 1
+
+    # Updating doesn't read, and invalidates the cached copy
+    await preferences_repository.update_preferences(
+        "test-user", PreferencesUpdate(defaultMealTimes=["7:30"], useThumbnails=False)
+    )
+    assert mock_get.call_count == 1
+    mock_update.assert_called_once()
+
+    await preferences_repository.get_preferences("test-user")
+    assert mock_get.call_count == 2
+
+
+@patch.object(MbdFoodList, "save")
+@patch.object(MbdFoodList, "get")
+async def test_add_food__retries_from_database_when_cached_list_is_stale(
+    mock_get, mock_save, memory_caches
+):
+    oats = MbdFood(food_id=str(uuid4()), name="Oats", thumbnail="🥣")
+    mock_get.return_value = MbdFoodList(user_id="test-user", foods=[oats], version=1)
+
+    # Warm the cache
+    await foods_repository.get_food_catalog("test-user")
+
+    # Another worker has saved a newer version since
+    mock_get.return_value = MbdFoodList(user_id="test-user", foods=[oats], version=2)
+    mock_save.side_effect = [
+        PutError(
+            cause=ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"
+            )
+        ),
+        None,
+    ]
+
+    await foods_repository.add_food(
+        "test-user", FoodCreate(food_id=str(uuid4()), name="Kiwi", thumbnail="🥝")
+    )
+
+    assert mock_get.call_count == 2
+    assert mock_save.call_count == 2
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+
+def test_importing_handler_does_not_load_database_clients():
+    """The Lambda entry point must stay light; PynamoDB loads on first use."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, main; main.handler;"
+            " print(sorted(m for m in ('pynamodb', 'botocore') if m in sys.modules))",
+        ],
+        cwd=APP_DIR,
+        env={
+            **os.environ,
+            "PYTHONPATH": str(APP_DIR),
+            "CORS_ALLOWED_ORIGINS": "http://localhost:3000",
+        },
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"
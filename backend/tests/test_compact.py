@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from foods.food import MbdFood
+from meals.compact import CompactMeals, parse_timestamp, to_timestamp
+from meals.meal import MbdMeal
+
+START = datetime(2025, 1, 1, 8, 30, 15, 123456, tzinfo=timezone.utc)
+OATS = MbdFood(food_id=str(uuid4()), name="Oats", thumbnail="🥣")
+TEA = MbdFood(food_id=str(uuid4()), name="Tea", thumbnail="🍵")
+
+
+def build_meals():
+    return [
+        MbdMeal(
+            user_id="test-user",
+            meal_type="Breakfast",
+            date_time=START + timedelta(days=day),
+            foods=[OATS, TEA] if day % 2 == 0 else [TEA],
+        )
+        for day in range(4)
+    ]
+
+
+def test_decode__matches_the_models():
+    meals = build_meals()
+
+    compact = CompactMeals.decode(meal.serialize() for meal in meals)
+
+    assert len(compact) == 4
+    for meal, compact_meal in zip(meals, compact):
+        assert compact_meal.date_time == meal.date_time
+        assert compact_meal.meal_type == meal.meal_type
+        assert [(f.food_id, f.name, f.thumbnail) for f in compact_meal.foods] == [
+            (f.food_id, f.name, f.thumbnail) for f in meal.foods
+        ]
+    assert CompactMeals.from_meals(meals)[3] == compact[3]
+
+
+def test_decode__shares_foods_and_food_lists():
+    compact = CompactMeals.decode(meal.serialize() for meal in build_meals())
+
+    assert compact.foods[0] is compact.foods[2]
+    assert compact.foods[0][1] is compact.foods[1][0]
+    assert compact.timestamps.typecode == "q"
+
+
+def test_decode__allows_projected_items():
+    item = {"date_time": {"S": "2025-01-01T08:00:00.000000+0000"}}
+
+    meal = CompactMeals.decode([item])[0]
+
+    assert meal.meal_type is None
+    assert meal.foods == ()
+
+
+def test_parse_timestamp():
+    for date_time in (START, datetime(1969, 12, 31, 23, 59, tzinfo=timezone.utc)):
+        serialized = MbdMeal.date_time.serialize(date_time)
+        assert parse_timestamp(serialized) == to_timestamp(date_time)
+
+    # Other offsets take the slow path
+    assert parse_timestamp("2025-01-01T09:30:15.123456+0100") == to_timestamp(START)
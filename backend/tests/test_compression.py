@@ -0,0 +1,116 @@
+import gzip
+import json
+import zlib
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from shared.compression import (
+    CompressionMiddleware,
+    GzipCompressor,
+    accepted_encoding,
+    brotli_available,
+    compressor_factories,
+)
+
+LARGE = {"foods": [{"name": "Kiwi", "thumbnail": "🥝"}] * 100}
+
+
+def build_client(**options) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, encodings="gzip", **options)
+
+    @app.get("/large")
+    async def large() -> dict:
+        return LARGE
+
+    @app.get("/small")
+    async def small() -> dict:
+        return {"ok": True}
+
+    @app.get("/image")
+    async def image() -> Response:
+        return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+    @app.get("/stream")
+    async def stream() -> StreamingResponse:
+        async def chunks():
+            for i in range(3):
+                yield f'{{"line": {i}}}\n'
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+
+def get_raw(client, path, accept_encoding="gzip"):
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as r:
+        return r, b"".join(r.iter_raw())
+
+
+def test_large_json_is_compressed():
+    response, body = get_raw(build_client(), "/large")
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert int(response.headers["Content-Length"]) == len(body)
+    plain = gzip.decompress(body)
+    assert json.loads(plain) == LARGE
+    assert len(body) < len(plain) / 10
+
+
+def test_small_and_binary_responses_are_left_alone():
+    client = build_client()
+
+    for path in ("/small", "/image"):
+        response, _ = get_raw(client, path)
+        assert "Content-Encoding" not in response.headers
+
+    response, _ = get_raw(build_client(minimum_size=1), "/small")
+    assert response.headers["Content-Encoding"] == "gzip"
+
+
+def test_clients_that_refuse_gzip_get_it_plain():
+    client = build_client()
+
+    for accept_encoding in ("identity", "gzip;q=0", ""):
+        response, body = get_raw(client, "/large", accept_encoding)
+        assert "Content-Encoding" not in response.headers
+        assert json.loads(body) == LARGE
+
+
+def test_streamed_responses_are_compressed_chunk_by_chunk():
+    response, body = get_raw(build_client(), "/stream")
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert gzip.decompress(body) == b"".join(
+        f'{{"line": {i}}}\n'.encode() for i in range(3)
+    )
+
+
+def test_gzip_compressor__flushed_chunks_decode_as_they_arrive():
+    compressor = GzipCompressor(6)
+    decompressor = zlib.decompressobj(31)
+
+    for chunk in (b"first\n", b"second\n"):
+        compressed = compressor.compress(chunk) + compressor.flush()
+        assert decompressor.decompress(compressed) == chunk
+
+    decompressor.decompress(compressor.finish())
+    assert decompressor.eof
+
+
+def test_accepted_encoding__prefers_server_order_and_honours_q():
+    assert accepted_encoding("gzip, br", ["br", "gzip"]) == "br"
+    assert accepted_encoding("br;q=0, gzip", ["br", "gzip"]) == "gzip"
+    assert accepted_encoding("*", ["br", "gzip"]) == "br"
+    assert accepted_encoding("deflate", ["br", "gzip"]) is None
+
+
+@pytest.mark.skipif(brotli_available(), reason="brotli is installed")
+def test_brotli_needs_its_package():
+    with pytest.raises(RuntimeError):
+        compressor_factories("br,gzip")
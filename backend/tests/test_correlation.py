@@ -0,0 +1,71 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from shared.correlation import CorrelationIdMiddleware, correlation_id_var
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def build_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CorrelationIdMiddleware)
+
+    @app.get("/ok")
+    async def ok() -> dict:
+        logger.info("Handling request")
+        return {"correlation_id": correlation_id_var.get()}
+
+    @app.get("/fail")
+    async def fail() -> dict:
+        raise RuntimeError("Boom")
+
+    @app.get("/stream")
+    async def stream() -> StreamingResponse:
+        async def chunks():
+            for i in range(3):
+                yield f"{i}\n"
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_middleware__echoes_client_correlation_id_into_logs(caplog):
+    caplog.set_level(logging.INFO, logger="uvicorn.error")
+
+    response = build_client().get("/ok", headers={"X-Correlation-ID": "abc-123"})
+
+    assert response.headers["X-Correlation-ID"] == "abc-123"
+    assert response.json() == {"correlation_id": "abc-123"}
+    record = next(r for r in caplog.records if r.message == "Handling request")
+    assert record.correlation_id == "abc-123"
+    assert correlation_id_var.get() is None
+
+
+def test_middleware__generates_correlation_id_when_missing_or_invalid():
+    client = build_client()
+
+    generated = client.get("/ok").headers["X-Correlation-ID"]
+    replaced = client.get("/ok", headers={"X-Correlation-ID": "x" * 500})
+
+    assert len(generated) == 36
+    assert len(replaced.headers["X-Correlation-ID"]) == 36
+
+
+def test_middleware__returns_500_with_correlation_id_on_unhandled_error(caplog):
+    response = build_client().get("/fail", headers={"X-Correlation-ID": "abc-123"})
+
+    assert response.status_code == 500
+    assert response.headers["X-Correlation-ID"] == "abc-123"
+    assert "internal server error" in response.json()["detail"]
+    assert any("RuntimeError: Boom" in r.message for r in caplog.records)
+
+
+def test_middleware__passes_streaming_responses_through():
+    response = build_client().get("/stream")
+
+    assert response.text == "0\n1\n2\n"
+    assert "X-Correlation-ID" in response.headers
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+
+from foods.food import MbdFood
+from insights.correlations import compute_correlations, parse_windows
+from meals.compact import CompactMeals
+from meals.meal import MbdMeal
+from symptoms.symptoms import MbdSymptomsEntry
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+DAIRY = MbdFood(food_id=str(uuid4()), name="Milk", thumbnail="🥛")
+RICE = MbdFood(food_id=str(uuid4()), name="Rice", thumbnail="🍚")
+
+
+def meal(hours, *foods):
+    return MbdMeal(
+        user_id="test-user",
+        meal_type="Lunch",
+        date_time=START + timedelta(hours=hours),
+        foods=list(foods),
+    )
+
+
+def symptoms_entry(hours, *symptoms):
+    return MbdSymptomsEntry(
+        user_id="test-user",
+        date_time=START + timedelta(hours=hours),
+        symptoms=list(symptoms),
+    )
+
+
+def build_history():
+    # Milk is followed by bloating 2 hours later, every other day; rice never is
+    meals = []
+    symptoms_entries = []
+    for day in range(10):
+        hours = day * 24
+        if day % 2 == 0:
+            meals.append(meal(hours + 8, DAIRY))
+            symptoms_entries.append(symptoms_entry(hours + 10, "Bloating"))
+        else:
+            meals.append(meal(hours + 8, RICE))
+    return meals, symptoms_entries
+
+
+def test_compute_correlations__scores_lift_and_confidence_per_window():
+    meals, symptoms_entries = build_history()
+
+    correlations = compute_correlations(
+        meals, symptoms_entries, windows=[(0, 6), (6, 24)]
+    )
+
+    # Only the milk -> bloating pair co-occurs, and only within 0-6 hours
+    assert len(correlations) == 1
+    correlation = correlations[0]
+    assert correlation.food_id == DAIRY.food_id
+    assert correlation.symptom == "Bloating"
+    assert (correlation.min_lag_hours, correlation.max_lag_hours) == (0, 6)
+    assert correlation.occurrences == 5
+    assert correlation.co_occurrences == 5
+    assert correlation.confidence == 1.0
+    # Bloating follows half of all meals
+    assert correlation.lift == 2.0
+
+
+def test_compute_correlations__windows_are_half_open():
+    meals = [meal(0, DAIRY), meal(24, DAIRY), meal(48, DAIRY)]
+    symptoms_entries = [symptoms_entry(6, "Gas"), symptoms_entry(29, "Gas")]
+
+    correlations = compute_correlations(meals, symptoms_entries, windows=[(0, 6)])
+
+    assert [(c.co_occurrences, c.occurrences) for c in correlations] == [(1, 3)]
+
+
+def test_compute_correlations__skips_rare_foods():
+    meals, symptoms_entries = build_history()
+
+    assert compute_correlations(meals, symptoms_entries, min_occurrences=6) == []
+    assert compute_correlations([], []) == []
+
+
+def test_compute_correlations__meals_without_symptoms():
+    meals, _ = build_history()
+
+    assert compute_correlations(meals, []) == []
+    assert compute_correlations(CompactMeals.from_meals(meals), []) == []
+
+
+def test_parse_windows():
+    assert parse_windows("0-6, 6-24") == ((0, 6), (6, 24))
+    for invalid in ["", "6-6", "6-0", "-1-3", "a-b"]:
+        with pytest.raises(ValueError):
+            parse_windows(invalid)
+
+
+@patch.object(MbdSymptomsEntry, "query")
+@patch.object(MbdMeal, "query_raw")
+async def test_get_correlations(
+    mock_meal_query, mock_symptoms_query, client, mock_get_user_id
+):
+    meals, symptoms_entries = build_history()
+    # Meals are decoded from the wire format
+    mock_meal_query.return_value = [meal.serialize() for meal in meals]
+    mock_symptoms_query.return_value = symptoms_entries
+
+    response = client.get(
+        "/insights/correlations?windows=0-6&days=30",
+        headers={"Authorization": "Bearer test-token"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "food_id": DAIRY.food_id,
+            "food_name": "Milk",
+            "symptom": "Bloating",
+            "min_lag_hours": 0,
+            "max_lag_hours": 6,
+            "occurrences": 5,
+            "co_occurrences": 5,
+            "confidence": 1.0,
+            "lift": 2.0,
+        }
+    ]
+    assert mock_meal_query.call_args.kwargs["range_key_condition"] is not None
+
+    response = client.get(
+        "/insights/correlations?windows=6-0",
+        headers={"Authorization": "Bearer test-token"},
+    )
+    assert response.status_code == 400
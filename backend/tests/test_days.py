@@ -0,0 +1,84 @@
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import patch
+
+from foods.suggested import get_yesterday_start_and_end
+from preferences.preferences import MbdPreferences
+from shared.days import LocalDays, day_bounds
+
+HEADERS = {"Authorization": "Bearer test-token"}
+# Still the 31st in Los Angeles, already the 1st in Tokyo
+NOW = datetime(2025, 1, 1, 3, tzinfo=timezone.utc)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_day_bounds__follow_daylight_saving():
+    start, end = day_bounds("America/Los_Angeles", date(2025, 3, 9))
+
+    assert start == utc(2025, 3, 9, 8)
+    assert end - start == timedelta(hours=23)
+
+
+def test_local_days__today_depends_on_the_zone():
+    assert LocalDays("America/Los_Angeles", NOW).today == date(2024, 12, 31)
+    assert LocalDays("Asia/Tokyo", NOW).today == date(2025, 1, 1)
+
+
+def test_local_days__windows_meet_without_overlapping():
+    local_days = LocalDays("Asia/Tokyo", NOW)
+
+    newer_start, newer_end = local_days.window(3)
+    older_start, older_end = local_days.window(2, offset=3)
+
+    assert newer_end == utc(2025, 1, 1, 15)
+    assert newer_start == utc(2024, 12, 29, 15)
+    assert older_end == newer_start
+    assert older_start == utc(2024, 12, 27, 15)
+    assert local_days.window(0) == (newer_end, newer_end)
+
+
+def test_yesterday_is_the_users_yesterday():
+    # Previously the user's date, but midnight UTC
+    assert get_yesterday_start_and_end("Asia/Tokyo", NOW) == (
+        utc(2024, 12, 30, 15),
+        utc(2024, 12, 31, 15),
+    )
+
+
+@patch("meals.repository.get_meals_between", return_value=[])
+async def test_get_meal_history__uses_the_users_days(
+    mock_get_meals_between, client, mock_get_user_id, mock_user_timezone
+):
+    mock_user_timezone.return_value = "Asia/Tokyo"
+
+    with patch("shared.days.datetime") as mock_datetime:
+        mock_datetime.now.return_value = NOW
+        mock_datetime.combine = datetime.combine
+        response = client.get("/meals/history?days=2&offset=1", headers=HEADERS)
+
+    assert response.status_code == 200
+    mock_get_meals_between.assert_called_once_with(
+        "test-user", utc(2024, 12, 29, 15), utc(2024, 12, 31, 15), None
+    )
+
+
+@patch.object(MbdPreferences, "update")
+def test_update_preferences__sets_the_timezone(mock_update, client, mock_get_user_id):
+    body = {"defaultMealTimes": ["8:00"], "useThumbnails": True}
+
+    response = client.post(
+        "/preferences", headers=HEADERS, json={**body, "timezone": "Europe/Paris"}
+    )
+    assert response.status_code == 200
+    assert len(mock_update.call_args.kwargs["actions"]) == 4
+
+    # Clients that don't send one leave it alone
+    client.post("/preferences", headers=HEADERS, json=body)
+    assert len(mock_update.call_args.kwargs["actions"]) == 3
+
+    response = client.post(
+        "/preferences", headers=HEADERS, json={**body, "timezone": "Mars/Olympus"}
+    )
+    assert response.status_code == 422
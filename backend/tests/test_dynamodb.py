@@ -0,0 +1,140 @@
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import botocore.session
+import pytest
+
+from aggregates.aggregates import MbdUserAggregate
+from foods.food import MbdFoodList, MbdUserFood
+from meals.meal import MbdMeal
+from preferences.preferences import MbdPreferences
+from shared.dynamodb import get_connection
+from shared.idempotency_store import MbdIdempotencyKey
+from symptoms.symptoms import MbdSymptomsEntry
+
+TABLES = {
+    MbdMeal: "mbd_meals",
+    MbdFoodList: "mbd_foods",
+    MbdUserFood: "mbd_user_foods",
+    MbdPreferences: "mbd_user_preferences",
+    MbdSymptomsEntry: "mbd_symptoms",
+    MbdUserAggregate: "mbd_user_aggregates",
+    MbdIdempotencyKey: "mbd_idempotency_keys",
+}
+
+MEAL_ITEM = {
+    "user_id": {"S": "test-user"},
+    "date_time": {"S": "2025-01-01T08:00:00.000000+0000"},
+    "meal_type": {"S": "Breakfast"},
+    "foods": {"L": []},
+}
+
+
+def fake_dynamodb_call(client, operation_name, operation_kwargs):
+    if operation_name == "Query":
+        return {"Items": [], "Count": 0, "ScannedCount": 0}
+    if operation_name == "GetItem" and operation_kwargs["TableName"] == "mbd_meals":
+        return {"Item": MEAL_ITEM}
+    if operation_name == "UpdateItem":
+        return {"Attributes": operation_kwargs["Key"]}
+    return {}
+
+
+@pytest.fixture
+def created_clients(mock_aws_credentials):
+    """Fakes DynamoDB at the botocore client and records every client created."""
+    created = []
+    create_client = botocore.session.Session.create_client
+
+    def recording_create_client(session, service_name, *args, **kwargs):
+        created.append(service_name)
+        return create_client(session, service_name, *args, **kwargs)
+
+    with ExitStack() as stack:
+        for model, table_name in TABLES.items():
+            stack.enter_context(patch.object(model.Meta, "table_name", table_name))
+            stack.enter_context(patch.object(model, "_connection", None))
+        stack.enter_context(
+            patch.object(
+                botocore.session.Session, "create_client", recording_create_client
+            )
+        )
+        stack.enter_context(
+            patch(
+                "botocore.client.BaseClient._make_api_call",
+                autospec=True,
+                side_effect=fake_dynamodb_call,
+            )
+        )
+        get_connection.cache_clear()
+        yield created
+        get_connection.cache_clear()
+
+
+def test_models_share_one_connection(created_clients):
+    connection = get_connection()
+
+    for model in TABLES:
+        assert model._get_connection().connection is connection
+
+
+def test_request_paths_reuse_one_client(client, mock_get_user_id, created_clients):
+    headers = {"Authorization": "Bearer test-token"}
+    meal = {
+        "meal_type": "Breakfast",
+        "date_time": "2025-01-01T08:00:00+00:00",
+        "foods": [],
+    }
+
+    for _ in range(2):
+        assert client.get("/preferences", headers=headers).status_code == 200
+        assert (
+            client.post(
+                "/preferences",
+                headers=headers,
+                json={"defaultMealTimes": ["8:00"], "useThumbnails": False},
+            ).status_code
+            == 200
+        )
+        assert client.get("/foods", headers=headers).status_code == 200
+        assert client.post("/meals", headers=headers, json=meal).status_code == 200
+        assert (
+            client.put(
+                "/meals",
+                headers=headers,
+                json={
+                    **meal,
+                    "date_time": "2025-01-01T09:00:00+00:00",
+                    "original_date_time": meal["date_time"],
+                },
+            ).status_code
+            == 200
+        )
+        assert client.get("/meals/history", headers=headers).status_code == 200
+        assert client.get("/symptoms/history", headers=headers).status_code == 200
+        assert client.get("/foods/suggested/Lunch", headers=headers).status_code == 200
+
+    assert created_clients == ["dynamodb"]
+
+
+@patch.object(MbdUserAggregate, "query")
+def test_query_projected__reads_the_range_key_too(mock_query):
+    MbdUserAggregate.query_projected(
+        hash_key="test-user",
+        filter_condition=MbdUserAggregate.meal_count > 0,
+        attributes=(MbdUserAggregate.meal_count,),
+        limit=10,
+    )
+
+    _, kwargs = mock_query.call_args
+    assert kwargs["attributes_to_get"] == ["aggregate", "meal_count"]
+    assert kwargs["filter_condition"] is not None
+    assert kwargs["limit"] == 10
+
+
+@patch.object(MbdMeal, "query")
+def test_query_projected__reads_everything_without_attributes(mock_query):
+    MbdMeal.query_projected(hash_key="test-user")
+
+    _, kwargs = mock_query.call_args
+    assert kwargs["attributes_to_get"] is None
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from foods.food import MbdFood, MbdFoodList
+from meals.meal import MbdMeal
+from preferences.preferences import MbdPreferences
+from shared.etag import content_etag, etag_matches, version_etag
+from shared.responses import dumps
+
+HEADERS = {"Authorization": "Bearer test-token"}
+
+
+def test_etag_matches__uses_weak_comparison():
+    etag = version_etag("foods", "test-user", 3)
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag.removeprefix("W/"), etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(version_etag("foods", "test-user", 4), etag)
+
+
+def test_version_etag__differs_between_users():
+    assert version_etag("foods", "user-1", 1) != version_etag("foods", "user-2", 1)
+
+
+@patch("preferences.repository.MbdPreferences.get")
+def test_get_preferences__returns_not_modified_for_current_version(
+    mock_get, client, mock_get_user_id
+):
+    mock_get.return_value = MbdPreferences(user_id="test-user", version=3)
+
+    first = client.get("/preferences", headers=HEADERS)
+    etag = first.headers["ETag"]
+    second = client.get("/preferences", headers={**HEADERS, "If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["ETag"] == etag
+
+    mock_get.return_value = MbdPreferences(user_id="test-user", version=4)
+    third = client.get("/preferences", headers={**HEADERS, "If-None-Match": etag})
+
+    assert third.status_code == 200
+    assert third.headers["ETag"] != etag
+
+
+@patch("preferences.repository.MbdPreferences.get")
+def test_get_preferences__etags_from_before_timezones_are_stale(
+    mock_get, client, mock_get_user_id
+):
+    mock_get.return_value = MbdPreferences(user_id="test-user", version=3)
+    old_etag = version_etag("preferences", "test-user", 3)
+
+    response = client.get("/preferences", headers={**HEADERS, "If-None-Match": old_etag})
+
+    assert response.status_code == 200
+    assert response.json()["timezone"] == "America/Los_Angeles"
+
+
+@patch("foods.repository.MbdFoodList.get")
+def test_get_foods__validates_from_list_version(mock_get, client, mock_get_user_id):
+    food = MbdFood(food_id="food-1", name="Oats", thumbnail="🥣")
+    mock_get.return_value = MbdFoodList(user_id="test-user", foods=[food], version=7)
+
+    etag = client.get("/foods", headers=HEADERS).headers["ETag"]
+
+    assert etag == version_etag("foods", "test-user", 7)
+    response = client.get("/foods", headers={**HEADERS, "If-None-Match": etag})
+    assert response.status_code == 304
+
+
+@patch("meals.repository.MbdMeal.query")
+def test_get_meal_history__validates_from_content(mock_query, client, mock_get_user_id):
+    meal = MbdMeal(
+        user_id="test-user",
+        date_time=datetime.now(timezone.utc) - timedelta(hours=1),
+        meal_type="Breakfast",
+        foods=[],
+    )
+    mock_query.return_value = [meal]
+
+    first = client.get("/meals/history", headers=HEADERS)
+    assert first.headers["ETag"] == content_etag(dumps([meal.to_dto()]), None)
+
+    mock_query.return_value = [meal]
+    second = client.get(
+        "/meals/history", headers={**HEADERS, "If-None-Match": first.headers["ETag"]}
+    )
+    assert second.status_code == 304
+
+    meal.meal_type = "Lunch"
+    mock_query.return_value = [meal]
+    third = client.get(
+        "/meals/history", headers={**HEADERS, "If-None-Match": first.headers["ETag"]}
+    )
+    assert third.status_code == 200
+    assert third.json()[0]["meal_type"] == "Lunch"
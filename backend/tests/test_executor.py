@@ -0,0 +1,55 @@
+import asyncio
+import contextvars
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+
+from app.main import app
+from preferences.preferences import MbdPreferences
+from shared.executor import run_blocking
+
+request_var = contextvars.ContextVar("request_var", default=None)
+
+
+async def test_run_blocking__runs_off_the_event_loop_thread():
+    loop_thread = threading.get_ident()
+
+    worker_thread = await run_blocking(threading.get_ident)
+
+    assert worker_thread != loop_thread
+
+
+async def test_run_blocking__propagates_context_variables():
+    request_var.set("abc-123")
+
+    value = await run_blocking(request_var.get)
+
+    assert value == "abc-123"
+
+
+@patch("preferences.repository.MbdPreferences.get")
+async def test_slow_database_calls_do_not_serialize_requests(
+    mock_get, mock_get_user_id
+):
+    def slow_get(user_id):
+        time.sleep(0.2)
+        raise MbdPreferences.DoesNotExist()
+
+    mock_get.side_effect = slow_get
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *[
+                client.get("/preferences", headers={"Authorization": "Bearer test"})
+                for _ in range(5)
+            ]
+        )
+        elapsed = time.perf_counter() - start
+
+    assert all(response.status_code == 200 for response in responses)
+    # Five 200ms calls run back to back would take a full second
+    assert elapsed < 0.6
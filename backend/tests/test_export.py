@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+
+from foods.food import MbdFood
+from meals.meal import MbdMeal
+from symptoms.symptoms import MbdSymptomsEntry
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def query_results(*pages):
+    """Mock PynamoDB query results, returned one page per query call."""
+    results = []
+    for i, page in enumerate(pages):
+        result = MagicMock()
+        result.__iter__.return_value = iter(page)
+        result.last_evaluated_key = None if i == len(pages) - 1 else {"page": i}
+        results.append(result)
+    return results
+
+
+def meal(hours, meal_type="Lunch"):
+    return MbdMeal(
+        user_id="test-user",
+        meal_type=meal_type,
+        date_time=START + timedelta(hours=hours),
+        foods=[MbdFood(food_id=str(uuid4()), name="Oats, rolled", thumbnail="🥣")],
+    )
+
+
+def symptoms_entry(hours):
+    return MbdSymptomsEntry(
+        user_id="test-user",
+        date_time=START + timedelta(hours=hours),
+        symptoms=["Bloating", "Gas"],
+    )
+
+
+@patch.object(MbdSymptomsEntry, "query")
+@patch.object(MbdMeal, "query")
+async def test_export__streams_ndjson_merged_oldest_first(
+    mock_meal_query, mock_symptoms_query, client, mock_get_user_id
+):
+    mock_meal_query.side_effect = query_results([meal(1), meal(3)], [meal(5)])
+    mock_symptoms_query.side_effect = query_results([symptoms_entry(2)])
+
+    response = client.get("/export", headers={"Authorization": "Bearer test-token"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [(record["type"], record["date_time"]) for record in records] == [
+        ("meal", (START + timedelta(hours=1)).isoformat()),
+        ("symptoms", (START + timedelta(hours=2)).isoformat()),
+        ("meal", (START + timedelta(hours=3)).isoformat()),
+        ("meal", (START + timedelta(hours=5)).isoformat()),
+    ]
+    assert records[1]["symptoms"] == ["Bloating", "Gas"]
+
+    # Meals were read a page at a time, resuming from the last key
+    assert mock_meal_query.call_count == 2
+    assert mock_meal_query.call_args.kwargs["last_evaluated_key"] == {"page": 0}
+
+
+@patch.object(MbdSymptomsEntry, "query")
+@patch.object(MbdMeal, "query")
+async def test_export__streams_csv(
+    mock_meal_query, mock_symptoms_query, client, mock_get_user_id
+):
+    mock_meal_query.side_effect = query_results([meal(1, "Breakfast")])
+    mock_symptoms_query.side_effect = query_results([symptoms_entry(2)])
+
+    response = client.get(
+        "/export?format=csv", headers={"Authorization": "Bearer test-token"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="journal.csv"' in response.headers["content-disposition"]
+    assert response.text.splitlines() == [
+        "type,date_time,meal_type,foods,symptoms",
+        f'meal,{(START + timedelta(hours=1)).isoformat()},Breakfast,"Oats, rolled",',
+        f"symptoms,{(START + timedelta(hours=2)).isoformat()},,,Bloating; Gas",
+    ]
@@ -0,0 +1,48 @@
+from uuid import uuid4
+
+from foods.catalog import FoodCatalog
+from foods.food import MbdFood, MbdFoodList
+
+
+def create_food(name, thumbnail="🍎", food_id=None):
+    return MbdFood(food_id=food_id or str(uuid4()), name=name, thumbnail=thumbnail)
+
+
+def test_food_catalog__looks_up_by_id_and_name_ignoring_case():
+    oats = create_food("Oats", "🥣")
+    banana = create_food("Banana", "🍌")
+    catalog = FoodCatalog(MbdFoodList(user_id="test-user", foods=[oats, banana]))
+
+    assert len(catalog) == 2
+    assert catalog.get(banana.food_id) is banana
+    assert catalog.get(str(uuid4())) is None
+    assert catalog.find_by_name("OATS") is oats
+    assert catalog.find_by_name("Kiwi") is None
+
+
+def test_food_catalog__upsert_appends_new_foods():
+    oats = create_food("Oats", "🥣")
+    food_list = MbdFoodList(user_id="test-user", foods=[oats])
+    catalog = FoodCatalog(food_list)
+
+    kiwi = create_food("Kiwi", "🥝")
+    catalog.upsert(kiwi)
+
+    assert food_list.foods == [oats, kiwi]
+    assert catalog.find_by_name("kiwi") is kiwi
+
+
+def test_food_catalog__upsert_replaces_food_with_same_id():
+    oats = create_food("Oats", "🥣")
+    banana = create_food("Banana", "🍌")
+    food_list = MbdFoodList(user_id="test-user", foods=[oats, banana])
+    catalog = FoodCatalog(food_list)
+
+    porridge = create_food("Porridge", "🥣", food_id=oats.food_id)
+    catalog.upsert(porridge)
+
+    # Replaced foods move to the end, as if newly added
+    assert food_list.foods == [banana, porridge]
+    assert catalog.get(oats.food_id) is porridge
+    assert catalog.find_by_name("Oats") is None
+    assert catalog.find_by_name("Porridge") is porridge
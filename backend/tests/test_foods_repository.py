@@ -0,0 +1,79 @@
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from botocore.exceptions import ClientError
+from pynamodb.exceptions import PutError
+
+from dto.food_create import FoodCreate
+from foods import repository as foods_repository
+from foods.food import MbdFood, MbdFoodList, MbdUserFood
+from foods.migrate import migrate_food_list
+from shared.exceptions import MbdException
+
+
+def create_food(name, thumbnail="🍎"):
+    return MbdFood(food_id=str(uuid4()), name=name, thumbnail=thumbnail)
+
+
+@pytest.fixture
+def items_storage_mode():
+    with patch.object(foods_repository, "FOODS_STORAGE_MODE", "items"):
+        yield
+
+
+@patch("foods.repository.MbdFoodList.get")
+@patch.object(MbdUserFood, "save")
+@patch.object(MbdUserFood.name_index, "query")
+async def test_add_food__items_mode_writes_one_item(
+    mock_name_query, mock_save, mock_list_get, items_storage_mode
+):
+    mock_name_query.return_value = iter([])
+    kiwi = create_food("Kiwi", "🥝")
+
+    await foods_repository.add_food("test-user", FoodCreate(**kiwi.to_dto()))
+
+    # Only the name lookup and a single put, never the whole catalog
+    _, kwargs = mock_name_query.call_args
+    assert kwargs["limit"] == 1
+    mock_save.assert_called_once()
+    mock_list_get.assert_not_called()
+
+
+@patch.object(MbdUserFood, "save")
+@patch.object(MbdUserFood.name_index, "query")
+async def test_add_food__items_mode_rejects_duplicate_name(
+    mock_name_query, mock_save, items_storage_mode
+):
+    existing = MbdUserFood.from_food("test-user", create_food("kiwi"), None)
+    mock_name_query.return_value = iter([existing])
+
+    with pytest.raises(MbdException) as exc_info:
+        await foods_repository.add_food(
+            "test-user", FoodCreate(**create_food("KIWI").to_dto())
+        )
+
+    assert exc_info.value.status_code == 400
+    mock_save.assert_not_called()
+
+
+@patch.object(MbdUserFood, "save")
+def test_migrate_food_list__skips_foods_already_in_new_table(mock_save):
+    oats = create_food("Oats", "🥣")
+    banana = create_food("Banana", "🍌")
+    food_list = MbdFoodList(user_id="test-user", foods=[oats, banana])
+
+    # Banana was already written by the dual-write path
+    already_exists = PutError(
+        cause=ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"
+        )
+    )
+    mock_save.side_effect = [None, already_exists]
+
+    copied = migrate_food_list(food_list)
+
+    assert copied == 1
+    assert mock_save.call_count == 2
+    for call in mock_save.call_args_list:
+        assert call.kwargs["condition"] is not None
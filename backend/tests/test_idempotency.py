@@ -0,0 +1,258 @@
+import hashlib
+import json
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from botocore.exceptions import ClientError
+from pynamodb.exceptions import DeleteError, PutError
+
+from meals.meal import MbdMeal
+from shared import idempotency_store
+from shared.cache import InMemoryCache
+from shared.exceptions import MbdException
+from shared.idempotency import IDEMPOTENCY_LEASE_SECONDS
+from shared.idempotency_store import MbdIdempotencyKey
+
+MEAL = {
+    "meal_type": "Breakfast",
+    "date_time": "2025-01-01T08:00:00+00:00",
+    "foods": [],
+}
+
+
+def conditional_check_failed(error_class, operation):
+    return error_class(
+        "The conditional request failed",
+        cause=ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, operation
+        ),
+    )
+
+
+@pytest.fixture
+def keys():
+    """Fakes the idempotency key table with a dict, and empties the local cache."""
+    items = {}
+
+    def save(record, condition=None):
+        key = (record.user_id, record.idempotency_key)
+        existing = items.get(key)
+        if record.completed:
+            # Only the holder of the lease stores a response
+            if existing is None or existing.lease != record.lease:
+                raise conditional_check_failed(PutError, "PutItem")
+        elif existing is not None and existing.expires_at > datetime.now(timezone.utc):
+            raise conditional_check_failed(PutError, "PutItem")
+        items[key] = record
+
+    def get(user_id, idempotency_key, consistent_read=False):
+        try:
+            return items[(user_id, idempotency_key)]
+        except KeyError:
+            raise MbdIdempotencyKey.DoesNotExist()
+
+    def delete(record, condition=None):
+        key = (record.user_id, record.idempotency_key)
+        # The condition reads "(attribute_not_exists (status_code) AND lease = ...)"
+        lease = {"S": items[key].lease}
+        if items[key].completed or f"lease = {lease}" not in str(condition):
+            raise conditional_check_failed(DeleteError, "DeleteItem")
+        del items[key]
+
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(MbdIdempotencyKey, "save", save))
+        stack.enter_context(patch.object(MbdIdempotencyKey, "get", side_effect=get))
+        stack.enter_context(patch.object(MbdIdempotencyKey, "delete", delete))
+        stack.enter_context(
+            patch.object(idempotency_store, "_responses", InMemoryCache())
+        )
+        yield items
+
+
+@pytest.fixture
+def save_meal():
+    with patch("app.main.meals_repository.save_meal") as mock_save_meal:
+        mock_save_meal.return_value = MbdMeal(
+            user_id="test-user",
+            meal_type=MEAL["meal_type"],
+            date_time=datetime(2025, 1, 1, 8, tzinfo=timezone.utc),
+        )
+        yield mock_save_meal
+
+
+def post_meal(client, key, meal=MEAL):
+    return client.post(
+        "/meals",
+        headers={
+            "Authorization": "Bearer test-token",
+            "Content-Type": "application/json",
+            "Idempotency-Key": key,
+        },
+        content=json.dumps(meal),
+    )
+
+
+def test_retry_is_served_from_the_stored_response(
+    client, mock_get_user_id, keys, save_meal
+):
+    first = post_meal(client, "key-1")
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+    assert keys[("test-user", "key-1")].completed
+
+    # From this worker's cache, then from the table
+    cached = post_meal(client, "key-1")
+    idempotency_store._responses.delete("test-user\nkey-1")
+    stored = post_meal(client, "key-1")
+
+    for retry in (cached, stored):
+        assert retry.status_code == 200
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert retry.json() == first.json()
+    assert save_meal.call_count == 1
+    assert MbdIdempotencyKey.get.call_count == 1
+
+
+def test_key_reused_for_a_different_request_is_rejected(
+    client, mock_get_user_id, keys, save_meal
+):
+    assert post_meal(client, "key-1").status_code == 200
+
+    response = post_meal(client, "key-1", {**MEAL, "meal_type": "Lunch"})
+
+    assert response.status_code == 422
+    assert save_meal.call_count == 1
+
+
+def test_retry_while_in_progress_is_rejected(
+    client, mock_get_user_id, keys, save_meal
+):
+    fingerprint = hashlib.sha256(b"POST /meals\n" + json.dumps(MEAL).encode())
+    idempotency_store.claim(
+        "test-user", "key-1", fingerprint.digest()[:16], "other-lease", 60
+    )
+
+    response = post_meal(client, "key-1")
+
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+    save_meal.assert_not_called()
+
+
+def test_key_of_a_request_that_never_finished_is_taken_over(
+    client, mock_get_user_id, keys, save_meal
+):
+    fingerprint = hashlib.sha256(b"POST /meals\n" + json.dumps(MEAL).encode())
+    idempotency_store.claim(
+        "test-user", "key-1", fingerprint.digest()[:16], "other-lease", 60
+    )
+    # Its Lambda timed out, so it never released the key
+    keys[("test-user", "key-1")].expires_at = datetime.now(timezone.utc) - timedelta(
+        seconds=1
+    )
+
+    response = post_meal(client, "key-1")
+
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+    save_meal.assert_called_once()
+
+
+def test_request_that_lost_its_lease_keeps_its_successors_result(
+    client, mock_get_user_id, keys, save_meal
+):
+    fingerprint = hashlib.sha256(b"POST /meals\n" + json.dumps(MEAL).encode())
+    fingerprint = fingerprint.digest()[:16]
+    idempotency_store.claim("test-user", "key-1", fingerprint, "stale-lease", 60)
+    keys[("test-user", "key-1")].expires_at = datetime.now(timezone.utc) - timedelta(
+        seconds=1
+    )
+    first = post_meal(client, "key-1")
+
+    # The request that timed out finishes after all
+    stored = idempotency_store.complete(
+        "test-user", "key-1", fingerprint, "stale-lease", 500, b"{}", 60
+    )
+    idempotency_store.release("test-user", "key-1", "stale-lease")
+
+    assert not stored
+    record = keys[("test-user", "key-1")]
+    assert (record.status_code, record.response_body()) == (200, first.content)
+
+
+def test_large_responses_are_stored_compressed(keys):
+    body = json.dumps([{"index": i, "status": "saved"} for i in range(20_000)])
+    idempotency_store.claim("test-user", "key-1", b"fingerprint", "lease", 60)
+
+    assert idempotency_store.complete(
+        "test-user", "key-1", b"fingerprint", "lease", 200, body.encode(), 60
+    )
+
+    record = keys[("test-user", "key-1")]
+    assert len(record.body) < idempotency_store.IDEMPOTENCY_MAX_BODY_BYTES < len(body)
+    assert record.response_body() == body.encode()
+
+
+def test_responses_too_large_to_keep_are_not_run_again(
+    client, mock_get_user_id, keys, save_meal
+):
+    with patch.object(idempotency_store, "IDEMPOTENCY_MAX_BODY_BYTES", 10):
+        assert post_meal(client, "key-1").status_code == 200
+    assert keys[("test-user", "key-1")].body is None
+
+    response = post_meal(client, "key-1")
+
+    assert response.status_code == 409
+    assert "too large to keep" in response.json()["detail"][0]
+    save_meal.assert_called_once()
+
+
+def test_keys_are_leased_until_their_request_completes(
+    client, mock_get_user_id, keys, save_meal
+):
+    leases = []
+
+    def save(*args):
+        leases.append(keys[("test-user", "key-1")].expires_at)
+        return save_meal.return_value
+
+    save_meal.side_effect = save
+
+    assert post_meal(client, "key-1").status_code == 200
+
+    now = datetime.now(timezone.utc)
+    assert leases[0] < now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+    assert keys[("test-user", "key-1")].expires_at > now + timedelta(hours=23)
+
+
+def test_failed_request_releases_its_key(client, mock_get_user_id, keys, save_meal):
+    meal = save_meal.return_value
+    save_meal.side_effect = [MbdException(status_code=503, errors=["Try again"]), meal]
+
+    assert post_meal(client, "key-1").status_code == 503
+    assert ("test-user", "key-1") not in keys
+
+    response = post_meal(client, "key-1")
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+    assert save_meal.call_count == 2
+
+
+def test_requests_without_a_key_skip_the_store(
+    client, mock_get_user_id, keys, save_meal
+):
+    for _ in range(2):
+        response = client.post(
+            "/meals", headers={"Authorization": "Bearer test-token"}, json=MEAL
+        )
+        assert response.status_code == 200
+
+    assert save_meal.call_count == 2
+    assert keys == {}
+
+
+def test_invalid_key_is_rejected(client, mock_get_user_id, keys, save_meal):
+    assert post_meal(client, "x" * 256).status_code == 400
+    save_meal.assert_not_called()
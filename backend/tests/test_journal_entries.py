@@ -0,0 +1,162 @@
+from contextlib import ExitStack
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from botocore.exceptions import ClientError
+
+from foods.food import MbdFoodList, MbdUserFood
+from meals.meal import MbdMeal
+from shared.dynamodb import get_connection
+from shared.idempotency_store import MbdIdempotencyKey
+from symptoms.symptoms import MbdSymptomsEntry
+
+HEADERS = {"Authorization": "Bearer test-token"}
+KIWI = {"food_id": str(uuid4()), "name": "Kiwi", "thumbnail": "🥝"}
+ENTRY = {
+    "meal": {
+        "meal_type": "Breakfast",
+        "date_time": "2025-01-01T08:00:00+00:00",
+        "foods": [KIWI],
+    },
+    "symptoms": ["Bloating"],
+    "new_foods": [KIWI],
+}
+MEAL_ITEM = {
+    "user_id": {"S": "test-user"},
+    "date_time": {"S": "2025-01-01T08:00:00.000000+0000"},
+    "meal_type": {"S": "Breakfast"},
+    "foods": {"L": []},
+}
+
+
+def cancelled(*codes):
+    return ClientError(
+        {
+            "Error": {"Code": "TransactionCanceledException"},
+            "CancellationReasons": [{"Code": code} for code in codes],
+        },
+        "TransactWriteItems",
+    )
+
+
+class FakeDynamoDB:
+    def __init__(self):
+        # (operation, kwargs) of every call made
+        self.calls = []
+        # Raised by the next transactions
+        self.cancellations = []
+
+    def transactions(self):
+        return [
+            kwargs
+            for operation, kwargs in self.calls
+            if operation == "TransactWriteItems"
+        ]
+
+
+@pytest.fixture
+def dynamodb(mock_aws_credentials):
+    """Fakes DynamoDB at the botocore client."""
+    fake = FakeDynamoDB()
+
+    def fake_dynamodb_call(client, operation_name, operation_kwargs):
+        fake.calls.append((operation_name, operation_kwargs))
+        if operation_name == "TransactWriteItems" and fake.cancellations:
+            raise fake.cancellations.pop(0)
+        if operation_name == "GetItem" and operation_kwargs["TableName"] == "mbd_meals":
+            return {"Item": MEAL_ITEM}
+        return {}
+
+    with ExitStack() as stack:
+        for model, table_name in (
+            (MbdMeal, "mbd_meals"),
+            (MbdFoodList, "mbd_foods"),
+            (MbdUserFood, "mbd_user_foods"),
+            (MbdSymptomsEntry, "mbd_symptoms"),
+            (MbdIdempotencyKey, "mbd_idempotency_keys"),
+        ):
+            stack.enter_context(patch.object(model.Meta, "table_name", table_name))
+            stack.enter_context(patch.object(model, "_connection", None))
+        stack.enter_context(
+            patch(
+                "botocore.client.BaseClient._make_api_call",
+                autospec=True,
+                side_effect=fake_dynamodb_call,
+            )
+        )
+        stack.enter_context(patch("journal.entries.apply_deltas"))
+        get_connection.cache_clear()
+        yield fake
+        get_connection.cache_clear()
+
+
+def test_journal_entry_is_one_transaction(client, mock_get_user_id, dynamodb):
+    response = client.post("/journal/entries", headers=HEADERS, json=ENTRY)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "meal": {
+            "meal_type": "Breakfast",
+            "date_time": "2025-01-01T08:00:00+00:00",
+            "foods": [KIWI],
+        },
+        "symptoms": {
+            "date_time": "2025-01-01T08:00:00+00:00",
+            "symptoms": ["Bloating"],
+        },
+        "new_foods": [KIWI],
+    }
+
+    [transaction] = dynamodb.transactions()
+    assert [
+        (item["Put"]["TableName"], "ConditionExpression" in item["Put"])
+        for item in transaction["TransactItems"]
+    ] == [("mbd_meals", True), ("mbd_symptoms", True), ("mbd_foods", True)]
+    assert not any(operation == "PutItem" for operation, _ in dynamodb.calls)
+
+
+def test_journal_entry_conflict(client, mock_get_user_id, dynamodb):
+    dynamodb.cancellations.append(cancelled("ConditionalCheckFailed", "None", "None"))
+
+    response = client.post("/journal/entries", headers=HEADERS, json=ENTRY)
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == [
+        "A meal already exists at 2025-01-01T08:00:00+00:00"
+    ]
+    assert len(dynamodb.transactions()) == 1
+
+
+def test_journal_entry_retries_a_stale_food_list(client, mock_get_user_id, dynamodb):
+    dynamodb.cancellations.append(cancelled("None", "None", "ConditionalCheckFailed"))
+
+    response = client.post(
+        "/journal/entries",
+        headers={**HEADERS, "Idempotency-Key": "key-1"},
+        json=ENTRY,
+    )
+
+    assert response.status_code == 200
+    first, retry = dynamodb.transactions()
+    assert "ClientRequestToken" in first
+    assert "ClientRequestToken" not in retry
+
+
+def test_update_meal_conflict(client, mock_get_user_id, dynamodb):
+    dynamodb.cancellations.append(cancelled("None", "ConditionalCheckFailed"))
+
+    response = client.put(
+        "/meals",
+        headers=HEADERS,
+        json={
+            **ENTRY["meal"],
+            "date_time": "2025-01-01T09:00:00+00:00",
+            "original_date_time": ENTRY["meal"]["date_time"],
+        },
+    )
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == [
+        "A meal already exists at 2025-01-01T09:00:00+00:00"
+    ]
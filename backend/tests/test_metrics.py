@@ -0,0 +1,137 @@
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+
+from meals.meal import MbdMeal
+from shared import metrics
+from shared.dynamodb import get_connection
+from shared.metrics import (
+    EmbeddedMetricsExporter,
+    Histogram,
+    InMemoryExporter,
+    RequestStats,
+)
+
+HEADERS = {"Authorization": "Bearer test-token"}
+
+
+def fake_dynamodb_call(client, operation_name, operation_kwargs):
+    if operation_name == "Query":
+        return {
+            "Items": [],
+            "Count": 0,
+            "ScannedCount": 0,
+            "ConsumedCapacity": {"TableName": "mbd_meals", "CapacityUnits": 0.5},
+        }
+    if operation_name == "BatchWriteItem":
+        return {
+            "UnprocessedItems": {},
+            "ConsumedCapacity": [{"TableName": "mbd_meals", "CapacityUnits": 2.0}],
+        }
+    return {}
+
+
+@pytest.fixture
+def exporter(mock_aws_credentials):
+    exporter = InMemoryExporter()
+    with patch.object(MbdMeal.Meta, "table_name", "mbd_meals"), patch.object(
+        MbdMeal, "_connection", None
+    ), patch(
+        "botocore.client.BaseClient._make_api_call",
+        autospec=True,
+        side_effect=fake_dynamodb_call,
+    ), patch.object(metrics, "get_exporter", return_value=exporter):
+        get_connection.cache_clear()
+        yield exporter
+        get_connection.cache_clear()
+
+
+def test_histogram__estimates_quantiles_from_buckets():
+    histogram = Histogram(boundaries=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.05, 0.05, 0.5):
+        histogram.record(value)
+
+    assert histogram.bucket_counts == [1, 2, 1, 0]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.99) == 1.0
+
+
+def test_middleware__records_route_latency_and_dynamodb_usage(
+    exporter, client, mock_get_user_id
+):
+    response = client.get("/meals/history?days=3", headers=HEADERS)
+
+    assert response.status_code == 200
+    [request] = exporter.requests
+    assert (request.method, request.route, request.status_code) == (
+        "GET",
+        "/meals/history",
+        200,
+    )
+    assert request.dynamodb_calls == 1
+    assert request.consumed_capacity == 0.5
+    assert exporter.latency[("GET", "/meals/history")].count == 1
+
+    [call] = exporter.dynamodb_calls
+    assert (call.operation, call.table, call.items, call.error) == (
+        "Query",
+        "mbd_meals",
+        0,
+        False,
+    )
+
+
+def test_record_dynamodb_call__counts_batch_items_and_capacity(exporter):
+    meals = [
+        {"user_id": {"S": "test-user"}, "date_time": {"S": f"2025-01-0{i}"}}
+        for i in range(1, 4)
+    ]
+
+    MbdMeal._get_connection().connection.batch_write_item(
+        table_name="mbd_meals", put_items=meals
+    )
+
+    [call] = exporter.dynamodb_calls
+    assert (call.operation, call.items, call.consumed_capacity) == (
+        "BatchWriteItem",
+        3,
+        2.0,
+    )
+
+
+def test_embedded_metrics_exporter__writes_one_emf_line_per_record():
+    stream = io.StringIO()
+    exporter = EmbeddedMetricsExporter(namespace="Test", stream=stream)
+
+    exporter.record_request(
+        "GET", "/meals/history", 200, 0.25, RequestStats(dynamodb_calls=2)
+    )
+    exporter.record_dynamodb_call("Query", "mbd_meals", 0.01, 0.5, 3, False)
+
+    request, call = [json.loads(line) for line in stream.getvalue().splitlines()]
+    [directive] = request["_aws"]["CloudWatchMetrics"]
+    assert directive["Namespace"] == "Test"
+    assert directive["Dimensions"] == [["Method", "Route"]]
+    # Every metric named in the directive has its value at the top level
+    for metric in directive["Metrics"]:
+        assert metric["Name"] in request
+    assert request["Route"] == "/meals/history"
+    assert request["RequestDuration"] == 250
+    assert request["RequestDynamoDBCalls"] == 2
+    assert request["StatusCode"] == 200
+
+    assert call["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [
+        ["Operation", "Table"]
+    ]
+    assert (call["DynamoDBItems"], call["DynamoDBErrors"]) == (3, 0)
+
+
+def test_get_exporter__defaults_to_embedded_metrics(monkeypatch):
+    monkeypatch.delenv("METRICS_EXPORTER")
+    metrics.get_exporter.cache_clear()
+    try:
+        assert isinstance(metrics.get_exporter(), EmbeddedMetricsExporter)
+    finally:
+        metrics.get_exporter.cache_clear()
@@ -0,0 +1,25 @@
+import json
+from unittest.mock import patch
+
+from shared.responses import FastJSONResponse, dumps
+
+CONTENT = [{"name": "Blueberries", "thumbnail": "🫐", "count": 3, "ratio": 0.5}]
+
+
+def test_dumps__matches_json_response_rendering():
+    expected = json.dumps(CONTENT, ensure_ascii=False, separators=(",", ":")).encode()
+
+    assert dumps(CONTENT) == expected
+    # Without orjson installed
+    with patch("shared.responses.orjson", None):
+        assert dumps(CONTENT) == expected
+
+
+def test_fast_json_response__sends_serialized_content_as_is():
+    body = dumps(CONTENT)
+
+    response = FastJSONResponse(body, headers={"X-Next-Cursor": "abc"})
+
+    assert response.body is body
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["x-next-cursor"] == "abc"
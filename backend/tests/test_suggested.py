@@ -2,10 +2,17 @@ from datetime import datetime, timedelta, timezone
 from unittest.mock import patch, MagicMock
 import pytest
 from uuid import uuid4
+from zoneinfo import ZoneInfo
 
-from foods.food import MbdFood
+from aggregates.aggregates import TOTALS_KEY, MbdUserAggregate, meal_deltas
+from foods.catalog import FoodCatalog
+from foods.food import MbdFood, MbdFoodList
 from meals.meal import MbdMeal
-from foods.suggested import get_suggested_foods
+from foods.suggested import (
+    FREQUENT_FOODS_ATTRIBUTES,
+    get_suggested_foods,
+    get_yesterday_start_and_end,
+)
 
 
 def create_mock_food(food_id=None, name=None, thumbnail=None):
@@ -34,8 +41,30 @@ def create_mock_meal(user_id, meal_type, date_time, foods):
     return meal
 
 
+def create_day_aggregates(meals):
+    """Helper function to build the daily aggregates of meals, newest first"""
+    days = [
+        MbdUserAggregate(
+            user_id="test-user",
+            aggregate=key,
+            meal_count=delta.meal_count,
+            food_counts=dict(delta.food_counts),
+        )
+        for key, delta in meal_deltas(meals).items()
+        if key != TOTALS_KEY
+    ]
+    return sorted(days, key=lambda day: day.aggregate, reverse=True)
+
+
+def create_catalog(*foods):
+    return FoodCatalog(MbdFoodList(user_id="test-user", foods=list(foods)))
+
+
+@patch("foods.suggested.get_recent_days", return_value=[])
 @patch("foods.suggested.MbdMeal.query")
-def test_get_suggested_foods__includes_foods_from_yesterdays_meal(mock_query):
+def test_get_suggested_foods__includes_foods_from_yesterdays_meal(
+    mock_query, mock_get_recent_days
+):
     """Test that foods from yesterday's meal of the specified type are included"""
     # Setup
     user_id = "test-user"
@@ -46,10 +75,8 @@ def test_get_suggested_foods__includes_foods_from_yesterdays_meal(mock_query):
     food2 = create_mock_food(name="Banana", thumbnail="🍌")
 
     # Create yesterday's date
-    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
-    yesterday_breakfast_time = yesterday.replace(
-        hour=8, minute=0, second=0, microsecond=0
-    )
+    yesterday_start, _ = get_yesterday_start_and_end()
+    yesterday_breakfast_time = yesterday_start + timedelta(hours=8)
 
     # Create mock meals
     yesterday_breakfast = create_mock_meal(
@@ -63,7 +90,7 @@ def test_get_suggested_foods__includes_foods_from_yesterdays_meal(mock_query):
     mock_query.return_value = [yesterday_breakfast]
 
     # Call the function
-    suggested_foods = get_suggested_foods(user_id, meal_type)
+    suggested_foods = get_suggested_foods(user_id, meal_type, create_catalog())
 
     # Verify the results
     assert len(suggested_foods) == 2
@@ -71,9 +98,19 @@ def test_get_suggested_foods__includes_foods_from_yesterdays_meal(mock_query):
     assert food1.food_id in food_ids
     assert food2.food_id in food_ids
 
+    # Only yesterday's meals of the type are read, from the index, and only their foods
+    args, kwargs = mock_query.call_args
+    assert args == (user_id,)
+    assert kwargs["index_name"] == "meal_type_date_time-index"
+    assert kwargs["range_key_condition"] is not None
+    assert kwargs["attributes_to_get"] == ["date_time", "foods"]
 
-@patch("foods.suggested.MbdMeal.query")
-def test_get_suggested_foods__includes_frequently_eaten_foods(mock_query):
+
+@patch("foods.suggested.get_recent_days")
+@patch("foods.suggested.MbdMeal.query", return_value=[])
+def test_get_suggested_foods__includes_frequently_eaten_foods(
+    mock_query, mock_get_recent_days
+):
     """Test that foods that appear in >80% of the last 20 meals are included"""
     # Setup
     user_id = "test-user"
@@ -105,11 +142,13 @@ def test_get_suggested_foods__includes_frequently_eaten_foods(mock_query):
         )
         meals.append(meal)
 
-    # Mock the query to return the meals
-    mock_query.return_value = meals
+    # Mock the daily aggregates of the meals
+    mock_get_recent_days.return_value = create_day_aggregates(meals)
 
     # Call the function
-    suggested_foods = get_suggested_foods(user_id, meal_type)
+    suggested_foods = get_suggested_foods(
+        user_id, meal_type, create_catalog(food1, food2, food3)
+    )
 
     # Verify the results
     assert len(suggested_foods) == 2
@@ -119,8 +158,11 @@ def test_get_suggested_foods__includes_frequently_eaten_foods(mock_query):
     assert food3.food_id not in food_ids
 
 
+@patch("foods.suggested.get_recent_days")
 @patch("foods.suggested.MbdMeal.query")
-def test_get_suggested_foods__combines_yesterdays_and_frequent_foods(mock_query):
+def test_get_suggested_foods__combines_yesterdays_and_frequent_foods(
+    mock_query, mock_get_recent_days
+):
     """Test that both rules are applied and combined correctly"""
     # Setup
     user_id = "test-user"
@@ -132,10 +174,8 @@ def test_get_suggested_foods__combines_yesterdays_and_frequent_foods(mock_query)
     food3 = create_mock_food(name="Pasta", thumbnail="🍝")
 
     # Create yesterday's date
-    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
-    yesterday_dinner_time = yesterday.replace(
-        hour=19, minute=0, second=0, microsecond=0
-    )
+    yesterday_start, _ = get_yesterday_start_and_end()
+    yesterday_dinner_time = yesterday_start + timedelta(hours=19)
 
     # Create mock meals
     yesterday_dinner = create_mock_meal(
@@ -165,14 +205,16 @@ def test_get_suggested_foods__combines_yesterdays_and_frequent_foods(mock_query)
         )
         recent_meals.append(meal)
 
-    # Combine all meals
-    all_meals = [yesterday_dinner] + recent_meals
-
-    # Mock the query to return all meals
-    mock_query.return_value = all_meals
+    # Mock yesterday's meals and the daily aggregates of all meals
+    mock_query.return_value = [yesterday_dinner]
+    mock_get_recent_days.return_value = create_day_aggregates(
+        [yesterday_dinner] + recent_meals
+    )
 
     # Call the function
-    suggested_foods = get_suggested_foods(user_id, meal_type)
+    suggested_foods = get_suggested_foods(
+        user_id, meal_type, create_catalog(food1, food2, food3)
+    )
 
     # Verify the results
     # Should include food1 (from yesterday) and food2, food3 (frequent foods)
@@ -183,8 +225,11 @@ def test_get_suggested_foods__combines_yesterdays_and_frequent_foods(mock_query)
     assert food3.food_id in food_ids
 
 
+@patch("foods.suggested.get_recent_days")
 @patch("foods.suggested.MbdMeal.query")
-def test_get_suggested_foods__combines_without_duplicates(mock_query):
+def test_get_suggested_foods__combines_without_duplicates(
+    mock_query, mock_get_recent_days
+):
     # Setup
     user_id = "test-user"
     meal_type = "Dinner"
@@ -195,10 +240,8 @@ def test_get_suggested_foods__combines_without_duplicates(mock_query):
     food3 = create_mock_food(name="Pasta", thumbnail="🍝")
 
     # Create yesterday's date
-    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
-    yesterday_dinner_time = yesterday.replace(
-        hour=19, minute=0, second=0, microsecond=0
-    )
+    yesterday_start, _ = get_yesterday_start_and_end()
+    yesterday_dinner_time = yesterday_start + timedelta(hours=19)
 
     # Create mock meals
     yesterday_dinner = create_mock_meal(
@@ -224,14 +267,16 @@ def test_get_suggested_foods__combines_without_duplicates(mock_query):
         )
         recent_meals.append(meal)
 
-    # Combine all meals
-    all_meals = [yesterday_dinner] + recent_meals
-
-    # Mock the query to return all meals
-    mock_query.return_value = all_meals
+    # Mock yesterday's meals and the daily aggregates of all meals
+    mock_query.return_value = [yesterday_dinner]
+    mock_get_recent_days.return_value = create_day_aggregates(
+        [yesterday_dinner] + recent_meals
+    )
 
     # Call the function
-    suggested_foods = get_suggested_foods(user_id, meal_type)
+    suggested_foods = get_suggested_foods(
+        user_id, meal_type, create_catalog(food1, food2, food3)
+    )
 
     # Verify the results
     # Should include food1 (from yesterday) and food2, food3 (frequent foods)
@@ -242,8 +287,11 @@ def test_get_suggested_foods__combines_without_duplicates(mock_query):
     assert food3.food_id in food_ids
 
 
+@patch("foods.suggested.get_recent_days", return_value=[])
 @patch("foods.suggested.MbdMeal.query")
-def test_get_suggested_foods__returns_empty_list_when_no_data(mock_query):
+def test_get_suggested_foods__returns_empty_list_when_no_data(
+    mock_query, mock_get_recent_days
+):
     """Test behavior when there's no data"""
     # Setup
     user_id = "test-user"
@@ -253,7 +301,121 @@ def test_get_suggested_foods__returns_empty_list_when_no_data(mock_query):
     mock_query.return_value = []
 
     # Call the function
-    suggested_foods = get_suggested_foods(user_id, meal_type)
+    suggested_foods = get_suggested_foods(user_id, meal_type, create_catalog())
 
     # Verify the results
     assert len(suggested_foods) == 0
+
+
+@patch("foods.suggested.get_recent_days")
+@patch("foods.suggested.MbdMeal.query", return_value=[])
+def test_get_suggested_foods__uses_the_most_recent_days_with_20_meals(
+    mock_query, mock_get_recent_days
+):
+    """Test that frequent foods come from the newest days holding at least 20 meals"""
+    # Setup
+    user_id = "test-user"
+    toast = create_mock_food(name="Toast", thumbnail="🍞")
+    eggs = create_mock_food(name="Eggs", thumbnail="🍳")
+    now = datetime.now(timezone.utc)
+
+    # Three meals a day: toast for the last week, eggs before that
+    meals = [
+        create_mock_meal(
+            user_id=user_id,
+            meal_type="Any",
+            date_time=now - timedelta(days=day, minutes=meal),
+            foods=[toast] if day < 7 else [eggs],
+        )
+        for day in range(20)
+        for meal in range(3)
+    ]
+    mock_get_recent_days.return_value = create_day_aggregates(meals)
+
+    # Call the function
+    suggested_foods = get_suggested_foods(
+        user_id, "Breakfast", create_catalog(toast, eggs)
+    )
+
+    # Verify the results: 7 days of toast make up at least 60% of the 21 meals counted
+    assert [f.food_id for f in suggested_foods] == [toast.food_id]
+    mock_get_recent_days.assert_called_once_with(
+        user_id, 30, attributes=FREQUENT_FOODS_ATTRIBUTES
+    )
+
+
+@patch("foods.suggested.get_recent_days")
+@patch("foods.suggested.MbdMeal.query", return_value=[])
+def test_get_suggested_foods__skips_foods_missing_from_catalog(
+    mock_query, mock_get_recent_days
+):
+    toast = create_mock_food(name="Toast", thumbnail="🍞")
+    meals = [
+        create_mock_meal(
+            user_id="test-user",
+            meal_type="Any",
+            date_time=datetime.now(timezone.utc) - timedelta(days=day),
+            foods=[toast],
+        )
+        for day in range(3)
+    ]
+    mock_get_recent_days.return_value = create_day_aggregates(meals)
+
+    assert get_suggested_foods("test-user", "Lunch", create_catalog()) == []
+
+
+@patch("foods.suggested.get_recent_days")
+@patch("foods.suggested.MbdMeal.query", return_value=[])
+def test_get_suggested_foods__frequent_foods_use_their_catalog_names(
+    mock_query, mock_get_recent_days
+):
+    toast = create_mock_food(name="Toast", thumbnail="🍞")
+    renamed = create_mock_food(food_id=toast.food_id, name="Sourdough", thumbnail="🍞")
+    meals = [
+        create_mock_meal(
+            user_id="test-user",
+            meal_type="Any",
+            date_time=datetime.now(timezone.utc) - timedelta(days=day),
+            foods=[toast],
+        )
+        for day in range(3)
+    ]
+    mock_get_recent_days.return_value = create_day_aggregates(meals)
+
+    suggested_foods = get_suggested_foods("test-user", "Lunch", create_catalog(renamed))
+
+    assert [food.name for food in suggested_foods] == ["Sourdough"]
+
+
+@patch("foods.suggested.get_recent_days", return_value=[])
+@patch("foods.suggested.MbdMeal.query")
+def test_get_suggested_foods__yesterday_is_the_users_local_yesterday(
+    mock_query, mock_get_recent_days
+):
+    # Noon on the 1st in Tokyo
+    now = datetime(2025, 1, 1, 3, tzinfo=timezone.utc)
+    tokyo = ZoneInfo("Asia/Tokyo")
+    dinner = create_mock_meal(
+        user_id="test-user",
+        meal_type="Dinner",
+        date_time=datetime(2024, 12, 31, 23, 30, tzinfo=tokyo),
+        foods=[create_mock_food(name="Ramen", thumbnail="🍜")],
+    )
+    mock_query.return_value = [dinner]
+
+    with patch("shared.days.datetime") as mock_datetime:
+        mock_datetime.now.return_value = now
+        mock_datetime.combine = datetime.combine
+        suggested_foods = get_suggested_foods(
+            "test-user", "Dinner", create_catalog(), "Asia/Tokyo"
+        )
+
+    assert [food.name for food in suggested_foods] == ["Ramen"]
+    # The 31st from midnight to midnight in Tokyo, rather than in UTC
+    assert mock_query.call_args.kwargs["range_key_condition"] == (
+        MbdMeal.meal_type_between(
+            "Dinner",
+            datetime(2024, 12, 30, 15, tzinfo=timezone.utc),
+            datetime(2024, 12, 31, 15, tzinfo=timezone.utc),
+        )
+    )